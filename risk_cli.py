@@ -0,0 +1,455 @@
+"""
+Interfaccia a riga di comando per la generazione dei report senza Streamlit.
+
+Genera i report PDF ed Excel di uno o più registri con gli stessi generatori
+usati dalla dashboard (risk_reports.REPORT_BUILDERS), distribuendo i registri
+su un pool di processi:
+
+    python -m risk_dashboard report --format pdf,xlsx --input dir/ --out reports/
+
+Con una cartella in --input vengono cercati ricorsivamente i registri che
+corrispondono a --pattern (default risk_data.*, con estensione .csv, .db,
+.sqlite, .sqlite3, .parquet, .arrow o .feather). I report di ogni registro vengono scritti in --out
+rispettando la struttura delle sottocartelle.
+
+Per ogni registro viene calcolato un hash del contenuto: se coincide con
+quello dell'esecuzione precedente (salvato in <out>/.risk_reports.json) e il
+report esiste ancora, il registro viene saltato. --force rigenera tutto.
+I registri vengono solo letti: nelle cartelle di --input non vengono creati
+file di lock o di quarantena.
+
+Il comando ingest importa in un registro tutti i file CSV/XLSX di una
+cartella (es. gli estratti settimanali delle controllate):
+
+    python -m risk_dashboard ingest cartella/ --into risk_data.csv --key Descrizione
+
+I file vengono letti e validati in parallelo (pool di processi, o di thread
+con --threads), le righe già presenti nel registro o ripetute tra i file
+vengono scartate confrontando le colonne di --key, e le righe nuove vengono
+salvate con un'unica operazione (risk_storage.apply_batch). Per ogni file
+vengono stampati righe lette, valide, scartate, duplicate e velocità.
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+# ===========================
+# CONFIGURAZIONE
+# ===========================
+
+# Formati accettati da --format: nome -> (tipo di report, estensione del file)
+REPORT_FORMATS = {
+    'pdf': ('pdf', '.pdf'),
+    'xlsx': ('excel', '.xlsx'),
+    'excel': ('excel', '.xlsx'),
+}
+
+# Estensioni dei file dati riconosciute come registri
+REGISTER_EXTENSIONS = ('.csv', '.db', '.sqlite', '.sqlite3', '.parquet', '.pq', '.arrow', '.feather', '.ipc')
+
+# File con gli hash dei registri già esportati, nella cartella di output
+MANIFEST_NAME = '.risk_reports.json'
+
+# Esiti dell'elaborazione di un registro
+RESULT_DONE = 'generato'
+RESULT_SKIPPED = 'invariato'
+RESULT_FAILED = 'errore'
+RESULT_IMPORTED = 'letto'
+RESULT_VALIDATED = 'validato'
+
+# ===========================
+# RICERCA DEI REGISTRI
+# ===========================
+
+def find_registers(inputs, pattern):
+    """
+    Elenca i registri da esportare.
+
+    Args:
+        inputs (list): File dati o cartelle da esplorare ricorsivamente
+        pattern (str): Pattern glob del nome dei file dati nelle cartelle
+
+    Returns:
+        list: Coppie (percorso assoluto, percorso relativo senza estensione)
+              ordinate per percorso
+    """
+    registers = {}
+    for entry in inputs:
+        if os.path.isfile(entry):
+            path = os.path.abspath(entry)
+            registers[path] = os.path.splitext(os.path.basename(path))[0]
+            continue
+        for root, dirs, files in os.walk(entry):
+            dirs.sort()
+            for name in sorted(files):
+                if fnmatch.fnmatch(name, pattern) and name.lower().endswith(REGISTER_EXTENSIONS):
+                    path = os.path.abspath(os.path.join(root, name))
+                    registers[path] = os.path.splitext(os.path.relpath(path, entry))[0]
+    return sorted(registers.items())
+
+def content_hash(df):
+    """
+    Hash del contenuto del registro, indipendente da backend e data di modifica.
+
+    Args:
+        df (pd.DataFrame): Registro dei rischi
+
+    Returns:
+        str: Digest SHA-256 esadecimale
+    """
+    digest = hashlib.sha256(json.dumps(list(df.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+# ===========================
+# MANIFEST DEGLI EXPORT
+# ===========================
+
+def load_manifest(out_dir):
+    """Legge gli hash dell'esecuzione precedente, vuoto se assenti o illeggibili."""
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(out_dir, manifest):
+    """Salva gli hash dei registri esportati con una scrittura atomica."""
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, prefix=MANIFEST_NAME, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST_NAME))
+
+# ===========================
+# GENERAZIONE DEI REPORT
+# ===========================
+
+def _write_report(report, target):
+    """Copia il report generato nel file di destinazione in modo atomico."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.risk_report_')
+    try:
+        with os.fdopen(fd, 'wb') as f, report:
+            shutil.copyfileobj(report, f)
+        os.replace(tmp_path, target)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+def export_register(path, base_name, formats, out_dir, previous=None):
+    """
+    Genera i report di un registro; eseguita nei processi del pool.
+
+    Args:
+        path (str): Percorso del file dati
+        base_name (str): Percorso relativo dei report senza estensione
+        formats (list): Formati richiesti (chiavi di REPORT_FORMATS)
+        out_dir (str): Cartella di output
+        previous (dict, optional): Formato -> hash dell'esecuzione precedente
+
+    Returns:
+        dict: Esito con percorso, stato, hash, file scritti, durata ed eventuale errore
+    """
+    from risk_heatmap import HeatmapIndex
+    from risk_reports import REPORT_BUILDERS
+    from risk_storage import get_snapshot
+
+    start = time.perf_counter()
+    result = {'path': path, 'status': RESULT_SKIPPED, 'hash': None, 'files': [], 'error': None}
+    try:
+        df = get_snapshot(path, read_only=True)
+        result['hash'] = content_hash(df)
+        targets = {fmt: os.path.join(out_dir, base_name + REPORT_FORMATS[fmt][1]) for fmt in formats}
+        pending = [fmt for fmt in formats
+                   if (previous or {}).get(fmt) != result['hash'] or not os.path.exists(targets[fmt])]
+        if pending:
+            os.makedirs(os.path.dirname(targets[pending[0]]), exist_ok=True)
+            positions = HeatmapIndex.from_frame(df).positions()
+            for fmt in pending:
+                _write_report(REPORT_BUILDERS[REPORT_FORMATS[fmt][0]](df, positions), targets[fmt])
+                result['files'].append(targets[fmt])
+            result['status'] = RESULT_DONE
+    except ImportError as e:
+        result['status'], result['error'] = RESULT_FAILED, f"Libreria di export non disponibile: {e}"
+    except Exception as e:
+        result['status'], result['error'] = RESULT_FAILED, str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def _pool_context():
+    """
+    Contesto multiprocessing del pool.
+
+    Dove disponibile si usa 'fork': con 'spawn' i processi figli reimportano il
+    modulo principale, che lanciato come `python -m risk_dashboard`
+    eseguirebbe il codice della pagina Streamlit.
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return None
+
+def run_reports(registers, formats, out_dir, workers=None, force=False):
+    """
+    Genera i report di più registri in parallelo, saltando quelli invariati.
+
+    Args:
+        registers (list): Coppie (percorso, nome relativo) da find_registers()
+        formats (list): Formati richiesti (chiavi di REPORT_FORMATS)
+        out_dir (str): Cartella di output
+        workers (int, optional): Numero di processi, di default il numero di CPU
+        force (bool): Rigenera anche i registri invariati
+
+    Returns:
+        list: Esiti di export_register() nell'ordine di completamento
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    results = []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(registers) or 1))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+        futures = [pool.submit(export_register, path, base_name, formats, out_dir,
+                               None if force else manifest.get(path))
+                   for path, base_name in registers]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result['status'] != RESULT_FAILED:
+                entry = manifest.setdefault(result['path'], {})
+                entry.update({fmt: result['hash'] for fmt in formats})
+            _print_result(result)
+    save_manifest(out_dir, manifest)
+    return results
+
+def _print_result(result):
+    """Stampa una riga di riepilogo per registro."""
+    line = f"[{result['status']}] {result['path']} ({result['seconds']:.1f} s)"
+    if result['files']:
+        line += ' -> ' + ', '.join(result['files'])
+    if result['error']:
+        line += f": {result['error']}"
+    print(line, flush=True)
+
+# ===========================
+# INGESTIONE DI UNA CARTELLA
+# ===========================
+
+def run_ingest(files, data_file, key, workers=None, threads=False, dry_run=False, rejects=None):
+    """
+    Importa più file in un registro con un'unica operazione di salvataggio.
+
+    I file vengono letti in parallelo; le righe valide sono poi unite
+    nell'ordine dei file, così tra due righe con la stessa chiave viene
+    importata sempre quella del primo file. I duplicati vengono cercati sotto
+    il lock del salvataggio, così righe aggiunte nel frattempo da altri
+    processi non vengono importate una seconda volta.
+
+    Args:
+        files (list): Percorsi dei file da find_import_files()
+        data_file (str): Registro di destinazione
+        key (tuple): Colonne della chiave di deduplicazione
+        workers (int, optional): Processi o thread paralleli, di default il numero di CPU
+        threads (bool): Usa un pool di thread invece che di processi
+        dry_run (bool): Valida e conta senza salvare
+        rejects (str, optional): File CSV in cui scrivere le righe scartate
+
+    Returns:
+        tuple: (esiti per file nell'ordine di files, ID aggiunti o None se il salvataggio non è riuscito)
+    """
+    from risk_import import ROW_COLUMN, SOURCE_COLUMN, find_duplicates, parse_file
+    from risk_storage import apply_batch, get_snapshot
+
+    start = time.perf_counter()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(files) or 1))
+    pool = (ThreadPoolExecutor(max_workers=workers) if threads
+            else ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()))
+    reports, results = {}, {}
+    with pool:
+        futures = [pool.submit(parse_file, path) for path in files]
+        for future in as_completed(futures):
+            report, result = future.result()
+            reports[report['path']] = report
+            if result is not None:
+                results[report['path']] = result
+    reports = [reports[path] for path in files]
+
+    # Deduplicazione vettoriale di tutte le righe valide contro il registro
+    parsed = [path for path in files if path in results and len(results[path].rows)]
+    added = []
+    duplicate = None
+    if parsed:
+        rows = pd.concat([results[path].rows for path in parsed], keys=parsed)
+
+        def exclude(current, _):
+            nonlocal duplicate
+            duplicate = find_duplicates(rows, current, key)
+            return duplicate.to_numpy()
+
+        if dry_run:
+            exclude(get_snapshot(data_file, read_only=True), rows)
+        else:
+            # Registro più recente, sotto lo stesso lock della scrittura
+            added = apply_batch(data_file, adds=rows.reset_index(drop=True), exclude=exclude)
+            added = None if added is None else added['added']
+    counts = duplicate.groupby(level=0, sort=False).sum() if duplicate is not None else pd.Series(dtype=int)
+    for report in reports:
+        report['duplicates'] = int(counts.get(report['path'], 0))
+        if report['error']:
+            report['status'] = RESULT_FAILED
+        elif added is None and report['path'] in parsed:
+            report['status'] = RESULT_FAILED
+            report['error'] = f"salvataggio nel registro {data_file} non riuscito"
+        else:
+            report['status'] = RESULT_VALIDATED if dry_run else RESULT_IMPORTED
+
+    if rejects:
+        rejected = [results[path].rejected.assign(**{SOURCE_COLUMN: path})
+                    for path in files if path in results and len(results[path].rejected)]
+        if rejected:
+            rejected = pd.concat(rejected, ignore_index=True)
+            first = [SOURCE_COLUMN, ROW_COLUMN]
+            rejected[first + [c for c in rejected.columns if c not in first]].to_csv(rejects, index=False)
+
+    for report in reports:
+        _print_ingest(report)
+    elapsed = time.perf_counter() - start
+    total = sum(report['total'] for report in reports)
+    print(f"Totale: {total} righe in {elapsed:.1f} s ({total / max(elapsed, 1e-9):.0f} righe/s)", flush=True)
+    return reports, added
+
+def _print_ingest(report):
+    """Stampa una riga di riepilogo per file importato."""
+    line = f"[{report['status']}] {report['path']}"
+    if report['error']:
+        line += f": {report['error']}"
+    else:
+        line += (f": {report['total']} righe, {report['valid'] - report['duplicates']} nuove, "
+                 f"{report['rejected']} scartate, {report['duplicates']} duplicate "
+                 f"({report['seconds']:.2f} s, {report['total'] / max(report['seconds'], 1e-9):.0f} righe/s)")
+    print(line, flush=True)
+
+def _parse_key(value):
+    """Converte 'Descrizione,Data scadenza' nelle colonne della chiave, rifiutando quelle sconosciute."""
+    from risk_import import IMPORT_COLUMNS
+
+    key = tuple(dict.fromkeys(column.strip() for column in value.split(',') if column.strip()))
+    unknown = [column for column in key if column not in IMPORT_COLUMNS]
+    if not key or unknown:
+        raise argparse.ArgumentTypeError(
+            f"colonna della chiave non valida: {', '.join(unknown) or repr(value)} "
+            f"(usare {', '.join(IMPORT_COLUMNS)})")
+    return key
+
+def _ingest(args):
+    """Esegue il comando ingest."""
+    from risk_import import INGEST_KEY, find_import_files
+
+    files = find_import_files(args.folder)
+    if not files:
+        print("Nessun file CSV/XLSX trovato.", file=sys.stderr)
+        return 1
+    reports, added = run_ingest(files, args.into, args.key or _parse_key(','.join(INGEST_KEY)),
+                                args.workers, args.threads, args.dry_run, args.rejects)
+    failed = sum(report['status'] == RESULT_FAILED for report in reports)
+    if added is None:
+        print(f"Errore nel salvataggio del registro {args.into}", file=sys.stderr)
+        return 1
+    action = "da importare (--dry-run)" if args.dry_run else "importati"
+    new = sum(report['valid'] - report['duplicates'] for report in reports)
+    print(f"File: {len(reports)} - rischi {action} {new}, "
+          f"scartati {sum(report['rejected'] for report in reports)}, "
+          f"duplicati {sum(report['duplicates'] for report in reports)}, errori {failed}")
+    return 1 if failed else 0
+
+def _report(args):
+    """Esegue il comando report."""
+    registers = find_registers(args.input, args.pattern)
+    if not registers:
+        print("Nessun registro trovato.", file=sys.stderr)
+        return 1
+
+    results = run_reports(registers, args.format, args.out, args.workers, args.force)
+    counts = {status: sum(r['status'] == status for r in results)
+              for status in (RESULT_DONE, RESULT_SKIPPED, RESULT_FAILED)}
+    print(f"Registri: {len(results)} - generati {counts[RESULT_DONE]}, "
+          f"invariati {counts[RESULT_SKIPPED]}, errori {counts[RESULT_FAILED]}")
+    return 1 if counts[RESULT_FAILED] else 0
+
+# ===========================
+# RIGA DI COMANDO
+# ===========================
+
+def _parse_formats(value):
+    """Converte 'pdf,xlsx' nella lista di formati, rifiutando quelli sconosciuti."""
+    formats = []
+    for fmt in value.lower().split(','):
+        fmt = 'xlsx' if fmt.strip() == 'excel' else fmt.strip()
+        if fmt not in REPORT_FORMATS:
+            raise argparse.ArgumentTypeError(
+                f"formato non supportato: {fmt} (usare {', '.join(sorted(REPORT_FORMATS))})")
+        if fmt not in formats:
+            formats.append(fmt)
+    return formats
+
+def build_parser():
+    """Costruisce il parser degli argomenti."""
+    parser = argparse.ArgumentParser(
+        prog='python -m risk_dashboard',
+        description="Comandi headless della Dashboard Risk Assessment.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    report = commands.add_parser('report', help="Genera i report PDF/Excel di uno o più registri")
+    report.add_argument('--format', type=_parse_formats, default=['pdf', 'xlsx'],
+                        help="Formati separati da virgola: pdf, xlsx (default: pdf,xlsx)")
+    report.add_argument('--input', nargs='+', required=True,
+                        help="File dati o cartelle contenenti i registri")
+    report.add_argument('--out', required=True, help="Cartella dei report generati")
+    report.add_argument('--pattern', default='risk_data.*',
+                        help="Nome dei file dati cercati nelle cartelle (default: risk_data.*)")
+    report.add_argument('--workers', type=int, default=None,
+                        help="Processi paralleli (default: numero di CPU)")
+    report.add_argument('--force', action='store_true',
+                        help="Rigenera anche i registri non modificati")
+
+    ingest = commands.add_parser('ingest', help="Importa in un registro i file CSV/XLSX di una cartella")
+    ingest.add_argument('folder', help="Cartella con i file da importare (sottocartelle incluse)")
+    ingest.add_argument('--into', default=os.environ.get('RISK_DATA_FILE', 'risk_data.csv'),
+                        help="Registro di destinazione (default: RISK_DATA_FILE o risk_data.csv)")
+    ingest.add_argument('--key', type=_parse_key, default=None,
+                        help="Colonne separate da virgola che identificano un rischio già presente "
+                             "(default: RISK_INGEST_KEY o Descrizione)")
+    ingest.add_argument('--workers', type=int, default=None,
+                        help="File letti in parallelo (default: numero di CPU)")
+    ingest.add_argument('--threads', action='store_true',
+                        help="Usa un pool di thread invece che di processi")
+    ingest.add_argument('--rejects', default=None,
+                        help="File CSV in cui salvare le righe scartate con file, riga e motivo")
+    ingest.add_argument('--dry-run', action='store_true',
+                        help="Valida i file e mostra il riepilogo senza salvare")
+    return parser
+
+def main(argv=None):
+    """
+    Punto di ingresso della riga di comando.
+
+    Args:
+        argv (list, optional): Argomenti, di default sys.argv[1:]
+
+    Returns:
+        int: Codice di uscita (1 se almeno un registro non è stato esportato
+             o un file non è stato importato)
+    """
+    args = build_parser().parse_args(argv)
+    return _ingest(args) if args.command == 'ingest' else _report(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
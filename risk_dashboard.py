@@ -25,16 +25,65 @@ Versione: 1.1 - Heat Map PDF Migliorata
 import streamlit as st
 import pandas as pd
 import os
+import time
 from datetime import date
-from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode, DataReturnMode
-from io import BytesIO
+from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
+from risk_storage import load_data, get_data_version, get_validation_report, insert_risk, delete_risks, apply_batch
+from risk_scoring import calcola_priorita, get_risk_color
+from risk_heatmap import get_heatmap_index
+from risk_grid import GRID_RETURN_MODE, SCALE_VALUES, STATUS_ICONS, diff_grid_edits, get_grid_frame
+from risk_import import IMPORT_COLUMNS, commit_import, prepare_import, read_header, rejected_csv, suggest_mapping
+from risk_schema import serialize_frame
+from risk_reports import get_cached_report, open_report
+from risk_jobs import JOB_FAILED, get_job, submit_export
+from risk_deps import get_timings, mark_startup, prewarm_exports
+from risk_profiling import (PROFILE_ENABLED, PROFILE_QUERY_PARAM, RERUN_HISTORY,
+                            checkpoint, finish_rerun, start_rerun)
+
+# Comandi headless (es. `python -m risk_dashboard report ...`): eseguito senza
+# runtime Streamlit, lo script delega a risk_cli senza costruire la pagina
+if __name__ == '__main__' and not st.runtime.exists():
+    import sys
+    from risk_cli import main
+    sys.exit(main())
+
+# Misura del rerun per il pannello "🐞 Tempi per sezione"; il profilo cProfile
+# viene catturato con RISK_PROFILE=1, con ?profile=1 o dal pulsante del pannello
+start_rerun(profile=PROFILE_ENABLED
+            or st.query_params.get(PROFILE_QUERY_PARAM) == '1'
+            or st.session_state.pop('profile_next_rerun', False))
 
 # ===========================
 # CONFIGURAZIONI GLOBALI
 # ===========================
 
-# Nome del file CSV per la persistenza dei dati
-DATA_FILE = 'risk_data.csv'
+# File per la persistenza dei dati: CSV (default) oppure database SQLite (.db/.sqlite/.sqlite3).
+# Con un file SQLite inesistente, il CSV omonimo viene migrato automaticamente al primo avvio.
+DATA_FILE = os.environ.get('RISK_DATA_FILE', 'risk_data.csv')
+
+# Da questo numero di rischi la tabella passa alla modalità paginata lato server:
+# ad AgGrid viene inviata solo la pagina visibile, ordinata e filtrata con pandas
+GRID_LARGE_ROWS = int(os.environ.get('RISK_GRID_LARGE_ROWS', 1000))
+
+# Righe per pagina selezionabili nella modalità paginata
+GRID_PAGE_SIZES = (25, 50, 100, 200)
+
+# Colonne di testo che mantengono l'altezza automatica nella modalità paginata
+GRID_TEXT_COLUMNS = ('Descrizione', 'Contromisura')
+
+# Ordinamenti disponibili nella modalità paginata: etichetta -> colonna del registro
+GRID_SORT_COLUMNS = {
+    'ID': 'ID',
+    'Priorità': 'Valore_Rischio',
+    'Probabilità': 'Probabilità',
+    'Impatto': 'Impatto',
+    'Stato': 'Stato',
+    'Data scadenza': 'Data scadenza',
+    'Descrizione': 'Descrizione',
+}
+
+# Righe mostrate nelle anteprime dell'importazione massiva (valide e scartate)
+IMPORT_PREVIEW_ROWS = 100
 
 # Configurazione layout Streamlit per utilizzo completo della larghezza
 st.set_page_config(page_title="Dashboard Risk Assessment", layout="wide")
@@ -43,6 +92,8 @@ st.set_page_config(page_title="Dashboard Risk Assessment", layout="wide")
 with open("risk_dashboard_styles.css") as f:
     st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
+checkpoint("Configurazione e CSS")
+
 # ===========================
 # HEADER E TITOLO PRINCIPALE
 # ===========================
@@ -73,123 +124,43 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# ===========================
-# FUNZIONI DI GESTIONE DATI
-# ===========================
-
-def load_data(file_path):
-    """
-    Carica i dati dei rischi dal file CSV specificato.
-    
-    Args:
-        file_path (str): Percorso del file CSV contenente i dati dei rischi
-        
-    Returns:
-        pd.DataFrame: DataFrame contenente i dati dei rischi con tipizzazione corretta
-                     delle colonne numeriche. Ritorna DataFrame vuoto se file non esiste.
-                     
-    Raises:
-        Exception: Gestisce errori di lettura file mostrando messaggio di errore
-    """
-    if os.path.exists(file_path):
-        try:
-            df = pd.read_csv(file_path)
-            # Conversione e validazione dei tipi di dati per garantire consistenza
-            if not df.empty:
-                df['ID'] = df['ID'].astype(int)
-                df['Probabilità'] = df['Probabilità'].astype(float)  # Supporta valori decimali (0.5)
-                df['Impatto'] = df['Impatto'].astype(float)        # Supporta valori decimali (0.5)
-                df['Valore_Rischio'] = df['Valore_Rischio'].astype(float)  # Prodotto prob*impatto
-            return df
-        except Exception as e:
-            st.error(f"Errore nel caricamento dei dati: {e}")
-            return create_empty_dataframe()
-    else:
-        return create_empty_dataframe()
-
-def create_empty_dataframe():
-    """
-    Crea un DataFrame vuoto con la struttura standard per i dati dei rischi.
-    
-    Returns:
-        pd.DataFrame: DataFrame vuoto con colonne predefinite per i rischi
-    """
-    return pd.DataFrame({
-        "ID": [],
-        "Descrizione": [],
-        "Probabilità": [],
-        "Impatto": [],
-        "Valore_Rischio": [],  # Calcolato automaticamente (Probabilità * Impatto)
-        "Priorità": [],        # Derivata dal Valore_Rischio
-        "Contromisura": [],
-        "Stato": [],
-        "Data scadenza": []
-    })
-
-def save_data(df, file_path):
-    """
-    Salva il DataFrame dei rischi nel file CSV specificato.
-    
-    Args:
-        df (pd.DataFrame): DataFrame contenente i dati dei rischi da salvare
-        file_path (str): Percorso di destinazione per il file CSV
-        
-    Returns:
-        bool: True se il salvataggio è riuscito, False altrimenti
-    """
-    try:
-        df.to_csv(file_path, index=False)
-        return True
-    except Exception as e:
-        st.error(f"Errore nel salvataggio dei dati: {e}")
-        return False
+checkpoint("Header")
 
 # ===========================
 # INIZIALIZZAZIONE SESSION STATE
 # ===========================
 
-# Inizializzazione dei dati principali
-if 'df' not in st.session_state:
-    st.session_state.df = load_data(DATA_FILE)
-
 def refresh_data():
-    """Forza il ricaricamento dei dati dal file per garantire sincronizzazione."""
+    """Forza il ricaricamento dei dati dallo snapshot condiviso per garantire sincronizzazione."""
+    st.session_state.df_version = get_data_version(DATA_FILE)
     st.session_state.df = load_data(DATA_FILE)
 
-# Gestione refresh pagina per sincronizzazione dati
-if 'page_refresh' not in st.session_state:
-    st.session_state.page_refresh = 0
+# Sincronizzazione dati: lo snapshot condiviso viene riletto solo se il registro
+# è cambiato (nuova sessione, salvataggio di un'altra sessione o modifica esterna)
+if st.session_state.get('df_version') != get_data_version(DATA_FILE):
     refresh_data()
 
+# Esito della validazione del registro: righe non valide escluse e messe in quarantena
+validation = get_validation_report(DATA_FILE)
+if validation and validation['rejected']:
+    saved = (f"salvate in `{os.path.basename(validation['quarantine_file'])}`"
+             if validation['quarantine_file'] else "non salvate (file di quarantena non scrivibile)")
+    st.warning(f"⚠️ {validation['rejected']} righe non valide del registro sono state escluse "
+               f"({validation['valid']} caricate) e {saved}")
+    with st.expander("Dettaglio righe in quarantena"):
+        st.dataframe(pd.DataFrame({'Motivo': list(validation['reasons']),
+                                   'Righe': list(validation['reasons'].values())}),
+                     hide_index=True)
+if validation and validation['recalculated']:
+    st.info(f"ℹ️ Valore e priorità ricalcolati per {validation['recalculated']} righe non coerenti "
+            f"con probabilità e impatto")
+
+checkpoint("Sincronizzazione dati")
+
 # ===========================
 # FUNZIONI DI BUSINESS LOGIC
 # ===========================
 
-def calcola_priorita(valore_rischio):
-    """
-    Calcola la priorità del rischio basata sul valore numerico del rischio.
-    
-    La scala utilizza il prodotto Probabilità × Impatto (range 1-25):
-    - Bassa: 1-5
-    - Media: 6-10  
-    - Alta: 11-15
-    - Estrema: 16-25
-    
-    Args:
-        valore_rischio (float): Valore numerico del rischio (Probabilità × Impatto)
-        
-    Returns:
-        str: Livello di priorità del rischio
-    """
-    if valore_rischio >= 16:
-        return "Estrema"
-    elif valore_rischio >= 11:
-        return "Alta"
-    elif valore_rischio >= 6:
-        return "Media"
-    else:
-        return "Bassa"
-
 def elimina_rischio(risk_id):
     """
     Elimina un rischio specifico dal dataset e salva immediatamente.
@@ -200,336 +171,12 @@ def elimina_rischio(risk_id):
     Returns:
         bool: True se l'eliminazione e il salvataggio sono riusciti
     """
-    # Filtra i dati rimuovendo il rischio con ID specificato
-    st.session_state.df = st.session_state.df[st.session_state.df['ID'] != risk_id]
-    
-    # Persistenza immediata per evitare perdita dati
-    if save_data(st.session_state.df, DATA_FILE):
+    # Persistenza immediata della sola eliminazione per evitare perdita dati
+    if delete_risks([risk_id], DATA_FILE):
+        refresh_data()
         return True
     return False
 
-# ===========================
-# FUNZIONI DI REPORTISTICA
-# ===========================
-
-def create_heatmap_image(df):
-    """
-    Genera una heat map dei rischi come immagine PNG per l'inclusione nei report PDF.
-    
-    La heat map visualizza:
-    - Griglia 5x5 rappresentando combinazioni Probabilità/Impatto
-    - Colori basati sui livelli di priorità
-    - Posizionamento preciso dei rischi basato sui valori decimali
-    - Etichette con ID dei rischi in cerchi neri con dimensionamento dinamico
-    
-    Args:
-        df (pd.DataFrame): DataFrame contenente i dati dei rischi
-        
-    Returns:
-        BytesIO: Buffer contenente l'immagine PNG della heat map,
-                None se matplotlib non è disponibile o si verifica un errore
-    """
-    try:
-        import matplotlib.pyplot as plt
-        import matplotlib.patches as patches
-        import numpy as np
-        from io import BytesIO
-        
-        # Configurazione matplotlib per ambiente headless
-        plt.switch_backend('Agg')
-        
-        # Inizializzazione figura con dimensioni originali
-        fig, ax = plt.subplots(figsize=(10, 8))
-        fig.patch.set_facecolor('white')
-        
-        def get_risk_color(prob, imp):
-            """Determina il colore della cella basato sul valore del rischio."""
-            risk_value = prob * imp
-            if risk_value >= 16:
-                return '#ef4444'  # Rosso - Rischio Estremo
-            elif risk_value >= 11:
-                return '#f97316'  # Arancione - Rischio Alto
-            elif risk_value >= 6:
-                return '#eab308'  # Giallo - Rischio Medio
-            elif risk_value >= 1:
-                return '#22c55e'  # Verde - Rischio Basso
-            else:
-                return '#9ca3af'  # Grigio - Nessun rischio
-        
-        # Creazione griglia di sfondo 5x5
-        for i in range(5):  # Righe: Impatto (1-5, dal basso all'alto)
-            for j in range(5):  # Colonne: Probabilità (1-5, da sinistra a destra)
-                prob = j + 1  
-                imp = i + 1   
-                color = get_risk_color(prob, imp)
-                
-                # Disegno rettangolo con colore appropriato
-                rect = patches.Rectangle((j, i), 1, 1, linewidth=2, 
-                                       edgecolor='#334155', facecolor=color, alpha=0.7)
-                ax.add_patch(rect)
-        
-        # Raggruppamento rischi per posizione per gestire sovrapposizioni
-        risk_positions = {}
-        for _, row in df.iterrows():
-            prob = float(row['Probabilità'])
-            imp = float(row['Impatto'])
-            risk_id = int(row['ID'])
-            position_key = (prob, imp)
-            
-            if position_key not in risk_positions:
-                risk_positions[position_key] = []
-            risk_positions[position_key].append(risk_id)
-        
-        # Posizionamento marcatori dei rischi
-        for (prob, imp), risk_ids in risk_positions.items():
-            if prob >= 1 and imp >= 1:  # Validazione range valori
-                # Calcolo posizione precisa basata su valori decimali
-                x = prob - 0.5  # Conversione da scala 1-5 a coordinate 0.5-4.5
-                y = imp - 0.5   
-                
-                # Creazione etichetta con ID multipli se necessario
-                id_string = ', '.join(map(str, sorted(risk_ids)))
-                
-                # Dimensionamento dinamico ottimizzato per cerchi compatti con testo leggibile
-                num_risks = len(risk_ids)
-                
-                # Calcolo dimensione cerchio compatta con font più grande
-                char_count = len(id_string)
-                if char_count <= 2:  # Singolo ID (es. "1", "12")
-                    base_size = 55
-                    font_size = 10
-                elif char_count <= 5:  # Due ID (es. "1, 2")
-                    base_size = 80
-                    font_size = 9
-                elif char_count <= 8:  # Tre ID (es. "1, 2, 3")
-                    base_size = 115
-                    font_size = 8
-                else:  # Quattro o più ID
-                    base_size = 150
-                    font_size = 7
-                
-                # Incremento proporzionale per rischi multipli
-                circle_size = base_size + (num_risks - 1) * 12
-                
-                # Creazione cerchio nero di sfondo identico alla versione web
-                circle = patches.Circle((x, y), radius=np.sqrt(circle_size)/40, 
-                                      facecolor='black', edgecolor='white', 
-                                      linewidth=2, zorder=10)
-                ax.add_patch(circle)
-                
-                # Etichetta testuale con ID - styling identico alla versione web
-                ax.text(x, y, id_string, ha='center', va='center', 
-                       color='white', fontweight='bold', fontsize=font_size, 
-                       zorder=11)
-        
-        # Configurazione assi e layout
-        ax.set_xlim(0, 5)
-        ax.set_ylim(0, 5)
-        ax.set_aspect('equal')
-        
-        # Etichettatura assi
-        prob_labels = ['1', '2', '3', '4', '5']
-        imp_labels = ['1', '2', '3', '4', '5']
-        
-        ax.set_xticks([0.5, 1.5, 2.5, 3.5, 4.5])
-        ax.set_xticklabels(prob_labels, fontsize=9)
-        ax.set_yticks([0.5, 1.5, 2.5, 3.5, 4.5])
-        ax.set_yticklabels(imp_labels, fontsize=9)
-        
-        # Titoli e etichette
-        ax.set_xlabel('PROBABILITÀ', fontweight='bold', fontsize=12, labelpad=10)
-        ax.set_ylabel('IMPATTO', fontweight='bold', fontsize=12, labelpad=10)
-        ax.set_title('HEAT MAP DEI RISCHI', fontweight='bold', fontsize=14, pad=20)
-        
-        # Griglia di supporto
-        ax.grid(True, alpha=0.3)
-        ax.set_axisbelow(True)
-        
-        # Legenda colori per priorità
-        legend_elements = [
-            patches.Patch(color='#22c55e', label='Bassa (1-5)'),
-            patches.Patch(color='#eab308', label='Media (6-10)'),
-            patches.Patch(color='#f97316', label='Alta (11-15)'),
-            patches.Patch(color='#ef4444', label='Estrema (16-25)')
-        ]
-        ax.legend(handles=legend_elements, loc='upper left', bbox_to_anchor=(1.02, 1), 
-                 title='Priorità', title_fontsize=10, fontsize=9)
-        
-        # Salvataggio in buffer per utilizzo nei report
-        img_buffer = BytesIO()
-        plt.tight_layout()
-        plt.savefig(img_buffer, format='PNG', dpi=300, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none')
-        plt.close()
-        
-        img_buffer.seek(0)
-        return img_buffer
-        
-    except ImportError:
-        st.warning("Matplotlib non disponibile. Heat map non inclusa nel PDF.")
-        return None
-    except Exception as e:
-        st.warning(f"Errore nella creazione della heat map: {str(e)}")
-        return None
-
-def create_pdf_report(df):
-    """
-    Genera un report PDF completo contenente tabella dei rischi, riepilogo e heat map.
-    
-    Il report include:
-    - Tabella formattata con tutti i rischi
-    - Riepilogo statistico per priorità
-    - Heat map visuale dei rischi
-    - Formattazione professionale con intestazioni e stili
-    
-    Args:
-        df (pd.DataFrame): DataFrame contenente i dati dei rischi
-        
-    Returns:
-        BytesIO: Buffer contenente il PDF generato,
-                None se le librerie non sono disponibili o si verifica un errore
-    """
-    try:
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import A4, landscape
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
-        from reportlab.lib.enums import TA_CENTER
-        import io
-
-        # Configurazione documento in formato landscape per tabelle larghe
-        pdf_buffer = io.BytesIO()
-        doc = SimpleDocTemplate(
-            pdf_buffer,
-            pagesize=landscape(A4),
-            rightMargin=20,
-            leftMargin=20,
-            topMargin=20,
-            bottomMargin=20
-        )
-
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Stile personalizzato per il titolo principale
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Title'],
-            fontSize=20,
-            spaceAfter=20,
-            alignment=TA_CENTER
-        )
-
-        # Intestazione del documento
-        elements.append(Paragraph("🛡️ Risk Assessment Report", title_style))
-        elements.append(Paragraph(f"Data: {date.today().strftime('%d/%m/%Y')}", styles['Normal']))
-        elements.append(Spacer(1, 0.3 * inch))
-
-        # Preparazione dati tabella con intestazioni in ordine coerente con interfaccia AgGrid
-        data = [['ID', 'Descrizione', 'Probabilità', 'Impatto', 'Priorità', 'Contromisura', 'Stato', 'Data Scadenza']]
-
-        # Popolamento righe dati con Paragraph per text wrapping automatico
-        for _, row in df.iterrows():
-            # Descrizione completa con Paragraph per wrapping automatico
-            desc = str(row['Descrizione']) if pd.notnull(row['Descrizione']) else ""
-            desc_paragraph = Paragraph(desc, styles['Normal'])
-            
-            # Contromisura completa con Paragraph per wrapping automatico  
-            desc_cont = str(row['Contromisura']) if pd.notnull(row['Contromisura']) else ""
-            cont_paragraph = Paragraph(desc_cont, styles['Normal'])
-
-            # Aggiunta riga con Paragraph per colonne di testo lungo
-            data.append([
-                str(row['ID']),
-                desc_paragraph,  # Paragraph per text wrapping automatico
-                f"{row['Probabilità']:.1f}",
-                f"{row['Impatto']:.1f}",
-                str(row['Priorità']),
-                cont_paragraph,  # Paragraph per text wrapping automatico
-                str(row['Stato']),
-                str(row['Data scadenza'])
-            ])
-
-        # Creazione e styling avanzato della tabella con larghezze ridotte per eliminare spazio vuoto
-        table = Table(data, colWidths=[
-            0.5*inch,   # ID - compatta (coerente con 60px AgGrid)
-            2.8*inch,   # Descrizione - ottimizzata (coerente con 300px AgGrid)
-            0.7*inch,   # Probabilità (coerente con 100px AgGrid)
-            0.6*inch,   # Impatto (coerente con 90px AgGrid)
-            0.7*inch,   # Priorità (coerente con 100px AgGrid)
-            2.6*inch,   # Contromisura - ottimizzata (coerente con 280px AgGrid)
-            0.7*inch,   # Stato (coerente con 80px AgGrid)
-            1.0*inch    # Data Scadenza (coerente con 110px AgGrid)
-        ])
-        
-        table_style = TableStyle([
-            # Header styling
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),      
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke), 
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),             
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),   
-            ('FONTSIZE', (0, 0), (-1, 0), 9),                  
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),            
-            
-            # Contenuto styling con auto-height
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),       
-            ('FONTSIZE', (0, 1), (-1, -1), 8),                 
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),       
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),               
-            
-            # Allineamento specifico per colonne di testo
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'),               # Descrizione a sinistra
-            ('ALIGN', (5, 1), (5, -1), 'LEFT'),               # Contromisura a sinistra
-            
-            # Padding ottimizzato per auto-height
-            ('LEFTPADDING', (0, 0), (-1, -1), 6),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ])
-        table.setStyle(table_style)
-        
-        # Rimozione dell'impostazione di altezza fissa per permettere auto-sizing
-        # Le righe si adatteranno automaticamente al contenuto
-        elements.append(table)
-
-        # Sezione riepilogo statistico
-        elements.append(Spacer(1, 0.5 * inch))
-        elements.append(Paragraph("Riepilogo per Priorità", styles['Heading2']))
-        priority_counts = df['Priorità'].value_counts()
-        summary_text = ""
-        for priority in ['Estrema', 'Alta', 'Media', 'Bassa']:
-            count = priority_counts.get(priority, 0)
-            summary_text += f"{priority}: {count} rischi<br/>"
-        elements.append(Paragraph(summary_text, styles['Normal']))
-
-        # Aggiunta heat map se disponibile
-        heatmap_img = create_heatmap_image(df)
-        if heatmap_img is not None:
-            elements.append(PageBreak())
-            elements.append(Paragraph("Heat Map dei Rischi", styles['Heading2']))
-            elements.append(Spacer(1, 0.2 * inch))
-            img = Image(heatmap_img, width=7 * inch, height=5 * inch)
-            elements.append(img)
-            elements.append(Spacer(1, 0.3 * inch))
-            elements.append(Paragraph(
-                "Note: I numeri neri indicano gli ID dei rischi posizionati secondo probabilità e impatto (valori da 1 a 5 con incrementi di 0.5). "
-                "I colori rappresentano le priorità: Verde (Bassa), Giallo (Media), Arancione (Alta), Rosso (Estrema).",
-                styles['Normal']))
-
-        # Generazione finale del PDF
-        doc.build(elements)
-        pdf_buffer.seek(0)
-        return pdf_buffer
-
-    except ImportError:
-        st.error("Librerie necessarie non disponibili. Installa con: pip install reportlab matplotlib")
-        return None
-    except Exception as e:
-        st.error(f"Errore nella creazione del PDF: {str(e)}")
-        return None
-
 # ===========================
 # INIZIALIZZAZIONE FORM STATE
 # ===========================
@@ -617,12 +264,9 @@ with st.form(key=f'form_nuovo_rischio_{st.session_state.form_counter}'):
             priorita = calcola_priorita(valore)
             data_scad_str = data_scad.strftime("%Y-%m-%d")
             
-            # Generazione ID incrementale automatico
-            nuovo_id = int(st.session_state.df["ID"].max()) + 1 if not st.session_state.df.empty else 1
-            
-            # Creazione nuovo record rischio
+            # Creazione nuovo record rischio: l'ID viene assegnato dalla sequenza
+            # persistente del registro, condivisa tra sessioni e processi
             new_row = {
-                "ID": nuovo_id,
                 "Descrizione": descrizione,
                 "Probabilità": prob,
                 "Impatto": imp,
@@ -633,12 +277,10 @@ with st.form(key=f'form_nuovo_rischio_{st.session_state.form_counter}'):
                 "Data scadenza": data_scad_str
             }
             
-            # Aggiunta al DataFrame principale
-            new_df = pd.DataFrame([new_row])
-            st.session_state.df = pd.concat([st.session_state.df, new_df], ignore_index=True)
-            
-            # Persistenza dati e reset form in caso di successo
-            if save_data(st.session_state.df, DATA_FILE):
+            # Persistenza della sola nuova riga e reset form in caso di successo
+            if insert_risk(new_row, DATA_FILE):
+                refresh_data()
+
                 # Reset automatico form per facilitare inserimenti multipli
                 st.session_state.form_descrizione = ""
                 st.session_state.form_prob = 1.0
@@ -655,6 +297,72 @@ with st.form(key=f'form_nuovo_rischio_{st.session_state.form_counter}'):
         else:
             st.warning("La descrizione non può essere vuota.")
 
+checkpoint("Form nuovo rischio")
+
+# ===========================
+# IMPORTAZIONE MASSIVA
+# ===========================
+
+with st.expander("📥 Importa Registro da CSV o Excel"):
+    uploaded = st.file_uploader("File da importare", type=['csv', 'xlsx'],
+                                key=f"import_file_{st.session_state.get('import_counter', 0)}",
+                                help="Una riga per rischio; le colonne vengono associate nel passo successivo")
+    if uploaded is not None:
+        try:
+            header = read_header(uploaded, uploaded.name)
+        except (ValueError, ImportError) as e:
+            st.error(f"Impossibile leggere il file: {e}")
+            header = []
+
+        if header:
+            # Associazione colonne del file -> colonne del registro (proposta dalle intestazioni)
+            suggested = suggest_mapping(header)
+            options = [None] + header
+            mapping = {}
+            mapping_columns = st.columns(3)
+            for i, column in enumerate(IMPORT_COLUMNS):
+                with mapping_columns[i % 3]:
+                    mapping[column] = st.selectbox(
+                        column, options, index=options.index(suggested[column]),
+                        format_func=lambda value: "— non importare —" if value is None else value,
+                        key=f"import_map_{column}")
+
+            # Il file viene elaborato una sola volta per file e mappatura, non ad ogni rerun
+            import_key = (uploaded.file_id, tuple(mapping.items()))
+            if st.session_state.get('import_key') != import_key:
+                progress = st.progress(0.0, text="Elaborazione del file...")
+                st.session_state.import_result = prepare_import(
+                    uploaded, uploaded.name, mapping,
+                    progress=lambda rows: progress.progress(min(uploaded.tell() / max(uploaded.size, 1), 1.0),
+                                                            text=f"Elaborate {rows} righe..."))
+                st.session_state.import_key = import_key
+                progress.empty()
+            result = st.session_state.import_result
+
+            st.write(f"**{result.total}** righe lette: **{len(result.rows)}** valide, "
+                     f"**{len(result.rejected)}** scartate")
+            if len(result.rejected):
+                st.warning(f"⚠️ {len(result.rejected)} righe non valide non verranno importate")
+                st.dataframe(result.rejected.head(IMPORT_PREVIEW_ROWS), hide_index=True)
+                st.download_button("Scarica righe scartate (CSV)", rejected_csv(result),
+                                   file_name=f"{os.path.splitext(uploaded.name)[0]}_scartate.csv",
+                                   mime='text/csv')
+            if len(result.rows):
+                st.caption(f"Anteprima delle prime {min(len(result.rows), IMPORT_PREVIEW_ROWS)} righe valide")
+                st.dataframe(serialize_frame(result.rows.head(IMPORT_PREVIEW_ROWS)), hide_index=True)
+                if st.button(f"Importa {len(result.rows)} rischi", type='primary'):
+                    # Un'unica operazione di salvataggio con ID assegnati in blocco
+                    added = commit_import(result, DATA_FILE)
+                    if added is not None:
+                        for key in ('import_key', 'import_result'):
+                            st.session_state.pop(key, None)
+                        st.session_state.import_counter = st.session_state.get('import_counter', 0) + 1
+                        refresh_data()
+                        st.success(f"Importati {len(added)} rischi")
+                        st.rerun()
+
+checkpoint("Importazione massiva")
+
 # ===========================
 # JAVASCRIPT PER UX MIGLIORATA
 # ===========================
@@ -704,6 +412,53 @@ document.addEventListener('keydown', function(event) {
 </script>
 """, unsafe_allow_html=True)
 
+checkpoint("Script JS")
+
+# ===========================
+# TABELLA PAGINATA LATO SERVER
+# ===========================
+
+def grid_page(df):
+    """
+    Controlli di ricerca, ordinamento e paginazione per registri grandi.
+
+    Filtro e ordinamento vengono eseguiti con pandas sul server e solo le
+    righe della pagina corrente vengono inviate alla griglia.
+
+    Args:
+        df (pd.DataFrame): Registro completo dei rischi
+
+    Returns:
+        pd.DataFrame: Righe della pagina corrente
+    """
+    col_search, col_sort, col_order, col_size = st.columns([3, 2, 1, 1])
+    search = col_search.text_input("🔍 Cerca in descrizione e contromisura", key='grid_search')
+    sort_label = col_sort.selectbox("Ordina per", list(GRID_SORT_COLUMNS), key='grid_sort')
+    descending = col_order.selectbox("Ordine", ["Crescente", "Decrescente"], key='grid_order') == "Decrescente"
+    page_size = col_size.selectbox("Righe per pagina", GRID_PAGE_SIZES, index=1, key='grid_page_size')
+
+    # Filtro testuale vettoriale sulle colonne di testo
+    if search.strip():
+        mask = pd.Series(False, index=df.index)
+        for column in GRID_TEXT_COLUMNS:
+            mask |= df[column].astype(str).str.contains(search.strip(), case=False, regex=False, na=False)
+        df = df[mask]
+
+    # Ordinamento stabile, a parità di valore per ID
+    sort_column = GRID_SORT_COLUMNS[sort_label]
+    by = [sort_column] if sort_column == 'ID' else [sort_column, 'ID']
+    df = df.sort_values(by, ascending=[not descending] + [True] * (len(by) - 1), kind='stable')
+
+    pages = max(1, -(-len(df) // page_size))
+    if st.session_state.get('grid_page', 1) > pages:
+        st.session_state.grid_page = pages  # Filtro più restrittivo: ultima pagina disponibile
+    page = st.number_input(f"Pagina (di {pages})", min_value=1, max_value=pages, step=1, key='grid_page')
+
+    start = (page - 1) * page_size
+    st.caption(f"Righe {min(start + 1, len(df))}-{min(start + page_size, len(df))} di {len(df)}"
+               + (f" (filtrate da {len(st.session_state.df)})" if search.strip() else ""))
+    return df.iloc[start:start + page_size]
+
 # ===========================
 # INTERFACCIA TABELLA RISCHI
 # ===========================
@@ -713,21 +468,19 @@ st.markdown("<div style='margin-bottom: 16px;'></div>", unsafe_allow_html=True)
 
 # Elaborazione e visualizzazione tabella solo se ci sono dati
 if not st.session_state.df.empty:
-    # Preparazione DataFrame per visualizzazione AgGrid
-    display_df = st.session_state.df.copy()
-    display_df = display_df.drop(columns=['Valore_Rischio'])  # Nasconde valore calcolato
-    
-    # Mappatura icone per stati per migliorare visual feedback
-    status_mapping = {
-        'Da pianificare': '📋',
-        'In corso': '⚡', 
-        'Monitoraggio': '👀',
-        'Chiuso': '✅'
-    }
-    display_df['Stato'] = display_df['Stato'].map(status_mapping)
-    
-    # Aggiunta colonna eliminazione per gestione interattiva
-    display_df['Elimina'] = False  # Colonna boolean per checkbox
+    # Registri grandi: alla griglia arriva solo la pagina corrente
+    large_grid = len(st.session_state.df) >= GRID_LARGE_ROWS
+
+    # Righe della tabella (senza Valore_Rischio, con icone di stato e colonna
+    # Elimina) dalla vista condivisa, aggiornata solo per le righe modificate
+    grid_frame = get_grid_frame(DATA_FILE)
+    if large_grid:
+        page_ids = pd.Index(grid_page(st.session_state.df)['ID'].astype(int))
+        display_df = grid_frame.loc[page_ids.intersection(grid_frame.index, sort=False)]
+    else:
+        display_df = grid_frame
+    display_df = display_df.reset_index(drop=True)  # Nuovo oggetto: la vista condivisa resta intatta
+    checkpoint("Preparazione tabella")
     
     # ===========================
     # CONFIGURAZIONE AGGRID AVANZATA
@@ -742,7 +495,7 @@ if not st.session_state.df.empty:
         value=True,               # Abilita visualizzazione valori
         enableRowGroup=False,     # Disabilita row grouping
         aggFunc="sum",           # Funzione aggregazione di default
-        editable=False,          # Disabilita editing inline per controllo
+        editable=False,          # Editing inline solo sulle colonne abilitate
         resizable=True,          # Permette ridimensionamento manuale colonne
         wrapText=True,           # Abilita text wrapping per contenuti lunghi
         autoHeight=True          # Altezza automatica basata su contenuto
@@ -756,16 +509,20 @@ if not st.session_state.df.empty:
     
     gb.configure_column("Descrizione", width=300, minWidth=250, maxWidth=350, header_name="DESCRIZIONE",
                     wrapText=True, autoHeight=True,
+                    editable=True, cellEditor="agLargeTextCellEditor", cellEditorPopup=True,
+                    cellEditorParams={'maxLength': 1000},
                     cellStyle={'textAlign': 'left', 'fontSize': '13px', 'fontWeight': '600',
                                 'padding': '8px', 'whiteSpace': 'normal', 'wordWrap': 'break-word', 'lineHeight': '1.4'})
     
     gb.configure_column("Probabilità", width=100, minWidth=80, maxWidth=120, header_name="PROBABILITÀ", 
                     wrapText=True, autoHeight=True,
+                    editable=True, cellEditor="agSelectCellEditor", cellEditorParams={'values': SCALE_VALUES},
                     cellStyle={'textAlign': 'center', 'fontSize': '14px', 'fontWeight': '600',
                                 'whiteSpace': 'normal', 'wordWrap': 'break-word'})
     
     gb.configure_column("Impatto", width=90, minWidth=70, maxWidth=110, header_name="IMPATTO", 
                     wrapText=True, autoHeight=True,
+                    editable=True, cellEditor="agSelectCellEditor", cellEditorParams={'values': SCALE_VALUES},
                     cellStyle={'textAlign': 'center', 'fontSize': '14px', 'fontWeight': '600',
                                 'whiteSpace': 'normal', 'wordWrap': 'break-word'})
     
@@ -776,22 +533,27 @@ if not st.session_state.df.empty:
     
     gb.configure_column("Contromisura", width=280, minWidth=200, maxWidth=320, header_name="CONTROMISURA",
                     wrapText=True, autoHeight=True,
+                    editable=True, cellEditor="agLargeTextCellEditor", cellEditorPopup=True,
+                    cellEditorParams={'maxLength': 1000},
                     cellStyle={'textAlign': 'left', 'fontSize': '13px', 'fontWeight': '600',
                                 'padding': '8px', 'whiteSpace': 'normal', 'wordWrap': 'break-word', 'lineHeight': '1.4'})
     
     gb.configure_column("Stato", width=80, minWidth=60, maxWidth=100, header_name="STATO",
                     wrapText=True, autoHeight=True,
+                    # La cella mostra l'icona, l'editor propone gli stati per nome
+                    editable=True, cellEditor="agSelectCellEditor", cellEditorParams={'values': list(STATUS_ICONS)},
                     cellStyle={'textAlign': 'center', 'fontSize': '16px', 'fontWeight': '500',
                                 'whiteSpace': 'normal', 'wordWrap': 'break-word'})
     
     gb.configure_column("Data scadenza", width=110, minWidth=90, maxWidth=130, header_name="SCADENZA", 
                     wrapText=True, autoHeight=True,
+                    editable=True, cellEditor="agDateStringCellEditor",  # Date in formato yyyy-mm-dd
                     cellStyle={'textAlign': 'center', 'fontSize': '12px', 'fontWeight': '600',
                                 'whiteSpace': 'normal', 'wordWrap': 'break-word'})
     
     # Configurazione colonna eliminazione con editor checkbox
     gb.configure_column("Elimina", width=80, minWidth=60, maxWidth=100, header_name="ELIMINA",
-        editable=True,                      # Unica colonna editabile
+        editable=True,                      # Checkbox di eliminazione
         cellEditor="agCheckboxCellEditor",  # Editor checkbox nativo AgGrid
         cellRenderer="agCheckboxCellRenderer", # Renderer checkbox
         cellStyle={
@@ -805,11 +567,25 @@ if not st.session_state.df.empty:
 
     # Configurazioni griglia generali
     gb.configure_selection(selection_mode="single", use_checkbox=False)  # Selezione singola riga
-    gb.configure_grid_options(domLayout='normal', getRowHeight=None, autoRowHeight=True)
+    gb.configure_grid_options(domLayout='normal', getRowHeight=None, autoRowHeight=True,
+                              # Identità stabile delle righe: dopo aggiunte ed eliminazioni
+                              # il browser aggiorna solo le righe cambiate
+                              getRowId=JsCode("function(params) { return String(params.data.ID); }"))
 
     # Build configurazione finale
     grid_options = gb.build()
 
+    if large_grid:
+        # Altezza automatica solo per le colonne di testo della pagina (le altre
+        # non bloccano la virtualizzazione delle righe); ordinamento e filtro
+        # sono già applicati dal server a tutto il registro
+        grid_options['defaultColDef'].update(wrapText=False, autoHeight=False, sortable=False, filter=False)
+        for column in grid_options['columnDefs']:
+            if column['field'] not in GRID_TEXT_COLUMNS:
+                column.update(wrapText=False, autoHeight=False)
+            column.update(sortable=False, filter=False)
+    checkpoint("GridOptionsBuilder")
+
     # ===========================
     # RENDERING AGGRID CON STILI PERSONALIZZATI
     # ===========================
@@ -819,11 +595,13 @@ if not st.session_state.df.empty:
         gridOptions=grid_options,
         height=400,                                    # Altezza fissa griglia
         width='100%',                                  # Larghezza completa
-        data_return_mode=DataReturnMode.FILTERED_AND_SORTED,  # Ritorna dati filtrati/ordinati
+        data_return_mode=GRID_RETURN_MODE,            # Righe nell'ordine dei nodi, confrontate per ID
         update_mode=GridUpdateMode.VALUE_CHANGED,     # Aggiornamento su modifica valori
         fit_columns_on_grid_load=False,               # Disabilita auto-fit per mantenere dimensioni fisse
         theme='streamlit',                            # Tema base Streamlit
         allow_unsafe_jscode=True,                     # Permette JavaScript personalizzato
+        key='risk_grid',                              # Stessa griglia tra i rerun: riceve solo i nuovi dati
+        server_sync_strategy='server_wins',           # Il registro sul server resta la fonte dei dati
         custom_css={
             # Styling toolbar griglia
             "#gridToolBar": {
@@ -983,34 +761,50 @@ if not st.session_state.df.empty:
     )
 
     # ===========================
-    # GESTIONE ELIMINAZIONE RISCHI
+    # GESTIONE MODIFICHE ED ELIMINAZIONI
     # ===========================
 
-    # Elaborazione response griglia per gestire eliminazioni
+    # Elaborazione response griglia: le righe sono confrontate per ID con il
+    # registro salvato e vengono scritte solo quelle modificate o da eliminare
     if 'data' in grid_response and grid_response['data'] is not None:
         updated_df = pd.DataFrame(grid_response['data'])
         
         # Ricerca righe marcate per eliminazione tramite checkbox
-        if 'Elimina' in updated_df.columns:
-            rows_to_delete = updated_df[updated_df['Elimina'] == True]
-            
-            if not rows_to_delete.empty:
-                # Estrazione ID rischi da eliminare
-                ids_to_delete = rows_to_delete['ID'].tolist()
-                
-                # Rimozione rischi dal dataset principale
-                for risk_id in ids_to_delete:
-                    st.session_state.df = st.session_state.df[st.session_state.df['ID'] != risk_id]
-                
-                # Persistenza immediata e refresh interfaccia
-                if save_data(st.session_state.df, DATA_FILE):
+        # (solo ID ancora presenti: la risposta della griglia persiste tra i rerun)
+        ids_to_delete = []
+        if 'Elimina' in updated_df.columns and not updated_df.empty:
+            marked = pd.to_numeric(updated_df.loc[updated_df['Elimina'] == True, 'ID'], errors='coerce')
+            marked = marked[marked.isin(st.session_state.df['ID'])]
+            ids_to_delete = [int(risk_id) for risk_id in marked.unique()]
+
+        # Righe modificate inline (validate e ricalcolate solo queste), rispetto alla
+        # tabella da cui proviene la risposta: non quella appena ricostruita, che può
+        # contenere modifiche salvate da altre sessioni dopo l'ultima interazione
+        edits, rejected = diff_grid_edits(updated_df, st.session_state.df,
+                                          st.session_state.get('grid_rendered'))
+        for risk_id, reason in rejected.items():
+            st.warning(f"⚠️ Modifica del rischio {risk_id} non salvata: {reason}")
+        edits = {risk_id: fields for risk_id, fields in edits.items() if risk_id not in ids_to_delete}
+
+        if ids_to_delete or edits:
+            # Modifiche ed eliminazioni in un'unica scrittura e refresh interfaccia
+            applied = apply_batch(DATA_FILE, updates=edits, deletes=ids_to_delete)
+            if applied is not None:
+                # Rerun solo se il registro è cambiato, altrimenti la stessa risposta si ripeterebbe
+                if any(applied.values()):
+                    refresh_data()
                     st.rerun()
-                else:
-                    st.error(f"Errore nel salvataggio dopo eliminazione")
+            else:
+                st.error("Errore nel salvataggio delle modifiche")
+
+    # Tabella mostrata all'utente, base del confronto per la prossima risposta della griglia
+    st.session_state.grid_rendered = display_df
 else:
     # Messaggio informativo quando non ci sono rischi
     st.info("Nessun rischio presente.")
 
+checkpoint("AgGrid")
+
 # ===========================
 # HEAT MAP INTERATTIVA
 # ===========================
@@ -1023,29 +817,6 @@ if not st.session_state.df.empty:
     impact_labels = ['1', '2', '3', '4', '5']
     likelihood_labels = ['1', '2', '3', '4', '5']
     
-    def get_risk_color_and_priority(prob, imp):
-        """
-        Determina colore e priorità basato sul valore del rischio.
-        
-        Args:
-            prob (float): Valore probabilità (1-5)
-            imp (float): Valore impatto (1-5)
-            
-        Returns:
-            tuple: (colore_hex, etichetta_priorità)
-        """
-        risk_value = prob * imp
-        if risk_value >= 16:
-            return '#ef4444', 'ESTREMA'  # Rosso per rischio critico
-        elif risk_value >= 11:
-            return '#f97316', 'ALTA'     # Arancione per rischio alto
-        elif risk_value >= 6:
-            return '#eab308', 'MEDIA'    # Giallo per rischio medio
-        elif risk_value >= 1:
-            return '#22c55e', 'BASSA'    # Verde per rischio basso
-        else:
-            return '#374151', 'NESSUNO'  # Grigio per nessun rischio
-    
     # ===========================
     # GENERAZIONE HTML HEAT MAP
     # ===========================
@@ -1075,30 +846,21 @@ if not st.session_state.df.empty:
             # Calcolo valori per cella della griglia
             prob = j + 1  # Probabilità: 1-5 da sinistra a destra
             imp = 5 - i   # Impatto: 5-1 da alto a basso (inversione per visualizzazione)
-            color, priority = get_risk_color_and_priority(prob, imp)
+            color, priority = get_risk_color(prob, imp)
             
             # Posizionamento cella
             x = j * cell_width
             y = i * cell_height
             
             # Creazione cella con tooltip informativo
-            heatmap_complete += f'<div style="position: absolute; left: {x}px; top: {y}px; width: {cell_width}px; height: {cell_height}px; background-color: {color}; border: 2px solid #334155; border-radius: 8px; box-shadow: 0 3px 8px rgba(0,0,0,0.2);" title="Prob: {prob}, Imp: {imp}, Priorità: {priority}"></div>'
+            heatmap_complete += f'<div style="position: absolute; left: {x}px; top: {y}px; width: {cell_width}px; height: {cell_height}px; background-color: {color}; border: 2px solid #334155; border-radius: 8px; box-shadow: 0 3px 8px rgba(0,0,0,0.2);" title="Prob: {prob}, Imp: {imp}, Priorità: {priority.upper()}"></div>'
     
     # ===========================
     # POSIZIONAMENTO RISCHI SULLA GRIGLIA
     # ===========================
     
-    # Raggruppamento rischi per posizione per gestire sovrapposizioni
-    risk_positions = {}
-    for _, row in st.session_state.df.iterrows():
-        prob = float(row['Probabilità'])
-        imp = float(row['Impatto'])
-        risk_id = int(row['ID'])
-        position_key = (prob, imp)
-        
-        if position_key not in risk_positions:
-            risk_positions[position_key] = []
-        risk_positions[position_key].append(risk_id)
+    # Rischi raggruppati per posizione dall'indice condiviso (ricalcolato solo se il registro cambia)
+    risk_positions = get_heatmap_index(DATA_FILE).positions()
     
     # Posizionamento marcatori rischi con coordinate precise
     for (prob, imp), risk_ids in risk_positions.items():
@@ -1117,8 +879,8 @@ if not st.session_state.df.empty:
         size = 28 + (num_risks - 1) * 6
         font_size = 11 if num_risks == 1 else 10
         
-        # Creazione stringa ID per etichetta
-        id_string = ", ".join(map(str, sorted(risk_ids)))
+        # Creazione stringa ID per etichetta (ID già ordinati dall'indice)
+        id_string = ", ".join(map(str, risk_ids))
         
         # Posizionamento finale centrato
         final_x = round(pixel_x - size/2)
@@ -1154,6 +916,87 @@ if not st.session_state.df.empty:
     # Rendering HTML heat map
     st.markdown(heatmap_complete, unsafe_allow_html=True)
 
+checkpoint("Heat map HTML")
+
+# ===========================
+# FUNZIONI DI ESPORTAZIONE
+# ===========================
+
+# Intervallo di aggiornamento dello stato di un export in corso (secondi)
+EXPORT_POLL_SECONDS = 1.0
+
+def export_progress(kind, noun):
+    """
+    Barra di avanzamento dell'export della sessione, aggiornata periodicamente.
+
+    Con st.fragment viene rieseguita solo la barra ogni EXPORT_POLL_SECONDS;
+    al termine del job la pagina viene ridisegnata una volta per mostrare il
+    risultato.
+    """
+    job = get_job(st.session_state.get(f'export_job_{kind}'))
+    if job is None or not job.active:
+        st.rerun()
+    st.progress(job.fraction(), text=f"Generazione {noun} in corso - {job.describe()}")
+
+if hasattr(st, 'fragment'):
+    export_progress = st.fragment(run_every=EXPORT_POLL_SECONDS)(export_progress)
+
+def export_status(kind, noun, download_label, extension, mime):
+    """
+    Mostra stato, avanzamento e pulsante di download dell'export della sessione.
+
+    Args:
+        kind (str): Tipo di report ('pdf' o 'excel')
+        noun (str): Nome del formato mostrato all'utente
+        download_label (str): Etichetta del pulsante di download
+        extension (str): Estensione del file scaricato
+        mime (str): Tipo MIME del file scaricato
+    """
+    job = get_job(st.session_state.get(f'export_job_{kind}'))
+    report_path = None
+    if job is not None and job.active:
+        export_progress(kind, noun)
+        if not hasattr(st, 'fragment'):
+            # Versioni di Streamlit senza frammenti: aggiornamento dell'intera pagina
+            time.sleep(EXPORT_POLL_SECONDS)
+            st.rerun()
+        return
+    if job is not None and job.status == JOB_FAILED:
+        st.error(job.error)
+    elif job is not None and job.version == get_data_version(DATA_FILE):
+        report_path = job.result
+        st.success(f"{noun} generato con successo!")
+    
+    # Report già generato per questa versione dei dati (anche da altre sessioni)
+    if report_path is None:
+        report_path = get_cached_report(kind, DATA_FILE)
+    
+    # Il report viene letto dal file in cache, senza copiarne il contenuto in sessione
+    report = open_report(report_path) if report_path is not None else None
+    if report is not None:
+        with report:
+            # Download button con filename dinamico
+            st.download_button(
+                label=download_label,
+                data=report,
+                file_name=f"risk_assessment_report_{date.today()}.{extension}",
+                mime=mime,
+                use_container_width=True
+            )
+
+def export_panel(kind, button_label, noun, download_label, extension, mime):
+    """
+    Pulsante di export che accoda la generazione del report in background.
+
+    Args:
+        kind (str): Tipo di report ('pdf' o 'excel')
+        button_label (str): Etichetta del pulsante di export
+        noun, download_label, extension, mime: Vedi export_status()
+    """
+    if st.button(button_label, use_container_width=True):
+        st.session_state[f'export_job_{kind}'] = submit_export(kind, DATA_FILE).id
+    export_status(kind, noun, download_label, extension, mime)
+
 # ===========================
 # SEZIONE ESPORTAZIONE DATI
 # ===========================
@@ -1173,277 +1016,17 @@ if not st.session_state.df.empty:
     # ===========================
     
     with col1:
-        if st.button("📄 Esporta in PDF", use_container_width=True):
-            with st.spinner("Generazione PDF in corso..."):
-                pdf_buffer = create_pdf_report(st.session_state.df)
-                
-                if pdf_buffer is not None:
-                    # Download button con filename dinamico
-                    st.download_button(
-                        label="⬇️ Scarica Report PDF",
-                        data=pdf_buffer,
-                        file_name=f"risk_assessment_report_{date.today()}.pdf",
-                        mime="application/pdf",
-                        use_container_width=True
-                    )
-                    st.success("PDF generato con successo!")
-                else:
-                    st.error("Impossibile generare il PDF. Verifica che la libreria ReportLab sia installata.")
+        export_panel('pdf', "📄 Esporta in PDF", "PDF", "⬇️ Scarica Report PDF", "pdf", "application/pdf")
     
     # ===========================
     # ESPORTAZIONE EXCEL
     # ===========================
     
     with col2:
-        if st.button("📊 Esporta in Excel", use_container_width=True):
-            try:
-                from openpyxl import Workbook
-                from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-                from openpyxl.utils.dataframe import dataframe_to_rows
-                
-                # Creazione workbook con foglio principale
-                wb = Workbook()
-                ws = wb.active
-                ws.title = "Risk Assessment"
-                
-                # ===========================
-                # DEFINIZIONE STILI EXCEL
-                # ===========================
-                
-                # Stili per header tabella
-                header_font = Font(bold=True, color="FFFFFF", size=12)
-                header_fill = PatternFill(start_color="1e293b", end_color="1e293b", fill_type="solid")
-                header_alignment = Alignment(horizontal="center", vertical="center")
-                
-                # Bordi per celle
-                border = Border(
-                    left=Side(style='thin', color='334155'),
-                    right=Side(style='thin', color='334155'),
-                    top=Side(style='thin', color='334155'),
-                    bottom=Side(style='thin', color='334155')
-                )
-                
-                # ===========================
-                # INTESTAZIONE DOCUMENTO
-                # ===========================
-                
-                # Titolo principale con merge celle
-                ws.merge_cells('A1:H1')
-                ws['A1'] = '🛡️ RISK ASSESSMENT REPORT'
-                ws['A1'].font = Font(bold=True, size=20, color="DC143C")
-                ws['A1'].alignment = Alignment(horizontal="center", vertical="center")
-                ws.row_dimensions[1].height = 40
-                
-                # Data generazione report
-                ws.merge_cells('A2:H2')
-                ws['A2'] = f'Data Report: {date.today().strftime("%d/%m/%Y")}'
-                ws['A2'].font = Font(size=12, italic=True)
-                ws['A2'].alignment = Alignment(horizontal="center", vertical="center")
-                ws.row_dimensions[2].height = 25
-                
-                # Riga vuota per spaziatura
-                ws.row_dimensions[3].height = 10
-                
-                # ===========================
-                # TABELLA DATI PRINCIPALE
-                # ===========================
-                
-                # Header tabella con ordine colonne identico a AgGrid (escluso Valore Rischio aggiuntivo)
-                headers = ['ID', 'Descrizione', 'Probabilità', 'Impatto', 'Valore Rischio', 'Priorità', 'Contromisura', 'Stato', 'Data Scadenza']
-                for col, header in enumerate(headers, 1):
-                    cell = ws.cell(row=4, column=col, value=header)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                    cell.alignment = header_alignment
-                    cell.border = border
-                
-                # Popolamento dati con ordine colonne coerente con AgGrid e text wrapping abilitato
-                for row_idx, (_, row) in enumerate(st.session_state.df.iterrows(), start=5):
-                    # Colonna 1: ID
-                    ws.cell(row=row_idx, column=1, value=row['ID']).border = border
-                    
-                    # Colonna 2: Descrizione con text wrapping
-                    desc_cell = ws.cell(row=row_idx, column=2, value=row['Descrizione'])
-                    desc_cell.border = border
-                    desc_cell.alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
-                    
-                    # Colonne 3-5: Valori numerici
-                    ws.cell(row=row_idx, column=3, value=f"{row['Probabilità']:.1f}").border = border
-                    ws.cell(row=row_idx, column=4, value=f"{row['Impatto']:.1f}").border = border
-                    ws.cell(row=row_idx, column=5, value=f"{row['Valore_Rischio']:.1f}").border = border
-                    
-                    # Colonna 6: Priorità con colore condizionale
-                    priority_cell = ws.cell(row=row_idx, column=6, value=row['Priorità'])
-                    priority_cell.border = border
-                    priority_cell.alignment = Alignment(horizontal="center", vertical="center")
-                    
-                    # Applicazione colori per priorità
-                    if row['Priorità'] == 'Estrema':
-                        priority_cell.fill = PatternFill(start_color="FFE4E1", end_color="FFE4E1", fill_type="solid")
-                        priority_cell.font = Font(bold=True, color="8B0000")
-                    elif row['Priorità'] == 'Alta':
-                        priority_cell.fill = PatternFill(start_color="FFE4B5", end_color="FFE4B5", fill_type="solid")
-                        priority_cell.font = Font(bold=True, color="FF8C00")
-                    elif row['Priorità'] == 'Media':
-                        priority_cell.fill = PatternFill(start_color="FFFACD", end_color="FFFACD", fill_type="solid")
-                        priority_cell.font = Font(bold=True, color="FFD700")
-                    else:
-                        priority_cell.fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
-                        priority_cell.font = Font(bold=True, color="006400")
-                    
-                    # Colonna 7: Contromisura con text wrapping
-                    cont_cell = ws.cell(row=row_idx, column=7, value=row['Contromisura'])
-                    cont_cell.border = border
-                    cont_cell.alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
-                    
-                    # Colonna 8: Stato
-                    ws.cell(row=row_idx, column=8, value=row['Stato']).border = border
-                    
-                    # Colonna 9: Data Scadenza
-                    ws.cell(row=row_idx, column=9, value=row['Data scadenza']).border = border
-                    
-                    # Allineamento centrale per colonne numeriche e di controllo
-                    for col in [1, 3, 4, 5, 6, 8, 9]:
-                        ws.cell(row=row_idx, column=col).alignment = Alignment(horizontal="center", vertical="center")
-                    
-                    # Rimozione altezza fissa - permettiamo auto-sizing basato sul contenuto
-                
-                # ===========================
-                # AGGIUNTA HEAT MAP AL FOGLIO PRINCIPALE (gestione migliorata)
-                # ===========================
-                
-                # Generazione heat map come immagine per Excel
-                heatmap_img_buffer = create_heatmap_image(st.session_state.df)
-                if heatmap_img_buffer is not None:
-                    try:
-                        # Importazione PIL per gestione immagini in Excel
-                        from PIL import Image as PILImage
-                        from openpyxl.drawing.image import Image as ExcelImage
-                        import io
-                        
-                        # Aggiunta spazio e titolo per heat map
-                        current_row = len(st.session_state.df) + 7  # Dopo dati + spazio
-                        
-                        # Titolo heat map
-                        ws.merge_cells(f'A{current_row}:I{current_row}')
-                        title_cell = ws[f'A{current_row}']
-                        title_cell.value = 'HEAT MAP DEI RISCHI'
-                        title_cell.font = Font(bold=True, size=16, color="DC143C")
-                        title_cell.alignment = Alignment(horizontal="center", vertical="center")
-                        ws.row_dimensions[current_row].height = 30
-                        
-                        # Creazione immagine direttamente da buffer (senza file temporaneo)
-                        img = ExcelImage(heatmap_img_buffer)
-                        img.width = 600   # Larghezza ottimizzata per Excel
-                        img.height = 400  # Altezza proporzionale
-                        
-                        # Posizionamento immagine
-                        ws.add_image(img, f'B{current_row + 2}')
-                        
-                        # Note esplicative sotto la heat map
-                        note_row = current_row + 22  # Spazio per immagine + margine
-                        ws.merge_cells(f'A{note_row}:I{note_row}')
-                        note_cell = ws[f'A{note_row}']
-                        note_cell.value = 'Note: I numeri neri indicano gli ID dei rischi posizionati secondo probabilità e impatto (valori da 1 a 5 con incrementi di 0.5). I colori rappresentano le priorità: Verde (Bassa), Giallo (Media), Arancione (Alta), Rosso (Estrema).'
-                        note_cell.font = Font(size=10, italic=True)
-                        note_cell.alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
-                        ws.row_dimensions[note_row].height = 40
-                        
-                    except ImportError:
-                        # Aggiunta nota se PIL non è disponibile
-                        note_row = len(st.session_state.df) + 8
-                        ws.merge_cells(f'A{note_row}:I{note_row}')
-                        note_cell = ws[f'A{note_row}']
-                        note_cell.value = 'Heat Map non disponibile: installare Pillow con "pip install Pillow" per includere visualizzazioni grafiche.'
-                        note_cell.font = Font(size=12, italic=True, color="FF0000")
-                        note_cell.alignment = Alignment(horizontal="center", vertical="center")
-                    except Exception as e:
-                        # Gestione errori generici con messaggio migliorato
-                        note_row = len(st.session_state.df) + 8
-                        ws.merge_cells(f'A{note_row}:I{note_row}')
-                        note_cell = ws[f'A{note_row}']
-                        note_cell.value = 'Heat Map non disponibile: errore nella generazione della visualizzazione.'
-                        note_cell.font = Font(size=12, italic=True, color="FF0000")
-                        note_cell.alignment = Alignment(horizontal="center", vertical="center")
-                
-                # ===========================
-                # LARGHEZZE COLONNE OTTIMIZZATE (ridotte per eliminare spazio vuoto)
-                # ===========================
-                
-                ws.column_dimensions['A'].width = 8    # ID - compatta (coerente con 60px AgGrid)
-                ws.column_dimensions['B'].width = 45   # Descrizione (coerente con 300px AgGrid)
-                ws.column_dimensions['C'].width = 12   # Probabilità (coerente con 100px AgGrid)
-                ws.column_dimensions['D'].width = 10   # Impatto (coerente con 90px AgGrid)
-                ws.column_dimensions['E'].width = 15   # Valore Rischio - calcolato
-                ws.column_dimensions['F'].width = 12   # Priorità (coerente con 100px AgGrid)
-                ws.column_dimensions['G'].width = 40   # Contromisura (coerente con 280px AgGrid)
-                ws.column_dimensions['H'].width = 12   # Stato (coerente con 80px AgGrid)
-                ws.column_dimensions['I'].width = 15   # Data Scadenza (coerente con 110px AgGrid)
-                
-                # ===========================
-                # FOGLIO RIEPILOGO STATISTICHE
-                # ===========================
-                
-                # Creazione secondo foglio per statistiche
-                ws2 = wb.create_sheet("Riepilogo")
-                
-                # Titolo riepilogo
-                ws2.merge_cells('A1:B1')
-                ws2['A1'] = 'RIEPILOGO RISCHI PER PRIORITÀ'
-                ws2['A1'].font = Font(bold=True, size=16, color="DC143C")
-                ws2['A1'].alignment = Alignment(horizontal="center", vertical="center")
-                
-                # Calcolo statistiche per priorità
-                priority_counts = st.session_state.df['Priorità'].value_counts()
-                
-                # Header tabella riepilogo
-                ws2['A3'] = 'Priorità'
-                ws2['B3'] = 'Numero Rischi'
-                ws2['A3'].font = header_font
-                ws2['A3'].fill = header_fill
-                ws2['B3'].font = header_font
-                ws2['B3'].fill = header_fill
-                
-                # Popolamento dati riepilogo in ordine di priorità
-                row = 4
-                for priority in ['Estrema', 'Alta', 'Media', 'Bassa']:
-                    ws2[f'A{row}'] = priority
-                    ws2[f'B{row}'] = priority_counts.get(priority, 0)
-                    row += 1
-                
-                # Riga totale
-                ws2[f'A{row}'] = 'TOTALE'
-                ws2[f'B{row}'] = len(st.session_state.df)
-                ws2[f'A{row}'].font = Font(bold=True)
-                ws2[f'B{row}'].font = Font(bold=True)
-                
-                # Ottimizzazione larghezze foglio riepilogo
-                ws2.column_dimensions['A'].width = 15
-                ws2.column_dimensions['B'].width = 15
-                
-                # ===========================
-                # GENERAZIONE FILE FINALE
-                # ===========================
-                
-                # Salvataggio in buffer per download
-                excel_buffer = BytesIO()
-                wb.save(excel_buffer)
-                excel_buffer.seek(0)
-                
-                # Download button con filename dinamico
-                st.download_button(
-                    label="⬇️ Scarica Report Excel",
-                    data=excel_buffer,
-                    file_name=f"risk_assessment_report_{date.today()}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True
-                )
-                st.success("Excel generato con successo!")
-                
-            except ImportError:
-                st.error("Libreria openpyxl non disponibile. Installa con: pip install openpyxl")
-            except Exception as e:
-                st.error(f"Errore nella generazione Excel: {str(e)}")
+        export_panel('excel', "📊 Esporta in Excel", "Excel", "⬇️ Scarica Report Excel", "xlsx",
+                     "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+checkpoint("Esportazione")
 
 # ===========================
 # FOOTER E INFORMAZIONI
@@ -1456,4 +1039,74 @@ st.markdown(
     "Dashboard Risk Assessment - Gestione professionale dei rischi di progetto - v1.1"
     "</div>", 
     unsafe_allow_html=True
-)
\ No newline at end of file
+)
+
+# ===========================
+# TEMPI DI CARICAMENTO E PRE-CARICAMENTO EXPORT
+# ===========================
+
+# Prima pagina completa del processo: misura dell'avvio e pre-caricamento
+# in background delle librerie di export (matplotlib, reportlab, openpyxl)
+mark_startup()
+prewarm_exports()
+
+with st.expander("⏱️ Tempi di caricamento"):
+    timings = get_timings()
+    st.dataframe(
+        pd.DataFrame({'Misura': list(timings), 'Secondi': [round(v, 3) for v in timings.values()]}),
+        hide_index=True, use_container_width=True
+    )
+
+checkpoint("Footer")
+
+# ===========================
+# PANNELLO DI DEBUG DEI RERUN
+# ===========================
+
+# Chiusura della misura prima di disegnare il pannello, che non viene conteggiato
+rerun = finish_rerun()
+rerun_history = st.session_state.setdefault('rerun_history', [])
+rerun_history.append(rerun.summary())
+del rerun_history[:-RERUN_HISTORY]
+
+# Il parametro di query vale per un solo rerun
+if PROFILE_QUERY_PARAM in st.query_params:
+    del st.query_params[PROFILE_QUERY_PARAM]
+
+with st.expander(f"🐞 Tempi per sezione (ultimi {RERUN_HISTORY} rerun)"):
+    st.markdown(f"**Ultimo rerun: {rerun.total:.3f} s**")
+    st.dataframe(
+        pd.DataFrame({
+            'Sezione': list(rerun.sections),
+            'Secondi': [round(v, 3) for v in rerun.sections.values()],
+            '%': [round(100 * v / rerun.total, 1) if rerun.total else 0.0 for v in rerun.sections.values()],
+        }),
+        hide_index=True, use_container_width=True
+    )
+    if rerun.calls:
+        st.dataframe(
+            pd.DataFrame({
+                'Funzione': list(rerun.calls),
+                'Chiamate': [calls for calls, _ in rerun.calls.values()],
+                'Secondi': [round(seconds, 3) for _, seconds in rerun.calls.values()],
+            }),
+            hide_index=True, use_container_width=True
+        )
+
+    st.markdown("**Storico dei rerun**")
+    st.dataframe(pd.DataFrame(rerun_history[::-1]), hide_index=True, use_container_width=True)
+
+    # Profilo cProfile del rerun (RISK_PROFILE=1, ?profile=1 o pulsante)
+    if rerun.profile_error:
+        st.warning(f"Profilo non disponibile: {rerun.profile_error}")
+    if rerun.profile_text:
+        st.markdown(f"**Profilo cProfile** (`{rerun.profile_path}`)")
+        st.code(rerun.profile_text)
+        if rerun.profile_path:
+            with open(rerun.profile_path, 'rb') as profile_file:
+                st.download_button("⬇️ Scarica profilo (.pstats)", data=profile_file.read(),
+                                   file_name=os.path.basename(rerun.profile_path),
+                                   mime="application/octet-stream")
+    if st.button("🔍 Profila il prossimo rerun"):
+        st.session_state.profile_next_rerun = True
+        st.rerun()
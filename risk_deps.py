@@ -0,0 +1,191 @@
+"""
+Importazione gestita delle librerie pesanti usate dagli export.
+
+matplotlib, reportlab, openpyxl e Pillow servono solo per heat map PNG,
+PDF ed Excel: vengono importati su richiesta per non rallentare l'avvio di
+`streamlit run risk_dashboard.py`. Dopo il primo rendering della pagina,
+prewarm_exports() li importa in un thread in background (costruendo anche
+la cache dei font di matplotlib), così il primo export non paga il costo di
+importazione. Il pre-caricamento si disattiva con RISK_PREWARM=0.
+
+I tempi di avvio, di importazione e del primo export di ogni processo sono
+raccolti in get_timings().
+"""
+
+import importlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# ===========================
+# CONFIGURAZIONE
+# ===========================
+
+# Pre-caricamento in background dello stack di export
+PREWARM_ENABLED = os.environ.get('RISK_PREWARM', '1') != '0'
+
+# Moduli importati dal pre-caricamento, per gruppo di export
+EXPORT_MODULES = {
+    'heatmap': ('numpy', 'matplotlib', 'matplotlib.font_manager', 'matplotlib.patches',
+                'matplotlib.figure', 'matplotlib.backends.backend_agg', 'matplotlib.image'),
+    'pdf': ('reportlab.lib.colors', 'reportlab.platypus', 'reportlab.lib.styles'),
+    'excel': ('openpyxl', 'openpyxl.styles', 'openpyxl.drawing.image', 'PIL.Image'),
+}
+
+# Istante di avvio del processo (primo import di questo modulo)
+PROCESS_START = time.perf_counter()
+
+_timings = {}
+_timings_lock = threading.Lock()
+_pyplot_lock = threading.Lock()
+_pyplot = None
+_prewarm_thread = None
+_warmers = []
+
+# ===========================
+# TEMPI DI CARICAMENTO
+# ===========================
+
+def record_timing(name, seconds, first_only=False):
+    """
+    Registra una durata in secondi.
+
+    Args:
+        name (str): Nome della misura (es. 'import:matplotlib', 'first_export:pdf')
+        seconds (float): Durata misurata
+        first_only (bool): Conserva solo la prima misura del processo
+    """
+    with _timings_lock:
+        if first_only and name in _timings:
+            return
+        _timings[name] = seconds
+
+@contextmanager
+def timed(name, first_only=False):
+    """Context manager che registra la durata del blocco con record_timing()."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - start, first_only)
+
+def mark_startup():
+    """Registra il tempo dall'avvio del processo al primo rendering completo."""
+    record_timing('startup', time.perf_counter() - PROCESS_START, first_only=True)
+
+def get_timings():
+    """
+    Ritorna le misure raccolte nel processo corrente.
+
+    Returns:
+        dict: Nome della misura -> durata in secondi
+    """
+    with _timings_lock:
+        return dict(_timings)
+
+# ===========================
+# IMPORTAZIONE SU RICHIESTA
+# ===========================
+
+def require(module_name):
+    """
+    Importa un modulo registrandone il tempo di caricamento.
+
+    Args:
+        module_name (str): Nome del modulo (es. 'matplotlib.patches')
+
+    Returns:
+        module: Il modulo importato
+
+    Raises:
+        ImportError: Se il modulo non è installato
+    """
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    elapsed = time.perf_counter() - start
+    if elapsed > 0.001:  # Solo importazioni effettive, non moduli già caricati
+        record_timing(f'import:{module_name}', elapsed, first_only=True)
+    return module
+
+def get_pyplot():
+    """
+    Ritorna matplotlib.pyplot configurato una sola volta con il backend Agg.
+
+    Returns:
+        module: matplotlib.pyplot
+
+    Raises:
+        ImportError: Se matplotlib non è installato
+    """
+    global _pyplot
+    if _pyplot is None:
+        with _pyplot_lock:
+            if _pyplot is None:
+                matplotlib = require('matplotlib')
+                matplotlib.use('Agg')  # Backend headless, senza finestre
+                _pyplot = require('matplotlib.pyplot')
+    return _pyplot
+
+# ===========================
+# PRE-CARICAMENTO IN BACKGROUND
+# ===========================
+
+def register_warmer(func):
+    """
+    Registra una funzione eseguita dal pre-caricamento dopo le importazioni.
+
+    Permette ai moduli di export di preparare in background risorse
+    costose (es. lo sfondo pre-renderizzato della heat map).
+
+    Args:
+        func (callable): Funzione senza argomenti
+
+    Returns:
+        callable: La funzione stessa, per l'uso come decoratore
+    """
+    _warmers.append(func)
+    return func
+
+def _prewarm(groups):
+    """Importa i moduli degli export indicati, ignorando quelli non installati."""
+    with timed('prewarm'):
+        for group in groups:
+            for module_name in EXPORT_MODULES[group]:
+                try:
+                    require(module_name)
+                except ImportError:
+                    break  # Libreria opzionale assente: l'export mostrerà il suo avviso
+            if group == 'heatmap':
+                try:
+                    get_pyplot()
+                except ImportError:
+                    pass
+        for func in _warmers:
+            try:
+                func()
+            except Exception:
+                pass  # Verrà ritentato (e segnalato) al primo export
+
+def prewarm_exports(groups=None):
+    """
+    Avvia (una sola volta per processo) il pre-caricamento dello stack di export.
+
+    Args:
+        groups (iterable, optional): Gruppi di EXPORT_MODULES da caricare,
+                                     di default tutti
+
+    Returns:
+        bool: True se il pre-caricamento è stato avviato da questa chiamata
+    """
+    global _prewarm_thread
+    if not PREWARM_ENABLED:
+        return False
+    with _timings_lock:
+        if _prewarm_thread is not None:
+            return False
+        _prewarm_thread = threading.Thread(
+            target=_prewarm, args=(tuple(groups or EXPORT_MODULES),),
+            name='risk-prewarm', daemon=True)
+    _prewarm_thread.start()
+    return True
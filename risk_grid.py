@@ -0,0 +1,230 @@
+"""
+Vista del registro per la tabella AgGrid.
+
+La tabella mostra il registro senza Valore_Rischio, con le icone dello stato
+e la colonna di eliminazione. Invece di ricostruire queste trasformazioni su
+tutte le righe ad ogni rerun, la vista è derivata dallo snapshot condiviso
+(risk_storage.get_derived) e dopo aggiunte, eliminazioni e modifiche viene
+aggiornata trasformando solo le righe coinvolte.
+
+Le righe sono indicizzate per ID: la griglia usa lo stesso ID come identità
+stabile delle righe (getRowId), così il browser aggiorna solo le righe
+aggiunte, rimosse o modificate. Lo stesso ID permette di confrontare i valori
+ritornati dalla griglia con il registro salvato (diff_grid_edits) e di
+salvare solo le righe modificate inline.
+"""
+
+import pandas as pd
+from st_aggrid import DataReturnMode
+
+from risk_schema import DATE_COLUMNS, format_date, serialize_frame
+from risk_storage import get_derived
+from risk_validation import SCALE_VALUES, check_rows, describe_problems
+
+# ===========================
+# CONFIGURAZIONE
+# ===========================
+
+# Mappatura icone per stati per migliorare visual feedback
+STATUS_ICONS = {
+    'Da pianificare': '📋',
+    'In corso': '⚡',
+    'Monitoraggio': '👀',
+    'Chiuso': '✅'
+}
+
+# Stato ritornato dalla griglia (icona) -> stato del registro
+ICON_STATUSES = {icon: status for status, icon in STATUS_ICONS.items()}
+
+# Colonne del registro non mostrate nella tabella (valore calcolato)
+HIDDEN_COLUMNS = ('Valore_Rischio',)
+
+# Colonne del registro lette per la tabella (lettura proiettata con Parquet/Arrow)
+GRID_COLUMNS = ('ID', 'Descrizione', 'Probabilità', 'Impatto', 'Priorità', 'Contromisura', 'Stato', 'Data scadenza')
+
+# Colonne modificabili direttamente nella tabella
+EDITABLE_COLUMNS = ('Descrizione', 'Probabilità', 'Impatto', 'Contromisura', 'Stato', 'Data scadenza')
+
+# Righe ritornate dalla griglia nell'ordine dei nodi. Con getRowId (ID del rischio)
+# AgGrid non aggiunge ::auto_unique_id:: e le modalità FILTERED/FILTERED_AND_SORTED
+# reindicizzano per ID di riga un frame con indice posizionale, ritornando solo NaN:
+# ordine e filtro non servono, le righe vengono confrontate con il registro per ID
+GRID_RETURN_MODE = DataReturnMode.AS_INPUT
+
+# ===========================
+# VISTA DELLA TABELLA
+# ===========================
+
+def _display_rows(rows):
+    """Trasforma righe del registro in righe della tabella, indicizzate per ID."""
+    # Date come testo yyyy-mm-dd (editor agDateStringCellEditor), categoriali come valori semplici
+    display = serialize_frame(rows.drop(columns=list(HIDDEN_COLUMNS), errors='ignore'))
+    display['Stato'] = display['Stato'].map(STATUS_ICONS)
+    display['Elimina'] = False  # Colonna boolean per checkbox
+    display.index = display['ID'].astype(int).to_numpy()
+    return display
+
+class GridDisplayFrame:
+    """
+    Righe della tabella dei rischi, aggiornate in modo incrementale.
+
+    Le istanze sono immutabili: gli aggiornamenti ritornano una nuova vista,
+    così le sessioni che stanno disegnando la tabella non vedono modifiche
+    parziali.
+
+    Args:
+        frame (pd.DataFrame): Righe della tabella indicizzate per ID
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    @classmethod
+    def from_frame(cls, df):
+        """Costruisce la vista dall'intero registro."""
+        return cls(_display_rows(df))
+
+    def on_insert(self, rows):
+        """Aggiornamento incrementale dopo l'aggiunta di righe."""
+        return GridDisplayFrame(pd.concat([self.frame, _display_rows(rows)]))
+
+    def on_delete(self, risk_ids):
+        """Aggiornamento incrementale dopo un'eliminazione."""
+        return GridDisplayFrame(self.frame.drop(index=[int(risk_id) for risk_id in risk_ids],
+                                                errors='ignore'))
+
+    def on_update(self, risk_id, fields):
+        """Aggiornamento incrementale dopo la modifica di un rischio."""
+        frame = self.frame.copy()
+        for column, value in fields.items():
+            if column in HIDDEN_COLUMNS or column not in frame.columns:
+                continue
+            if column == 'Stato':
+                value = STATUS_ICONS.get(value)
+            elif column in DATE_COLUMNS:
+                value = format_date(value) or None
+            frame.loc[risk_id, column] = value
+        return GridDisplayFrame(frame)
+
+    def on_batch(self, deleted, updated, added):
+        """Aggiornamento incrementale dopo un lotto di modifiche (risk_storage.apply_batch)."""
+        frame = self.frame.drop(index=[int(risk_id) for risk_id in deleted], errors='ignore')
+        if not updated.empty:
+            frame = frame.copy()
+            rows = _display_rows(updated)
+            frame.loc[rows.index, rows.columns] = rows
+        if not added.empty:
+            frame = pd.concat([frame, _display_rows(added)])
+        return GridDisplayFrame(frame)
+
+def get_grid_frame(file_path):
+    """
+    Ritorna le righe della tabella per la versione corrente del registro.
+
+    Args:
+        file_path (str): Percorso del file dei rischi
+
+    Returns:
+        pd.DataFrame: Righe indicizzate per ID, condivise tra le sessioni
+                      (da trattare in sola lettura)
+    """
+    return get_derived(file_path, 'grid_display', GridDisplayFrame.from_frame, columns=GRID_COLUMNS).frame
+
+# ===========================
+# MODIFICHE INLINE
+# ===========================
+
+def _edit_values(rows):
+    """
+    Valori delle colonne modificabili nella forma del registro, indicizzati per ID.
+
+    Le righe senza un ID numerico (risposta della griglia incompleta) vengono ignorate.
+    """
+    ids = pd.to_numeric(rows['ID'], errors='coerce')
+    rows = rows[ids.notna().to_numpy()]
+    values = pd.DataFrame(index=pd.Index(ids.dropna().astype(int).to_numpy(), name='ID'))
+    for column in EDITABLE_COLUMNS:
+        series = pd.Series(rows[column].to_numpy(), index=values.index)
+        if column in ('Probabilità', 'Impatto'):
+            series = pd.to_numeric(series, errors='coerce')
+        else:
+            series = series.where(series.notna(), '').astype(str).str.strip()
+            if column == 'Stato':
+                # Le righe non modificate ritornano l'icona, quelle modificate lo stato
+                series = series.map(ICON_STATUSES).fillna(series)
+            elif column == 'Data scadenza':
+                series = series.str[:10]  # Eventuale orario di date ISO complete
+        values[column] = series
+    return values
+
+def _validate_edits(values):
+    """
+    Verifica le righe modificate con gli stessi controlli del caricamento (risk_validation).
+
+    Args:
+        values (pd.DataFrame): Valori delle colonne modificabili, indicizzati per ID
+
+    Returns:
+        dict: ID -> motivo dello scarto, solo per le righe non valide
+    """
+    reasons = describe_problems(check_rows(values))
+    return {int(risk_id): reason for risk_id, reason in reasons.items()}
+
+def _differs(left, right):
+    """Celle diverse tra due frame allineati (due valori mancanti sono uguali)."""
+    return (left != right) & ~(left.isna() & right.isna())
+
+def diff_grid_edits(grid_rows, stored, rendered=None):
+    """
+    Confronta le righe ritornate dalla griglia con il registro salvato.
+
+    Il confronto avviene per ID sulle sole colonne modificabili: righe della
+    griglia non più presenti nel registro vengono ignorate e, se nulla è
+    cambiato, il risultato è vuoto (nessun salvataggio). Solo le righe
+    modificate vengono validate.
+
+    La risposta della griglia resta la stessa tra i rerun: se nel frattempo
+    un'altra sessione ha modificato il registro, i valori della risposta
+    differiscono da quelli salvati senza che l'utente li abbia toccati. Con
+    rendered vengono considerate solo le celle diverse dalla tabella mostrata
+    all'utente, così una risposta non aggiornata non annulla modifiche altrui.
+
+    Args:
+        grid_rows (pd.DataFrame): Dati ritornati da AgGrid (tutte le righe o una pagina)
+        stored (pd.DataFrame): Registro salvato
+        rendered (pd.DataFrame, optional): Righe della tabella da cui proviene la
+            risposta (get_grid_frame), per riconoscere le celle modificate dall'utente
+
+    Returns:
+        tuple: (modifiche valide {ID: {colonna: valore}} per risk_storage.apply_batch,
+                righe scartate {ID: motivo})
+    """
+    if grid_rows.empty or stored.empty or not set(EDITABLE_COLUMNS).issubset(grid_rows.columns):
+        return {}, {}
+    edited = _edit_values(grid_rows)
+    edited = edited[~edited.index.duplicated(keep='last')]
+    # Solo le righe mostrate: in modalità paginata la griglia ritorna una pagina
+    saved = _edit_values(serialize_frame(
+        stored[pd.to_numeric(stored['ID']).astype(int).isin(edited.index).to_numpy()]))
+    common = edited.index.intersection(saved.index, sort=False)
+    edited, saved = edited.loc[common], saved.loc[common]
+
+    changed = _differs(edited, saved)
+    if rendered is not None:
+        # Solo le celle modificate dall'utente rispetto alla tabella mostrata
+        shown = _edit_values(rendered[pd.to_numeric(rendered['ID'], errors='coerce').isin(common).to_numpy()])
+        shown = shown[~shown.index.duplicated(keep='last')].reindex(common)
+        changed &= _differs(edited, shown) & shown.notna().any(axis=1).to_numpy()[:, None]
+    modified = changed.any(axis=1)
+    if not modified.any():
+        return {}, {}
+    edited, changed = edited[modified], changed[modified]
+
+    invalid = _validate_edits(edited)
+    updates = {}
+    for risk_id, flags in changed.iterrows():
+        if risk_id in invalid:
+            continue
+        row = edited.loc[risk_id]
+        updates[int(risk_id)] = {column: row[column] for column in EDITABLE_COLUMNS if flags[column]}
+    return updates, invalid
@@ -0,0 +1,480 @@
+"""
+Heat map dei rischi: aggregazione per posizione e rendering PNG per i report.
+
+L'indice HeatmapIndex raggruppa gli ID dei rischi per coppia
+(Probabilità, Impatto) con un groupby vettoriale. Viene costruito una sola
+volta per versione del registro tramite risk_storage.get_derived() e
+aggiornato in modo incrementale ad ogni aggiunta, eliminazione o modifica;
+alimenta allo stesso modo la heat map web, il PNG e gli export PDF/Excel.
+
+Il PNG renderizzato viene memorizzato in una cache indicizzata per contenuto:
+LRU in memoria (RISK_HEATMAP_CACHE_SIZE immagini) con un livello opzionale
+su disco nella cartella RISK_HEATMAP_CACHE_DIR, condiviso tra processi.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import streamlit as st
+
+from risk_deps import get_pyplot, register_warmer, require
+from risk_profiling import instrumented
+from risk_scoring import DEFAULT_ENGINE, get_risk_color
+from risk_storage import get_derived
+
+# ===========================
+# INDICE DI AGGREGAZIONE
+# ===========================
+
+# Colonne del registro usate dall'indice (lettura proiettata con Parquet/Arrow)
+HEATMAP_COLUMNS = ('ID', 'Probabilità', 'Impatto')
+
+class HeatmapIndex:
+    """
+    ID dei rischi raggruppati per posizione sulla heat map.
+
+    Le istanze sono immutabili: gli aggiornamenti incrementali ritornano un
+    nuovo indice, così le sessioni che stanno disegnando la heat map non
+    vedono modifiche parziali.
+
+    Args:
+        cells (dict): (Probabilità, Impatto) -> tupla ordinata di ID
+        where (dict): ID -> (Probabilità, Impatto)
+    """
+
+    def __init__(self, cells, where):
+        self.cells = cells
+        self.where = where
+
+    @classmethod
+    def from_frame(cls, df):
+        """Costruisce l'indice da un registro con un unico groupby vettoriale."""
+        if df.empty:
+            return cls({}, {})
+        ordered = df[list(HEATMAP_COLUMNS)].sort_values('ID', kind='stable')
+        ids = ordered['ID'].astype(int)
+        grouped = ids.groupby([ordered['Probabilità'].astype(float),
+                               ordered['Impatto'].astype(float)], sort=False).agg(tuple)
+        cells = {(float(prob), float(imp)): tuple(map(int, group))
+                 for (prob, imp), group in grouped.items()}
+        where = dict(zip(ids.tolist(), zip(ordered['Probabilità'].astype(float).tolist(),
+                                           ordered['Impatto'].astype(float).tolist())))
+        return cls(cells, where)
+
+    def positions(self):
+        """
+        Ritorna le posizioni occupate con gli ID ordinati.
+
+        Returns:
+            dict: (Probabilità, Impatto) -> lista ordinata di ID
+        """
+        return {position: list(ids) for position, ids in self.cells.items() if ids}
+
+    def _with_changes(self, removed, added):
+        """Nuovo indice con gli ID rimossi e aggiunti (ID -> posizione)."""
+        cells = dict(self.cells)
+        where = dict(self.where)
+        touched = {}
+        for risk_id in removed:
+            position = where.pop(risk_id, None)
+            if position is not None:
+                touched.setdefault(position, set(cells.get(position, ()))).discard(risk_id)
+        for risk_id, position in added.items():
+            where[risk_id] = position
+            touched.setdefault(position, set(cells.get(position, ()))).add(risk_id)
+        for position, ids in touched.items():
+            if ids:
+                cells[position] = tuple(sorted(ids))
+            else:
+                cells.pop(position, None)
+        return HeatmapIndex(cells, where)
+
+    def on_insert(self, rows):
+        """Aggiornamento incrementale dopo l'aggiunta di righe."""
+        added = dict(zip(rows['ID'].astype(int).tolist(),
+                         zip(rows['Probabilità'].astype(float).tolist(),
+                             rows['Impatto'].astype(float).tolist())))
+        return self._with_changes(added.keys(), added)
+
+    def on_delete(self, risk_ids):
+        """Aggiornamento incrementale dopo un'eliminazione."""
+        return self._with_changes([int(risk_id) for risk_id in risk_ids], {})
+
+    def on_batch(self, deleted, updated, added):
+        """Aggiornamento incrementale dopo un lotto di modifiche (risk_storage.apply_batch)."""
+        changed = {}
+        for rows in (updated, added):
+            changed.update(zip(rows['ID'].astype(int).tolist(),
+                               zip(rows['Probabilità'].astype(float).tolist(),
+                                   rows['Impatto'].astype(float).tolist())))
+        return self._with_changes([int(risk_id) for risk_id in deleted] + list(changed), changed)
+
+    def on_update(self, risk_id, fields):
+        """Aggiornamento incrementale dopo la modifica di un rischio."""
+        if 'Probabilità' not in fields and 'Impatto' not in fields:
+            return self
+        if risk_id not in self.where:
+            return self  # Rischio non presente nell'indice (es. riga in quarantena)
+        prob, imp = self.where.get(risk_id, (None, None))
+        position = (float(fields.get('Probabilità', prob)), float(fields.get('Impatto', imp)))
+        return self._with_changes([risk_id], {risk_id: position})
+
+@instrumented()
+def get_heatmap_index(file_path):
+    """
+    Ritorna l'indice della heat map per la versione corrente del registro.
+
+    Args:
+        file_path (str): Percorso del file dei rischi
+
+    Returns:
+        HeatmapIndex: Indice condiviso tra le sessioni
+    """
+    return get_derived(file_path, 'heatmap_index', HeatmapIndex.from_frame, columns=HEATMAP_COLUMNS)
+
+# ===========================
+# CACHE DELLE IMMAGINI
+# ===========================
+
+# Modalità di rendering: 'template' (sfondo pre-renderizzato, solo marcatori
+# ridisegnati) oppure 'full' (figura completa ad ogni chiamata)
+HEATMAP_RENDER_MODE = os.environ.get('RISK_HEATMAP_RENDER_MODE', 'template')
+
+# Impostazioni di rendering, incluse nella chiave della cache
+HEATMAP_RENDER_SETTINGS = {'figsize': (10, 8), 'dpi': 300, 'mode': HEATMAP_RENDER_MODE}
+
+# Numero massimo di immagini nella cache in memoria (LRU)
+HEATMAP_CACHE_SIZE = int(os.environ.get('RISK_HEATMAP_CACHE_SIZE', 16))
+
+# Cartella opzionale per la cache su disco
+HEATMAP_CACHE_DIR = os.environ.get('RISK_HEATMAP_CACHE_DIR')
+
+_png_cache = OrderedDict()
+_png_cache_lock = threading.Lock()
+
+def heatmap_cache_key(positions):
+    """
+    Calcola la chiave di contenuto della heat map.
+
+    La chiave dipende dalle terne (ID, Probabilità, Impatto), dalle
+    impostazioni di rendering e dalle soglie che determinano i colori delle
+    celle e la legenda; non dipende dall'ordine delle righe né dalle altre colonne.
+
+    Args:
+        positions (dict): (Probabilità, Impatto) -> lista ordinata di ID
+
+    Returns:
+        str: Digest SHA-256 esadecimale
+    """
+    digest = hashlib.sha256()
+    digest.update(repr(sorted(HEATMAP_RENDER_SETTINGS.items())).encode())
+    digest.update(repr(DEFAULT_ENGINE.thresholds.tolist()).encode())
+    digest.update(repr(_legend_entries()).encode())  # Anche le immagini su disco con la legenda precedente
+    for position in sorted(positions):
+        digest.update(repr((position, list(positions[position]))).encode())
+    return digest.hexdigest()
+
+def _cache_get(key):
+    """Cerca l'immagine nella cache in memoria e poi su disco."""
+    with _png_cache_lock:
+        png = _png_cache.get(key)
+        if png is not None:
+            _png_cache.move_to_end(key)
+            return png
+    if not HEATMAP_CACHE_DIR:
+        return None
+    try:
+        with open(os.path.join(HEATMAP_CACHE_DIR, f'{key}.png'), 'rb') as f:
+            png = f.read()
+    except OSError:
+        return None
+    _cache_put(key, png, persist=False)
+    return png
+
+def _cache_put(key, png, persist=True):
+    """Memorizza l'immagine nella cache LRU e, se configurata, su disco."""
+    with _png_cache_lock:
+        _png_cache[key] = png
+        _png_cache.move_to_end(key)
+        while len(_png_cache) > HEATMAP_CACHE_SIZE:
+            _png_cache.popitem(last=False)
+    if not (persist and HEATMAP_CACHE_DIR):
+        return
+    try:
+        os.makedirs(HEATMAP_CACHE_DIR, exist_ok=True)
+        path = os.path.join(HEATMAP_CACHE_DIR, f'{key}.png')
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # Livello su disco opzionale: l'immagine resta comunque in memoria
+
+# ===========================
+# RENDERING PNG PER I REPORT
+# ===========================
+
+def _legend_entries(engine=DEFAULT_ENGINE):
+    """
+    Voci della legenda dalle soglie del motore di scoring.
+
+    Ogni soglia è il valore minimo della priorità successiva: la prima
+    priorità è indicata con il limite superiore, le altre con il minimo.
+
+    Returns:
+        list: (colore, etichetta) per priorità, es. ('#eab308', 'Media (≥ 6)')
+    """
+    limits = [f'< {engine.thresholds[0]:g}'] + [f'≥ {threshold:g}' for threshold in engine.thresholds]
+    return [(color, f'{label} ({limit})') for label, color, limit in zip(engine.labels, engine.colors, limits)]
+
+def _draw_background(fig, ax, patches):
+    """
+    Disegna la parte statica della heat map: griglia colorata, assi, titoli e legenda.
+
+    È identica per ogni registro e dipende solo dalle soglie di priorità.
+    """
+    fig.patch.set_facecolor('white')
+    
+    # Creazione griglia di sfondo 5x5 con colori dalla tabella di scoring
+    for i in range(5):  # Righe: Impatto (1-5, dal basso all'alto)
+        for j in range(5):  # Colonne: Probabilità (1-5, da sinistra a destra)
+            prob = j + 1  
+            imp = i + 1   
+            color, _ = get_risk_color(prob, imp)
+    
+            # Disegno rettangolo con colore appropriato
+            rect = patches.Rectangle((j, i), 1, 1, linewidth=2, 
+                                   edgecolor='#334155', facecolor=color, alpha=0.7)
+            ax.add_patch(rect)
+    
+    # Configurazione assi e layout
+    ax.set_xlim(0, 5)
+    ax.set_ylim(0, 5)
+    ax.set_aspect('equal')
+    
+    # Etichettatura assi
+    prob_labels = ['1', '2', '3', '4', '5']
+    imp_labels = ['1', '2', '3', '4', '5']
+    
+    ax.set_xticks([0.5, 1.5, 2.5, 3.5, 4.5])
+    ax.set_xticklabels(prob_labels, fontsize=9)
+    ax.set_yticks([0.5, 1.5, 2.5, 3.5, 4.5])
+    ax.set_yticklabels(imp_labels, fontsize=9)
+    
+    # Titoli e etichette
+    ax.set_xlabel('PROBABILITÀ', fontweight='bold', fontsize=12, labelpad=10)
+    ax.set_ylabel('IMPATTO', fontweight='bold', fontsize=12, labelpad=10)
+    ax.set_title('HEAT MAP DEI RISCHI', fontweight='bold', fontsize=14, pad=20)
+    
+    # Griglia di supporto
+    ax.grid(True, alpha=0.3)
+    ax.set_axisbelow(True)
+    
+    # Legenda colori per priorità, con gli intervalli delle soglie configurate
+    legend_elements = [patches.Patch(color=color, label=label) for color, label in _legend_entries()]
+    ax.legend(handles=legend_elements, loc='upper left', bbox_to_anchor=(1.02, 1), 
+             title='Priorità', title_fontsize=10, fontsize=9)
+
+def _add_markers(ax, positions, patches, np):
+    """
+    Aggiunge i marcatori dei rischi (cerchi neri con gli ID) alla heat map.
+
+    Returns:
+        list: Artisti matplotlib aggiunti, nell'ordine di disegno
+    """
+    artists = []
+    
+    # Posizionamento marcatori dei rischi
+    for (prob, imp), risk_ids in positions.items():
+        if prob >= 1 and imp >= 1:  # Validazione range valori
+            # Calcolo posizione precisa basata su valori decimali
+            x = prob - 0.5  # Conversione da scala 1-5 a coordinate 0.5-4.5
+            y = imp - 0.5   
+    
+            # Creazione etichetta con ID multipli se necessario (ID già ordinati)
+            id_string = ', '.join(map(str, risk_ids))
+    
+            # Dimensionamento dinamico ottimizzato per cerchi compatti con testo leggibile
+            num_risks = len(risk_ids)
+    
+            # Calcolo dimensione cerchio compatta con font più grande
+            char_count = len(id_string)
+            if char_count <= 2:  # Singolo ID (es. "1", "12")
+                base_size = 55
+                font_size = 10
+            elif char_count <= 5:  # Due ID (es. "1, 2")
+                base_size = 80
+                font_size = 9
+            elif char_count <= 8:  # Tre ID (es. "1, 2, 3")
+                base_size = 115
+                font_size = 8
+            else:  # Quattro o più ID
+                base_size = 150
+                font_size = 7
+    
+            # Incremento proporzionale per rischi multipli
+            circle_size = base_size + (num_risks - 1) * 12
+    
+            # Creazione cerchio nero di sfondo identico alla versione web
+            circle = patches.Circle((x, y), radius=np.sqrt(circle_size)/40, 
+                                  facecolor='black', edgecolor='white', 
+                                  linewidth=2, zorder=10)
+            artists.append(ax.add_patch(circle))
+    
+            # Etichetta testuale con ID - styling identico alla versione web
+            artists.append(ax.text(x, y, id_string, ha='center', va='center', 
+                                   color='white', fontweight='bold', fontsize=font_size, 
+                                   zorder=11))
+    return artists
+
+class _HeatmapTemplate:
+    """
+    Sfondo statico della heat map pre-renderizzato una sola volta per processo.
+
+    La figura viene disegnata con l'API orientata agli oggetti (senza lo
+    stato globale di pyplot) e il raster dello sfondo viene conservato: ogni
+    richiesta ripristina lo sfondo, disegna solo i marcatori e ritaglia
+    l'immagine sul riquadro che savefig(bbox_inches='tight') userebbe.
+    Un lock serializza l'uso della figura condivisa tra i thread di Streamlit.
+    """
+
+    def __init__(self):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        
+        self.patches = require('matplotlib.patches')
+        self.np = require('numpy')
+        self.image = require('matplotlib.image')
+        self.lock = threading.Lock()
+        
+        dpi = HEATMAP_RENDER_SETTINGS['dpi']
+        self.figure = Figure(figsize=HEATMAP_RENDER_SETTINGS['figsize'], dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot()
+        _draw_background(self.figure, self.axes, self.patches)
+        self.figure.tight_layout()
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        
+        # Riquadro 'tight' in pixel (margine di 0.1 pollici come savefig)
+        tight = self.figure.get_tightbbox(self.canvas.get_renderer()).padded(0.1)
+        height = self.figure.bbox.height
+        self.crop = (slice(max(int(height - tight.y1 * dpi), 0), int(height - tight.y0 * dpi)),
+                     slice(max(int(tight.x0 * dpi), 0), int(tight.x1 * dpi)))
+
+    def render(self, positions):
+        """Compone i marcatori sullo sfondo e ritorna il PNG."""
+        with self.lock:
+            self.canvas.restore_region(self.background)
+            artists = _add_markers(self.axes, positions, self.patches, self.np)
+            try:
+                for artist in artists:
+                    self.axes.draw_artist(artist)
+                pixels = self.np.asarray(self.canvas.buffer_rgba())[self.crop].copy()
+            finally:
+                for artist in artists:
+                    artist.remove()
+        
+        img_buffer = BytesIO()
+        self.image.imsave(img_buffer, pixels, format='png', dpi=HEATMAP_RENDER_SETTINGS['dpi'])
+        return img_buffer.getvalue()
+
+_template = None
+_template_lock = threading.Lock()
+
+def _get_template():
+    """Ritorna lo sfondo pre-renderizzato, creandolo al primo utilizzo."""
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = _HeatmapTemplate()
+    return _template
+
+if HEATMAP_RENDER_MODE == 'template':
+    # Lo sfondo viene preparato dal pre-caricamento in background
+    register_warmer(_get_template)
+
+def _render_heatmap_png(positions):
+    """
+    Disegna la heat map con matplotlib.
+
+    In modalità 'template' (default) lo sfondo statico è pre-renderizzato e
+    vengono disegnati solo i marcatori; in modalità 'full' l'intera figura
+    viene ricreata ad ogni chiamata.
+
+    Args:
+        positions (dict): (Probabilità, Impatto) -> lista ordinata di ID
+
+    Returns:
+        bytes: Immagine PNG
+
+    Raises:
+        ImportError: Se matplotlib non è disponibile
+    """
+    if HEATMAP_RENDER_MODE == 'template':
+        return _get_template().render(positions)
+    
+    # pyplot con backend Agg configurato una sola volta per processo
+    plt = get_pyplot()
+    patches = require('matplotlib.patches')
+    np = require('numpy')
+    
+    # Inizializzazione figura con dimensioni originali
+    fig, ax = plt.subplots(figsize=HEATMAP_RENDER_SETTINGS['figsize'])
+    _draw_background(fig, ax, patches)
+    _add_markers(ax, positions, patches, np)
+    
+    # Salvataggio in buffer per utilizzo nei report
+    img_buffer = BytesIO()
+    plt.tight_layout()
+    plt.savefig(img_buffer, format='PNG', dpi=HEATMAP_RENDER_SETTINGS['dpi'], bbox_inches='tight', 
+               facecolor='white', edgecolor='none')
+    plt.close(fig)
+    
+    return img_buffer.getvalue()
+
+@instrumented()
+def create_heatmap_image(df, positions=None):
+    """
+    Genera una heat map dei rischi come immagine PNG per l'inclusione nei report PDF.
+    
+    La heat map visualizza:
+    - Griglia 5x5 rappresentando combinazioni Probabilità/Impatto
+    - Colori basati sui livelli di priorità
+    - Posizionamento preciso dei rischi basato sui valori decimali
+    - Etichette con ID dei rischi in cerchi neri con dimensionamento dinamico
+    
+    L'immagine viene renderizzata solo se la sua chiave di contenuto non è
+    già in cache: export ripetuti di un registro invariato non usano matplotlib.
+    
+    Args:
+        df (pd.DataFrame): DataFrame contenente i dati dei rischi
+        positions (dict, optional): Posizioni già aggregate (HeatmapIndex.positions()),
+                                   calcolate da df se non indicate
+        
+    Returns:
+        BytesIO: Buffer contenente l'immagine PNG della heat map,
+                None se matplotlib non è disponibile o si verifica un errore
+    """
+    # Rischi raggruppati per posizione per gestire sovrapposizioni
+    if positions is None:
+        positions = HeatmapIndex.from_frame(df).positions()
+    
+    key = heatmap_cache_key(positions)
+    png = _cache_get(key)
+    if png is None:
+        try:
+            png = _render_heatmap_png(positions)
+        except ImportError:
+            st.warning("Matplotlib non disponibile. Heat map non inclusa nel PDF.")
+            return None
+        except Exception as e:
+            st.warning(f"Errore nella creazione della heat map: {str(e)}")
+            return None
+        _cache_put(key, png)
+    
+    return BytesIO(png)
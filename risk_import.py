@@ -0,0 +1,385 @@
+"""
+Importazione massiva di registri dei rischi da file CSV o Excel.
+
+Il file viene letto a blocchi di RISK_IMPORT_CHUNK_ROWS righe (read_csv con
+chunksize, righe di openpyxl in sola lettura), così anche registri molto
+grandi non vengono mai caricati interamente come testo. Ogni blocco viene
+rinominato secondo la mappatura delle colonne, normalizzato, validato con le
+maschere di risk_validation e valutato con il motore di scoring, tutto con
+operazioni vettoriali. Le righe valide vengono poi salvate con un'unica
+chiamata a risk_storage.apply_batch(), che riserva gli ID in un solo blocco.
+
+Le stesse funzioni servono all'ingestione di una cartella di file
+(`python -m risk_dashboard ingest`, vedi risk_cli): ogni file viene letto da
+parse_file() in un pool, le righe già presenti nel registro vengono
+riconosciute da una chiave configurabile (RISK_INGEST_KEY) e scartate.
+"""
+
+import csv
+import io
+import os
+import time
+
+import pandas as pd
+
+from risk_deps import require
+from risk_profiling import instrumented
+from risk_schema import STATUS_VALUES, TEXT_DTYPE, apply_schema, serialize_frame, to_dates
+from risk_scoring import score_frame
+from risk_storage import apply_batch
+from risk_validation import REASON_COLUMN, check_rows, describe_problems
+
+# ===========================
+# CONFIGURAZIONE
+# ===========================
+
+# Righe elaborate per blocco
+IMPORT_CHUNK_ROWS = int(os.environ.get('RISK_IMPORT_CHUNK_ROWS', 20000))
+
+# Formati accettati
+IMPORT_EXTENSIONS = ('.csv', '.xlsx')
+
+# Colonne del registro valorizzate dall'importazione (ID e valori calcolati esclusi)
+IMPORT_COLUMNS = ('Descrizione', 'Probabilità', 'Impatto', 'Contromisura', 'Stato', 'Data scadenza')
+
+# Intestazioni riconosciute automaticamente per ogni colonna (confronto senza maiuscole)
+COLUMN_ALIASES = {
+    'Descrizione': ('descrizione', 'descrizione rischio', 'rischio', 'description', 'risk'),
+    'Probabilità': ('probabilità', 'probabilita', "probabilita'", 'prob', 'probability', 'likelihood'),
+    'Impatto': ('impatto', 'imp', 'impact', 'severity'),
+    'Contromisura': ('contromisura', 'contromisure', 'mitigazione', 'azione', 'countermeasure', 'mitigation'),
+    'Stato': ('stato', 'status', 'state'),
+    'Data scadenza': ('data scadenza', 'scadenza', 'data_scadenza', 'deadline', 'due date', 'due_date'),
+}
+
+# Valori usati per le colonne non presenti nel file
+IMPORT_DEFAULTS = {'Contromisura': '', 'Stato': 'Da pianificare'}
+
+# Colonna con il numero di riga del file sorgente nelle righe scartate
+ROW_COLUMN = 'Riga'
+
+# Formato alternativo delle date (es. 31/12/2025), oltre a quello ISO
+DAYFIRST_FORMAT = '%d/%m/%Y'
+
+_STATUS_LOOKUP = {status.lower(): status for status in STATUS_VALUES}
+
+# ===========================
+# LETTURA A BLOCCHI
+# ===========================
+
+def _rewind(source):
+    """Riporta all'inizio un file aperto (es. UploadedFile di Streamlit); i percorsi restano invariati."""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+def _csv_options(source):
+    """Separatore (',' ';' o tabulazione) e codifica del CSV, dedotti dall'inizio del file."""
+    if hasattr(source, 'read'):
+        sample = _rewind(source).read(64 * 1024)
+    else:
+        with open(source, 'rb') as f:
+            sample = f.read(64 * 1024)
+    try:
+        text, encoding = sample.decode('utf-8-sig'), 'utf-8-sig'
+    except UnicodeDecodeError:
+        text, encoding = sample.decode('latin-1'), 'latin-1'
+    try:
+        sep = csv.Sniffer().sniff(text.split('\n', 1)[0], delimiters=',;\t').delimiter
+    except csv.Error:
+        sep = ','
+    return {'sep': sep, 'encoding': encoding}
+
+def iter_chunks(source, name, chunk_rows=None):
+    """
+    Legge il file a blocchi, con tutti i valori come testo (o come celle Excel).
+
+    Args:
+        source: Percorso o file aperto in modalità binaria
+        name (str): Nome del file, per riconoscerne il formato
+        chunk_rows (int, optional): Righe per blocco, di default IMPORT_CHUNK_ROWS
+
+    Yields:
+        pd.DataFrame: Blocco con le colonne del file, indicizzato per numero di riga del file
+
+    Raises:
+        ValueError: Se il formato non è supportato
+        ImportError: Se openpyxl non è installato (file .xlsx)
+    """
+    chunk_rows = chunk_rows or IMPORT_CHUNK_ROWS
+    extension = os.path.splitext(name)[1].lower()
+    if extension == '.csv':
+        options = _csv_options(source)
+        reader = pd.read_csv(_rewind(source), dtype=str, chunksize=chunk_rows, skipinitialspace=True,
+                             keep_default_na=False, na_values=[''], **options)
+        with reader:
+            for chunk in reader:
+                chunk.index = chunk.index + 2  # Riga 1: intestazione
+                yield chunk
+    elif extension == '.xlsx':
+        workbook = require('openpyxl').load_workbook(_rewind(source), read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(value).strip() if value is not None else f'Colonna {i + 1}'
+                      for i, value in enumerate(next(rows, ()))]
+            block, numbers = [], []
+            for number, row in enumerate(rows, start=2):
+                if not any(value is not None for value in row):
+                    continue  # Righe vuote del foglio
+                block.append(row[:len(header)])
+                numbers.append(number)
+                if len(block) >= chunk_rows:
+                    yield pd.DataFrame(block, columns=header, index=numbers)
+                    block, numbers = [], []
+            if block:
+                yield pd.DataFrame(block, columns=header, index=numbers)
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f"Formato non supportato: {extension or name} (ammessi: {', '.join(IMPORT_EXTENSIONS)})")
+
+def read_header(source, name):
+    """Ritorna le intestazioni del file leggendo solo il primo blocco."""
+    for chunk in iter_chunks(source, name, chunk_rows=1):
+        return list(chunk.columns)
+    return []
+
+def suggest_mapping(columns):
+    """
+    Propone la mappatura tra colonne del registro e intestazioni del file.
+
+    Args:
+        columns (list): Intestazioni del file
+
+    Returns:
+        dict: Colonna del registro -> intestazione del file (None se non trovata)
+    """
+    by_name = {str(column).strip().lower(): column for column in columns}
+    return {target: next((by_name[alias] for alias in aliases if alias in by_name), None)
+            for target, aliases in COLUMN_ALIASES.items()}
+
+# ===========================
+# NORMALIZZAZIONE E VALIDAZIONE
+# ===========================
+
+def _dates(values):
+    """Date ISO (o già convertite da Excel), poi nel formato gg/mm/aaaa; non valide -> NaT."""
+    dates = to_dates(values)
+    retry = dates.isna() & values.notna()
+    if retry.any():
+        dates = dates.where(~retry, pd.to_datetime(values.where(retry).astype(object), format=DAYFIRST_FORMAT,
+                                                   errors='coerce'))
+    return dates
+
+def normalize_chunk(chunk, mapping):
+    """
+    Porta un blocco del file nella forma del registro.
+
+    Testi senza spazi superflui, numeri anche con la virgola decimale, stati
+    riconosciuti senza distinguere maiuscole e minuscole, date ISO o
+    gg/mm/aaaa. Le colonne non mappate ricevono IMPORT_DEFAULTS.
+
+    Args:
+        chunk (pd.DataFrame): Blocco letto da iter_chunks()
+        mapping (dict): Colonna del registro -> intestazione del file (o None)
+
+    Returns:
+        pd.DataFrame: Colonne IMPORT_COLUMNS con lo stesso indice del blocco
+    """
+    rows = {}
+    for column in IMPORT_COLUMNS:
+        source = mapping.get(column)
+        if source is None or source not in chunk.columns:
+            rows[column] = IMPORT_DEFAULTS.get(column)
+            continue
+        values = chunk[source]
+        if column in ('Probabilità', 'Impatto'):
+            if not pd.api.types.is_numeric_dtype(values.dtype):
+                values = values.astype(TEXT_DTYPE).str.strip().str.replace(',', '.', regex=False)
+            rows[column] = pd.to_numeric(values, errors='coerce')
+        elif column == 'Data scadenza':
+            rows[column] = _dates(values)
+        else:
+            text = values.astype(TEXT_DTYPE).str.strip()
+            text = text.where(text != '')
+            if column == 'Stato':
+                text = text.str.lower().map(_STATUS_LOOKUP).fillna(text)
+            if column in IMPORT_DEFAULTS:
+                text = text.fillna(IMPORT_DEFAULTS[column])
+            rows[column] = text
+    return pd.DataFrame(rows, index=chunk.index)
+
+class ImportResult:
+    """
+    Esito della preparazione di un'importazione.
+
+    Args:
+        rows (pd.DataFrame): Righe valide, tipizzate e con valore e priorità calcolati
+        rejected (pd.DataFrame): Righe scartate con i valori del file, numero di riga e motivo
+        total (int): Righe lette dal file
+        chunks (int): Blocchi elaborati
+    """
+
+    def __init__(self, rows, rejected, total, chunks):
+        self.rows = rows
+        self.rejected = rejected
+        self.total = total
+        self.chunks = chunks
+
+@instrumented()
+def prepare_import(source, name, mapping, chunk_rows=None, progress=None):
+    """
+    Legge, normalizza, valida e valuta il file a blocchi senza salvare nulla.
+
+    Args:
+        source: Percorso o file aperto in modalità binaria
+        name (str): Nome del file (.csv o .xlsx)
+        mapping (dict): Colonna del registro -> intestazione del file (o None)
+        chunk_rows (int, optional): Righe per blocco, di default IMPORT_CHUNK_ROWS
+        progress (callable, optional): Chiamata con il numero di righe lette dopo ogni blocco
+
+    Returns:
+        ImportResult: Righe valide e righe scartate con il motivo
+    """
+    valid, rejected, total, chunks = [], [], 0, 0
+    for chunk in iter_chunks(source, name, chunk_rows):
+        rows = normalize_chunk(chunk, mapping)
+        problems = check_rows(rows)
+        bad = problems.any(axis=1).to_numpy()
+        if bad.any():
+            reasons = describe_problems(problems)
+            rejected.append(chunk[bad].astype(object).assign(**{ROW_COLUMN: chunk.index[bad],
+                                                                REASON_COLUMN: reasons.to_numpy()}))
+        if not bad.all():
+            valid.append(apply_schema(score_frame(apply_schema(rows[~bad]))))
+        total += len(chunk)
+        chunks += 1
+        if progress is not None:
+            progress(total)
+
+    rows = pd.concat(valid) if valid else pd.DataFrame(columns=list(IMPORT_COLUMNS))
+    rejected = pd.concat(rejected) if rejected else pd.DataFrame(columns=[ROW_COLUMN, REASON_COLUMN])
+    if len(rejected):
+        rejected = rejected[[ROW_COLUMN] + [c for c in rejected.columns if c not in (ROW_COLUMN, REASON_COLUMN)]
+                            + [REASON_COLUMN]]
+    return ImportResult(rows.reset_index(drop=True), rejected.reset_index(drop=True), total, chunks)
+
+def commit_import(result, file_path):
+    """
+    Salva le righe valide di un'importazione con un'unica operazione.
+
+    Args:
+        result (ImportResult): Esito di prepare_import()
+        file_path (str): Percorso del file dei rischi
+
+    Returns:
+        list | None: ID assegnati ai rischi importati, None se il salvataggio non è riuscito
+    """
+    if result.rows.empty:
+        return []
+    applied = apply_batch(file_path, adds=result.rows)
+    return None if applied is None else applied['added']
+
+def rejected_csv(result):
+    """Righe scartate in formato CSV, per il download dalla dashboard."""
+    buffer = io.StringIO()
+    result.rejected.to_csv(buffer, index=False)
+    return buffer.getvalue().encode('utf-8-sig')
+
+# ===========================
+# INGESTIONE DA CARTELLA
+# ===========================
+
+# Colonne che identificano un rischio già presente nel registro (separate da virgola)
+INGEST_KEY = tuple(column.strip() for column in os.environ.get('RISK_INGEST_KEY', 'Descrizione').split(','))
+
+# Colonne che ogni file della cartella deve contenere (riconosciute da suggest_mapping)
+REQUIRED_COLUMNS = ('Descrizione', 'Probabilità', 'Impatto', 'Data scadenza')
+
+# Colonna con il file di provenienza nelle righe scartate dell'ingestione
+SOURCE_COLUMN = 'File'
+
+def find_import_files(folder):
+    """
+    Elenca i file CSV ed Excel di una cartella e delle sue sottocartelle.
+
+    Args:
+        folder (str): Cartella da esplorare
+
+    Returns:
+        list: Percorsi assoluti ordinati (file nascosti e temporanei di Excel esclusi)
+    """
+    paths = []
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if name.lower().endswith(IMPORT_EXTENSIONS) and not name.startswith(('.', '~$')):
+                paths.append(os.path.abspath(os.path.join(root, name)))
+    return paths
+
+def parse_file(path, chunk_rows=None):
+    """
+    Legge e valida un file della cartella; eseguita nei thread o processi del pool.
+
+    Le colonne vengono associate automaticamente dalle intestazioni: un file
+    senza una delle REQUIRED_COLUMNS viene segnalato come errore invece di
+    produrre solo righe scartate.
+
+    Args:
+        path (str): Percorso del file (.csv o .xlsx)
+        chunk_rows (int, optional): Righe per blocco, di default IMPORT_CHUNK_ROWS
+
+    Returns:
+        tuple: (esito con percorso, righe lette/valide/scartate, durata ed eventuale errore,
+                ImportResult o None in caso di errore)
+    """
+    start = time.perf_counter()
+    report = {'path': path, 'total': 0, 'valid': 0, 'rejected': 0, 'error': None}
+    result = None
+    try:
+        mapping = suggest_mapping(read_header(path, path))
+        missing = [column for column in REQUIRED_COLUMNS if mapping[column] is None]
+        if missing:
+            raise ValueError(f"colonne non trovate: {', '.join(missing)}")
+        result = prepare_import(path, path, mapping, chunk_rows)
+        report.update(total=result.total, valid=len(result.rows), rejected=len(result.rejected))
+    except ImportError as e:
+        report['error'] = f"Libreria non disponibile: {e}"
+    except Exception as e:
+        report['error'] = str(e)
+    report['seconds'] = time.perf_counter() - start
+    return report, result
+
+def key_hashes(df, key):
+    """
+    Hash della chiave di deduplicazione di ogni riga.
+
+    I valori vengono confrontati come testo senza spazi superflui e senza
+    distinguere maiuscole e minuscole, con le date nel formato del registro.
+
+    Args:
+        df (pd.DataFrame): Righe del registro o da importare
+        key (tuple): Colonne della chiave
+
+    Returns:
+        pd.Series: Hash a 64 bit con lo stesso indice di df
+    """
+    values = serialize_frame(df[list(key)])
+    values = values.assign(**{column: values[column].astype(TEXT_DTYPE).str.strip().str.casefold()
+                              for column in key})
+    return pd.util.hash_pandas_object(values, index=False)
+
+def find_duplicates(rows, existing, key):
+    """
+    Righe già presenti nel registro o ripetute tra le righe da importare.
+
+    Args:
+        rows (pd.DataFrame): Righe da importare, nell'ordine di priorità
+        existing (pd.DataFrame): Registro corrente
+        key (tuple): Colonne della chiave
+
+    Returns:
+        pd.Series: True per le righe da non importare (vale la prima occorrenza)
+    """
+    hashes = key_hashes(rows, key)
+    return hashes.isin(key_hashes(existing, key).to_numpy()) | hashes.duplicated(keep='first')
@@ -0,0 +1,179 @@
+"""
+Coda di esportazione in background per i report PDF ed Excel.
+
+Il click su un pulsante di export accoda un job invece di generare il
+report nello script Streamlit: i job vengono eseguiti da un pool di thread
+con al massimo RISK_EXPORT_WORKERS generazioni contemporanee, così gli
+export non sottraggono thread del server agli utenti interattivi. La pagina
+interroga lo stato del job (righe scritte, heat map renderizzata) e mostra
+il pulsante di download al termine.
+
+Richieste contemporanee dello stesso report sulla stessa versione dei dati
+condividono un unico job; il risultato finisce nella cache dei report
+(risk_reports).
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from risk_deps import record_timing
+from risk_profiling import instrumented
+from risk_reports import REPORT_IMPORT_ERRORS, get_report
+from risk_storage import get_data_version
+
+# ===========================
+# CONFIGURAZIONE CODA
+# ===========================
+
+# Numero massimo di report generati contemporaneamente
+EXPORT_WORKERS = max(1, int(os.environ.get('RISK_EXPORT_WORKERS', 2)))
+
+# Numero di job conclusi conservati per la consultazione dello stato
+EXPORT_JOB_HISTORY = 16
+
+# Stati di un job
+JOB_QUEUED = 'in coda'
+JOB_RUNNING = 'in corso'
+JOB_DONE = 'completato'
+JOB_FAILED = 'errore'
+
+# ===========================
+# JOB DI ESPORTAZIONE
+# ===========================
+
+class ExportJob:
+    """
+    Stato di una generazione di report in background.
+
+    Gli attributi vengono aggiornati dal thread del pool e letti dalle
+    sessioni Streamlit; ogni assegnazione è atomica.
+
+    Args:
+        job_id (str): Identificativo del job
+        kind (str): Tipo di report ('pdf' o 'excel')
+        file_path (str): Percorso del file dei rischi
+        version (tuple): Versione dei dati al momento della richiesta
+    """
+
+    def __init__(self, job_id, kind, file_path, version):
+        self.id = job_id
+        self.kind = kind
+        self.file_path = file_path
+        self.version = version
+        self.status = JOB_QUEUED
+        self.rows_done = 0
+        self.rows_total = 0
+        self.heatmap_done = False
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def active(self):
+        """True finché il job è in coda o in esecuzione."""
+        return self.status in (JOB_QUEUED, JOB_RUNNING)
+
+    def fraction(self):
+        """Avanzamento stimato tra 0 e 1 (righe al 90%, heat map al 10%)."""
+        if self.status == JOB_DONE:
+            return 1.0
+        rows = self.rows_done / self.rows_total if self.rows_total else 0.0
+        return min(0.9 * rows + (0.1 if self.heatmap_done else 0.0), 0.99)
+
+    def describe(self):
+        """Descrizione testuale dello stato, per la barra di avanzamento."""
+        if self.status == JOB_QUEUED:
+            return "In coda..."
+        if self.status == JOB_RUNNING:
+            text = f"Righe scritte: {self.rows_done}/{self.rows_total}"
+            if self.heatmap_done:
+                text += " - heat map renderizzata"
+            return text
+        if self.status == JOB_FAILED:
+            return self.error
+        return "Completato"
+
+    def _progress(self, stage, done, total):
+        """Callback di avanzamento passata al generatore del report."""
+        if stage == 'rows':
+            self.rows_done, self.rows_total = done, total
+        elif stage == 'heatmap':
+            self.heatmap_done = True
+
+# ===========================
+# POOL DI ESECUZIONE
+# ===========================
+
+_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='risk-export')
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+_job_ids = itertools.count(1)
+
+def _run(job):
+    """Esegue il job nel pool registrando esito e tempi."""
+    job.status = JOB_RUNNING
+    start = time.perf_counter()
+    try:
+        job.result = get_report(job.kind, job.file_path, progress=job._progress)
+        job.status = JOB_DONE
+        record_timing(f'first_export:{job.kind}', time.perf_counter() - start, first_only=True)
+    except ImportError:
+        job.error = REPORT_IMPORT_ERRORS[job.kind]
+        job.status = JOB_FAILED
+    except Exception as e:
+        job.error = f"Errore nella generazione del report: {str(e)}"
+        job.status = JOB_FAILED
+    finally:
+        job.finished_at = time.time()
+
+@instrumented()
+def submit_export(kind, file_path):
+    """
+    Accoda la generazione di un report.
+
+    Se per lo stesso registro, tipo e versione dei dati c'è già un job in
+    coda o in esecuzione, viene riutilizzato (un job successivo troverebbe
+    comunque il report nella cache).
+
+    Args:
+        kind (str): Tipo di report ('pdf' o 'excel')
+        file_path (str): Percorso del file dei rischi
+
+    Returns:
+        ExportJob: Job da interrogare con get_job()
+    """
+    path = os.path.abspath(file_path)
+    version = get_data_version(path)
+    with _jobs_lock:
+        for job in reversed(_jobs.values()):
+            if (job.kind, job.file_path, job.version) == (kind, path, version) and job.active:
+                return job
+
+        job = ExportJob(f'{kind}-{next(_job_ids)}', kind, path, version)
+        _jobs[job.id] = job
+
+        # Rimozione dei job conclusi più vecchi
+        finished = [job_id for job_id, old in _jobs.items() if not old.active]
+        for job_id in finished[:max(len(finished) - EXPORT_JOB_HISTORY, 0)]:
+            del _jobs[job_id]
+
+    _executor.submit(_run, job)
+    return job
+
+def get_job(job_id):
+    """
+    Ritorna un job accodato, None se sconosciuto o già rimosso.
+
+    Args:
+        job_id (str): Identificativo ritornato da submit_export()
+
+    Returns:
+        ExportJob: Stato corrente del job
+    """
+    with _jobs_lock:
+        return _jobs.get(job_id)
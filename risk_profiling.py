@@ -0,0 +1,187 @@
+"""
+Strumentazione dei rerun della dashboard.
+
+Streamlit riesegue l'intero script ad ogni interazione: per capire quale parte
+domina, ogni rerun misura la durata delle sue sezioni (checkpoint() tra una
+sezione e la successiva) e delle funzioni chiave decorate con instrumented()
+(load_data, save_data, generazione dei report...). La pagina conserva gli
+ultimi RISK_RERUN_HISTORY rerun nel pannello di debug.
+
+Per un singolo rerun può essere catturato anche un profilo cProfile, salvato
+come file pstats in RISK_PROFILE_DIR: con RISK_PROFILE=1 (ogni rerun), con il
+parametro di query ?profile=1 oppure dal pulsante del pannello.
+
+Le misure sono associate al thread dello script: le chiamate eseguite da
+altri thread (es. i job di esportazione) non vengono attribuite al rerun.
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# ===========================
+# CONFIGURAZIONE
+# ===========================
+
+# Profilo cProfile di ogni rerun
+PROFILE_ENABLED = os.environ.get('RISK_PROFILE', '0') == '1'
+
+# Parametro di query che attiva il profilo del rerun corrente (?profile=1)
+PROFILE_QUERY_PARAM = 'profile'
+
+# Cartella dei file pstats
+PROFILE_DIR = os.environ.get('RISK_PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'risk_profiles')
+
+# Funzioni riportate nel riepilogo testuale del profilo
+PROFILE_TOP = 30
+
+# Numero di rerun conservati nel pannello di debug
+RERUN_HISTORY = int(os.environ.get('RISK_RERUN_HISTORY', 20))
+
+_local = threading.local()
+
+# ===========================
+# MISURA DEL RERUN
+# ===========================
+
+class RerunTimer:
+    """
+    Tempi di un'esecuzione dello script.
+
+    Args:
+        profile (bool): Cattura un profilo cProfile dell'esecuzione
+    """
+
+    def __init__(self, profile=False):
+        self.started_at = time.time()
+        self._start = self._last = time.perf_counter()
+        self.total = None
+        self.sections = OrderedDict()  # Sezione -> secondi
+        self.calls = OrderedDict()     # Funzione -> [chiamate, secondi]
+        self.profiler = None
+        self.profile_path = None
+        self.profile_text = None
+        self.profile_error = None
+        if profile:
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError as e:  # Un altro profiler è già attivo
+                self.profiler = None
+                self.profile_error = str(e)
+
+    def checkpoint(self, name):
+        """Chiude la sezione corrente: il tempo dal checkpoint precedente va a name."""
+        now = time.perf_counter()
+        self.sections[name] = self.sections.get(name, 0.0) + now - self._last
+        self._last = now
+
+    def record_call(self, name, seconds):
+        """Accumula la durata di una chiamata a una funzione strumentata."""
+        calls = self.calls.setdefault(name, [0, 0.0])
+        calls[0] += 1
+        calls[1] += seconds
+
+    def finish(self):
+        """Chiude la misura e, se attivo, salva il profilo in PROFILE_DIR."""
+        self.total = time.perf_counter() - self._start
+        if self.profiler is None:
+            return
+        self.profiler.disable()
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))
+            self.profile_path = os.path.join(PROFILE_DIR, f'rerun-{stamp}-{id(self):x}.pstats')
+            self.profiler.dump_stats(self.profile_path)
+        except OSError as e:
+            self.profile_error = f"Impossibile salvare il profilo: {e}"
+            self.profile_path = None
+        text = io.StringIO()
+        pstats.Stats(self.profiler, stream=text).sort_stats('cumulative').print_stats(PROFILE_TOP)
+        self.profile_text = text.getvalue()
+        self.profiler = None
+
+    def summary(self):
+        """
+        Riga riassuntiva per lo storico dei rerun.
+
+        Returns:
+            dict: Ora, durata totale e secondi per sezione
+        """
+        row = {'Ora': time.strftime('%H:%M:%S', time.localtime(self.started_at)),
+               'Totale': round(self.total or 0.0, 3)}
+        row.update((name, round(seconds, 3)) for name, seconds in self.sections.items())
+        return row
+
+def start_rerun(profile=False):
+    """
+    Inizia la misura dell'esecuzione corrente dello script.
+
+    Un'eventuale misura precedente rimasta aperta sullo stesso thread (rerun
+    interrotto da st.rerun()) viene scartata.
+
+    Args:
+        profile (bool): Cattura un profilo cProfile dell'esecuzione
+
+    Returns:
+        RerunTimer: Misura associata al thread corrente
+    """
+    stale = getattr(_local, 'timer', None)
+    if stale is not None and stale.profiler is not None:
+        stale.profiler.disable()
+    _local.timer = RerunTimer(profile)
+    return _local.timer
+
+def checkpoint(name):
+    """Chiude la sezione corrente del rerun, se la misura è attiva."""
+    timer = getattr(_local, 'timer', None)
+    if timer is not None:
+        timer.checkpoint(name)
+
+def finish_rerun():
+    """
+    Conclude la misura dell'esecuzione corrente.
+
+    Returns:
+        RerunTimer: Misura conclusa, None se non era stata avviata
+    """
+    timer = getattr(_local, 'timer', None)
+    _local.timer = None
+    if timer is not None:
+        timer.finish()
+    return timer
+
+def instrumented(name=None):
+    """
+    Decoratore che attribuisce la durata delle chiamate al rerun corrente.
+
+    Fuori da un rerun misurato (altri thread, script headless) la funzione
+    viene chiamata direttamente.
+
+    Args:
+        name (str, optional): Nome mostrato nel pannello, di default quello della funzione
+
+    Returns:
+        callable: Decoratore
+    """
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timer = getattr(_local, 'timer', None)
+            if timer is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timer.record_call(label, time.perf_counter() - start)
+        return wrapper
+    return decorator
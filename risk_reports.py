@@ -0,0 +1,775 @@
+"""
+Generazione dei report PDF ed Excel dei rischi.
+
+Il report contiene la tabella dei rischi, il riepilogo per priorità e la
+heat map. Le righe della tabella vengono prodotte da un generatore che
+scorre il registro a blocchi (itertuples su slice, non iterrows) e i
+flowable vengono passati a ReportLab man mano che l'impaginazione li
+consuma, senza costruire la lista completa del documento.
+
+Per registri grandi (da RISK_PDF_LARGE_ROWS righe in su) la tabella viene
+suddivisa in tabelle da RISK_PDF_CHUNK_ROWS righe con intestazione ripetuta
+e il PDF viene scritto su un file temporaneo invece che in un BytesIO: la
+memoria occupata dalle righe resta proporzionale alla dimensione del blocco,
+non al numero di rischi.
+
+Il report Excel usa fogli openpyxl in sola scrittura con stili con nome
+condivisi: le righe vengono serializzate man mano e i valori sono preparati
+per colonna, a blocchi di RISK_EXCEL_CHUNK_ROWS righe.
+
+I report generati sono conservati in una cache condivisa tra le sessioni,
+indicizzata per versione dei dati, tipo di report e opzioni di rendering e
+limitata a RISK_REPORT_CACHE_BYTES byte: get_report() genera il report una
+sola volta finché il registro non cambia. La cache contiene file nella
+cartella RISK_REPORT_SPOOL_DIR, non il contenuto dei report: il download
+legge direttamente dal file (open_report).
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from copy import copy
+from datetime import date
+from io import BytesIO
+
+import pandas as pd
+import streamlit as st
+
+from risk_deps import require
+from risk_heatmap import HeatmapIndex, create_heatmap_image, get_heatmap_index
+from risk_profiling import instrumented
+from risk_schema import serialize_frame
+from risk_storage import get_data_version, get_versioned_snapshot
+
+# ===========================
+# CONFIGURAZIONE REPORT
+# ===========================
+
+# Numero di righe da cui il report usa la modalità per registri grandi
+PDF_LARGE_REGISTER_ROWS = int(os.environ.get('RISK_PDF_LARGE_ROWS', 2000))
+
+# Righe per tabella nella modalità per registri grandi (circa una pagina)
+PDF_CHUNK_ROWS = int(os.environ.get('RISK_PDF_CHUNK_ROWS', 40))
+
+# Cartella per i PDF temporanei (default: cartella temporanea di sistema)
+PDF_SPOOL_DIR = os.environ.get('RISK_PDF_SPOOL_DIR')
+
+# Messaggi mostrati quando manca una libreria di export
+REPORT_IMPORT_ERRORS = {
+    'pdf': "Librerie necessarie non disponibili. Installa con: pip install reportlab matplotlib",
+    'excel': "Libreria openpyxl non disponibile. Installa con: pip install openpyxl",
+}
+
+# Colonne del registro e intestazioni della tabella PDF, in ordine coerente con AgGrid
+PDF_COLUMNS = ['ID', 'Descrizione', 'Probabilità', 'Impatto', 'Priorità', 'Contromisura', 'Stato', 'Data scadenza']
+PDF_HEADERS = ['ID', 'Descrizione', 'Probabilità', 'Impatto', 'Priorità', 'Contromisura', 'Stato', 'Data Scadenza']
+
+# Numero minimo di flowable tenuti pronti davanti all'impaginatore
+_LOOKAHEAD = 4
+
+# ===========================
+# FLOWABLE IN STREAMING
+# ===========================
+
+class _FlowableStream(list):
+    """
+    Lista di flowable alimentata on demand da un generatore.
+
+    SimpleDocTemplate.build() consuma la lista dalla testa (flowables[0],
+    del flowables[0]) e reinserisce in testa le parti di una tabella divisa
+    tra due pagine: basta quindi tenere pronti pochi elementi alla volta.
+    """
+
+    def __init__(self, flowables):
+        super().__init__()
+        self._source = iter(flowables)
+
+    def _fill(self):
+        while self._source is not None and list.__len__(self) < _LOOKAHEAD:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
+def _table_rows(df, text_style, Paragraph, chunk_rows, progress=None):
+    """
+    Genera le righe della tabella PDF a blocchi di chunk_rows rischi.
+
+    Dopo ogni blocco, se indicata, chiama progress('rows', righe pronte, totale).
+
+    Yields:
+        list: Righe del blocco (liste di celle), Paragraph per i testi lunghi
+    """
+    for start in range(0, len(df), chunk_rows):
+        chunk = serialize_frame(df.iloc[start:start + chunk_rows][PDF_COLUMNS])  # Date come yyyy-mm-dd
+        rows = []
+        for risk_id, desc, prob, imp, priority, cont, state, deadline in chunk.itertuples(index=False, name=None):
+            rows.append([
+                str(risk_id),
+                # Paragraph per text wrapping automatico delle colonne di testo lungo
+                Paragraph(str(desc) if pd.notnull(desc) else "", text_style),
+                f"{prob:.1f}",
+                f"{imp:.1f}",
+                str(priority),
+                Paragraph(str(cont) if pd.notnull(cont) else "", text_style),
+                str(state),
+                deadline or ""
+            ])
+        if progress is not None:
+            progress('rows', start + len(rows), len(df))
+        yield rows
+
+def _pdf_flowables(df, heatmap_positions, chunk_rows, progress=None):
+    """
+    Genera in ordine i flowable del report.
+
+    Args:
+        df (pd.DataFrame): Registro dei rischi
+        heatmap_positions (dict): Posizioni aggregate della heat map
+        chunk_rows (int, optional): Righe per tabella; None per un'unica tabella
+        progress (callable, optional): Notifica di avanzamento (fase, fatti, totale)
+
+    Yields:
+        Flowable: Elementi del documento ReportLab
+    """
+    from reportlab.lib import colors
+    from reportlab.platypus import Table, TableStyle, Paragraph, Spacer, Image, PageBreak
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib.enums import TA_CENTER
+
+    styles = getSampleStyleSheet()
+
+    # Stile personalizzato per il titolo principale
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Title'],
+        fontSize=20,
+        spaceAfter=20,
+        alignment=TA_CENTER
+    )
+
+    # Intestazione del documento
+    yield Paragraph("🛡️ Risk Assessment Report", title_style)
+    yield Paragraph(f"Data: {date.today().strftime('%d/%m/%Y')}", styles['Normal'])
+    yield Spacer(1, 0.3 * inch)
+
+    # Larghezze ridotte per eliminare spazio vuoto
+    col_widths = [
+        0.5*inch,   # ID - compatta (coerente con 60px AgGrid)
+        2.8*inch,   # Descrizione - ottimizzata (coerente con 300px AgGrid)
+        0.7*inch,   # Probabilità (coerente con 100px AgGrid)
+        0.6*inch,   # Impatto (coerente con 90px AgGrid)
+        0.7*inch,   # Priorità (coerente con 100px AgGrid)
+        2.6*inch,   # Contromisura - ottimizzata (coerente con 280px AgGrid)
+        0.7*inch,   # Stato (coerente con 80px AgGrid)
+        1.0*inch    # Data Scadenza (coerente con 110px AgGrid)
+    ]
+
+    table_style = TableStyle([
+        # Header styling
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+
+        # Contenuto styling con auto-height
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+
+        # Allineamento specifico per colonne di testo
+        ('ALIGN', (1, 1), (1, -1), 'LEFT'),               # Descrizione a sinistra
+        ('ALIGN', (5, 1), (5, -1), 'LEFT'),               # Contromisura a sinistra
+
+        # Padding ottimizzato per auto-height
+        ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ])
+
+    if chunk_rows is None:
+        # Registro piccolo: un'unica tabella
+        data = [PDF_HEADERS]
+        for rows in _table_rows(df, styles['Normal'], Paragraph, max(len(df), 1), progress):
+            data.extend(rows)
+        table = Table(data, colWidths=col_widths)
+        table.setStyle(table_style)
+        yield table
+    else:
+        # Registro grande: una tabella per blocco, ciascuna con la propria intestazione
+        for rows in _table_rows(df, styles['Normal'], Paragraph, chunk_rows, progress):
+            table = Table([PDF_HEADERS] + rows, colWidths=col_widths, repeatRows=1)
+            table.setStyle(table_style)
+            yield table
+        if df.empty:
+            table = Table([PDF_HEADERS], colWidths=col_widths)
+            table.setStyle(table_style)
+            yield table
+
+    # Sezione riepilogo statistico
+    yield Spacer(1, 0.5 * inch)
+    yield Paragraph("Riepilogo per Priorità", styles['Heading2'])
+    priority_counts = df['Priorità'].value_counts()
+    summary_text = ""
+    for priority in ['Estrema', 'Alta', 'Media', 'Bassa']:
+        count = priority_counts.get(priority, 0)
+        summary_text += f"{priority}: {count} rischi<br/>"
+    yield Paragraph(summary_text, styles['Normal'])
+
+    # Aggiunta heat map se disponibile
+    heatmap_img = create_heatmap_image(df, heatmap_positions)
+    if progress is not None:
+        progress('heatmap', 1, 1)
+    if heatmap_img is not None:
+        yield PageBreak()
+        yield Paragraph("Heat Map dei Rischi", styles['Heading2'])
+        yield Spacer(1, 0.2 * inch)
+        yield Image(heatmap_img, width=7 * inch, height=5 * inch)
+        yield Spacer(1, 0.3 * inch)
+        yield Paragraph(
+            "Note: I numeri neri indicano gli ID dei rischi posizionati secondo probabilità e impatto (valori da 1 a 5 con incrementi di 0.5). "
+            "I colori rappresentano le priorità: Verde (Bassa), Giallo (Media), Arancione (Alta), Rosso (Estrema).",
+            styles['Normal'])
+
+# ===========================
+# REPORT PDF
+# ===========================
+
+def _build_pdf_report(df, heatmap_positions=None, large=None, progress=None):
+    """
+    Costruisce il report PDF propagando gli errori (vedi create_pdf_report).
+
+    Raises:
+        ImportError: Se ReportLab non è disponibile
+        Exception: Errori di impaginazione o scrittura
+    """
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.platypus import SimpleDocTemplate
+
+    if large is None:
+        large = len(df) >= PDF_LARGE_REGISTER_ROWS
+    spool_path = None
+    try:
+        if large:
+            # Output su file temporaneo, restituito come file aperto in lettura
+            fd, spool_path = tempfile.mkstemp(suffix='.pdf', prefix='risk_report_', dir=PDF_SPOOL_DIR)
+            os.close(fd)
+            target = spool_path
+        else:
+            target = BytesIO()
+
+        # Configurazione documento in formato landscape per tabelle larghe
+        doc = SimpleDocTemplate(
+            target,
+            pagesize=landscape(A4),
+            rightMargin=20,
+            leftMargin=20,
+            topMargin=20,
+            bottomMargin=20,
+            pageCompression=1 if large else None
+        )
+
+        # Generazione finale del PDF consumando i flowable man mano
+        doc.build(_FlowableStream(_pdf_flowables(df, heatmap_positions,
+                                                 PDF_CHUNK_ROWS if large else None, progress)))
+    except Exception:
+        if spool_path is not None and os.path.exists(spool_path):
+            os.remove(spool_path)
+        raise
+
+    if not large:
+        target.seek(0)
+        return target
+
+    pdf_file = open(spool_path, 'rb')
+    try:
+        os.remove(spool_path)  # Il file resta leggibile finché è aperto (POSIX)
+    except OSError:
+        pass  # Windows: il file rimane nella cartella temporanea
+    return pdf_file
+
+@instrumented()
+def create_pdf_report(df, heatmap_positions=None, large=None, progress=None):
+    """
+    Genera un report PDF completo contenente tabella dei rischi, riepilogo e heat map.
+
+    Il report include:
+    - Tabella formattata con tutti i rischi
+    - Riepilogo statistico per priorità
+    - Heat map visuale dei rischi
+    - Formattazione professionale con intestazioni e stili
+
+    Args:
+        df (pd.DataFrame): DataFrame contenente i dati dei rischi
+        heatmap_positions (dict, optional): Posizioni aggregate della heat map
+                                           (HeatmapIndex.positions())
+        large (bool, optional): Forza (o esclude) la modalità per registri grandi;
+                               di default attiva da PDF_LARGE_REGISTER_ROWS righe
+        progress (callable, optional): Notifica di avanzamento (fase, fatti, totale)
+
+    Returns:
+        BytesIO | BufferedReader: PDF generato, posizionato all'inizio (file
+                temporaneo in modalità registri grandi), None se le librerie
+                non sono disponibili o si verifica un errore
+    """
+    try:
+        return _build_pdf_report(df, heatmap_positions, large, progress)
+    except ImportError:
+        st.error(REPORT_IMPORT_ERRORS['pdf'])
+        return None
+    except Exception as e:
+        st.error(f"Errore nella creazione del PDF: {str(e)}")
+        return None
+
+# ===========================
+# REPORT EXCEL
+# ===========================
+
+# Righe del registro preparate per volta (valori calcolati per colonna)
+EXCEL_CHUNK_ROWS = int(os.environ.get('RISK_EXCEL_CHUNK_ROWS', 5000))
+
+# Intestazioni del foglio principale, ordine coerente con AgGrid più Valore Rischio
+EXCEL_HEADERS = ['ID', 'Descrizione', 'Probabilità', 'Impatto', 'Valore Rischio', 'Priorità', 'Contromisura', 'Stato', 'Data Scadenza']
+
+# Larghezze colonne (coerenti con le larghezze AgGrid)
+EXCEL_COLUMN_WIDTHS = {'A': 8, 'B': 45, 'C': 12, 'D': 10, 'E': 15, 'F': 12, 'G': 40, 'H': 12, 'I': 15}
+
+# Riempimento e colore del testo delle priorità
+EXCEL_PRIORITY_STYLES = {
+    'Estrema': ('FFE4E1', '8B0000'),
+    'Alta': ('FFE4B5', 'FF8C00'),
+    'Media': ('FFFACD', 'FFD700'),
+    'Bassa': ('90EE90', '006400'),
+}
+
+def _excel_named_styles(wb):
+    """
+    Registra nel workbook gli stili condivisi da tutte le celle.
+
+    Ogni cella riferisce uno stile per nome invece di allocare i propri
+    oggetti Font/PatternFill/Alignment.
+    """
+    from openpyxl.styles import NamedStyle, Font, PatternFill, Alignment, Border, Side
+
+    # Bordi per celle
+    side = Side(style='thin', color='334155')
+    border = Border(left=side, right=side, top=side, bottom=side)
+    center = Alignment(horizontal="center", vertical="center")
+
+    styles = [
+        NamedStyle('risk_title', font=Font(bold=True, size=20, color="DC143C"), alignment=center),
+        NamedStyle('risk_date', font=Font(size=12, italic=True), alignment=center),
+        NamedStyle('risk_section', font=Font(bold=True, size=16, color="DC143C"), alignment=center),
+        NamedStyle('risk_header', font=Font(bold=True, color="FFFFFF", size=12),
+                   fill=PatternFill(start_color="1e293b", end_color="1e293b", fill_type="solid"),
+                   alignment=center, border=border),
+        NamedStyle('risk_summary_header', font=Font(bold=True, color="FFFFFF", size=12),
+                   fill=PatternFill(start_color="1e293b", end_color="1e293b", fill_type="solid")),
+        NamedStyle('risk_bold', font=Font(bold=True)),
+        NamedStyle('risk_center', border=border, alignment=center),
+        NamedStyle('risk_wrap', border=border,
+                   alignment=Alignment(horizontal="left", vertical="top", wrap_text=True)),
+        NamedStyle('risk_note', font=Font(size=10, italic=True),
+                   alignment=Alignment(horizontal="left", vertical="center", wrap_text=True)),
+        NamedStyle('risk_warning', font=Font(size=12, italic=True, color="FF0000"), alignment=center),
+    ]
+    for priority, (fill, color) in EXCEL_PRIORITY_STYLES.items():
+        styles.append(NamedStyle(f'risk_priority_{priority}', font=Font(bold=True, color=color),
+                                 fill=PatternFill(start_color=fill, end_color=fill, fill_type="solid"),
+                                 border=border, alignment=center))
+    for style in styles:
+        wb.add_named_style(style)
+
+def _styled_cell(ws, value, style):
+    """Cella in sola scrittura con uno stile registrato da _excel_named_styles()."""
+    from openpyxl.cell import WriteOnlyCell
+
+    cell = WriteOnlyCell(ws, value)
+    cell.style = style
+    return cell
+
+def _cell_factory(ws):
+    """
+    Ritorna una funzione (valore, stile) -> cella per le righe dati.
+
+    La risoluzione dello stile con nome avviene una sola volta per stile:
+    le celle successive ricevono una copia dell'array di stile già risolto.
+    """
+    from openpyxl.cell import WriteOnlyCell
+
+    resolved = {}
+
+    def make(value, style):
+        cell = WriteOnlyCell(ws, value)
+        style_array = resolved.get(style)
+        if style_array is None:
+            cell.style = style
+            resolved[style] = copy(cell._style)
+        else:
+            cell._style = copy(style_array)
+        return cell
+    return make
+
+def _excel_data_rows(ws, df, progress=None):
+    """
+    Genera le righe dati del foglio principale.
+
+    I valori vengono preparati per colonna su blocchi di EXCEL_CHUNK_ROWS
+    righe; ogni cella riceve solo il nome del proprio stile. Dopo ogni
+    blocco, se indicata, chiama progress('rows', righe scritte, totale).
+
+    Yields:
+        list: Celle della riga
+    """
+    styled = _cell_factory(ws)
+
+    for start in range(0, len(df), EXCEL_CHUNK_ROWS):
+        chunk = serialize_frame(df.iloc[start:start + EXCEL_CHUNK_ROWS])  # Date come yyyy-mm-dd
+        text = lambda column: chunk[column].astype(object).where(chunk[column].notna(), None).tolist()
+        columns = zip(
+            chunk['ID'].astype(int).tolist(),
+            text('Descrizione'),
+            chunk['Probabilità'].map('{:.1f}'.format).tolist(),
+            chunk['Impatto'].map('{:.1f}'.format).tolist(),
+            chunk['Valore_Rischio'].map('{:.1f}'.format).tolist(),
+            text('Priorità'),
+            text('Contromisura'),
+            text('Stato'),
+            text('Data scadenza'),
+        )
+        for risk_id, desc, prob, imp, value, priority, cont, state, deadline in columns:
+            priority_style = f'risk_priority_{priority}' if priority in EXCEL_PRIORITY_STYLES else 'risk_priority_Bassa'
+            yield [
+                styled(risk_id, 'risk_center'),
+                styled(desc, 'risk_wrap'),              # Descrizione con text wrapping
+                styled(prob, 'risk_center'),
+                styled(imp, 'risk_center'),
+                styled(value, 'risk_center'),
+                styled(priority, priority_style),       # Priorità con colore condizionale
+                styled(cont, 'risk_wrap'),              # Contromisura con text wrapping
+                styled(state, 'risk_center'),
+                styled(deadline, 'risk_center'),
+            ]
+        if progress is not None:
+            progress('rows', start + len(chunk), len(df))
+
+def _excel_heatmap_warning(ws, data_rows, message):
+    """Scrive sotto la tabella la nota che sostituisce la heat map."""
+    note_row = data_rows + 8
+    ws.merged_cells.add(f'A{note_row}:I{note_row}')
+    for _ in range(note_row - data_rows - 5):
+        ws.append([])
+    ws.append([_styled_cell(ws, message, 'risk_warning')])
+
+def _build_excel_report(df, heatmap_positions=None, progress=None):
+    """
+    Costruisce il report Excel propagando gli errori (vedi create_excel_report).
+
+    Raises:
+        ImportError: Se openpyxl non è disponibile
+        Exception: Errori di scrittura del workbook
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    _excel_named_styles(wb)
+    ws = wb.create_sheet("Risk Assessment")
+    styled = lambda value, style: _styled_cell(ws, value, style)
+
+    # Larghezze colonne e altezze righe vanno impostate prima della scrittura
+    for column, width in EXCEL_COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+    ws.row_dimensions[1].height = 40
+    ws.row_dimensions[2].height = 25
+    ws.row_dimensions[3].height = 10  # Riga vuota per spaziatura
+
+    # ===========================
+    # INTESTAZIONE DOCUMENTO E TABELLA DATI
+    # ===========================
+
+    ws.merged_cells.add('A1:H1')
+    ws.append([styled('🛡️ RISK ASSESSMENT REPORT', 'risk_title')])
+    ws.merged_cells.add('A2:H2')
+    ws.append([styled(f'Data Report: {date.today().strftime("%d/%m/%Y")}', 'risk_date')])
+    ws.append([])
+    ws.append([styled(header, 'risk_header') for header in EXCEL_HEADERS])
+    for row in _excel_data_rows(ws, df, progress):
+        ws.append(row)
+
+    # ===========================
+    # HEAT MAP SOTTO LA TABELLA
+    # ===========================
+
+    current_row = len(df) + 7  # Dopo dati + spazio
+    heatmap_img_buffer = create_heatmap_image(df, heatmap_positions)
+    if progress is not None:
+        progress('heatmap', 1, 1)
+    if heatmap_img_buffer is not None:
+        try:
+            require('PIL.Image')  # Necessario a openpyxl per le immagini
+            from openpyxl.drawing.image import Image as ExcelImage
+
+            img = ExcelImage(heatmap_img_buffer)
+            img.width = 600   # Larghezza ottimizzata per Excel
+            img.height = 400  # Altezza proporzionale
+            img.anchor = f'B{current_row + 2}'
+            ws.add_image(img)
+
+            note_row = current_row + 22  # Spazio per immagine + margine
+            ws.row_dimensions[current_row].height = 30
+            ws.row_dimensions[note_row].height = 40
+            ws.merged_cells.add(f'A{current_row}:I{current_row}')
+            ws.merged_cells.add(f'A{note_row}:I{note_row}')
+            for _ in range(current_row - len(df) - 5):
+                ws.append([])
+            ws.append([styled('HEAT MAP DEI RISCHI', 'risk_section')])
+            for _ in range(note_row - current_row - 1):
+                ws.append([])
+            ws.append([styled('Note: I numeri neri indicano gli ID dei rischi posizionati secondo probabilità e impatto (valori da 1 a 5 con incrementi di 0.5). I colori rappresentano le priorità: Verde (Bassa), Giallo (Media), Arancione (Alta), Rosso (Estrema).', 'risk_note')])
+        except ImportError:
+            # Nota se Pillow non è disponibile
+            _excel_heatmap_warning(ws, len(df), 'Heat Map non disponibile: installare Pillow con "pip install Pillow" per includere visualizzazioni grafiche.')
+        except Exception:
+            # Gestione errori generici con messaggio migliorato
+            _excel_heatmap_warning(ws, len(df), 'Heat Map non disponibile: errore nella generazione della visualizzazione.')
+
+    # ===========================
+    # FOGLIO RIEPILOGO STATISTICHE
+    # ===========================
+
+    ws2 = wb.create_sheet("Riepilogo")
+    styled = lambda value, style: _styled_cell(ws2, value, style)
+    ws2.column_dimensions['A'].width = 15
+    ws2.column_dimensions['B'].width = 15
+    ws2.merged_cells.add('A1:B1')
+    ws2.append([styled('RIEPILOGO RISCHI PER PRIORITÀ', 'risk_section')])
+    ws2.append([])
+    ws2.append([styled('Priorità', 'risk_summary_header'), styled('Numero Rischi', 'risk_summary_header')])
+
+    # Popolamento dati riepilogo in ordine di priorità
+    priority_counts = df['Priorità'].value_counts()
+    for priority in ['Estrema', 'Alta', 'Media', 'Bassa']:
+        ws2.append([priority, int(priority_counts.get(priority, 0))])
+    ws2.append([styled('TOTALE', 'risk_bold'), styled(len(df), 'risk_bold')])
+
+    # Salvataggio in buffer per download
+    excel_buffer = BytesIO()
+    wb.save(excel_buffer)
+    excel_buffer.seek(0)
+    return excel_buffer
+
+@instrumented()
+def create_excel_report(df, heatmap_positions=None, progress=None):
+    """
+    Genera il report Excel con registro dei rischi, heat map e riepilogo per priorità.
+
+    Il workbook usa fogli in sola scrittura: le righe vengono serializzate
+    man mano che sono prodotte, senza tenere in memoria il modello completo
+    delle celle.
+
+    Args:
+        df (pd.DataFrame): DataFrame contenente i dati dei rischi
+        heatmap_positions (dict, optional): Posizioni aggregate della heat map
+                                           (HeatmapIndex.positions())
+        progress (callable, optional): Notifica di avanzamento (fase, fatti, totale)
+
+    Returns:
+        BytesIO: Buffer contenente il file .xlsx,
+                None se openpyxl non è disponibile o si verifica un errore
+    """
+    try:
+        return _build_excel_report(df, heatmap_positions, progress)
+    except ImportError:
+        st.error(REPORT_IMPORT_ERRORS['excel'])
+        return None
+    except Exception as e:
+        st.error(f"Errore nella generazione Excel: {str(e)}")
+        return None
+
+# ===========================
+# CACHE DEI REPORT GENERATI
+# ===========================
+
+# Dimensione massima complessiva dei report conservati su disco
+REPORT_CACHE_BYTES = int(os.environ.get('RISK_REPORT_CACHE_BYTES', 64 * 1024 * 1024))
+
+# Cartella dei report in cache (default: RISK_PDF_SPOOL_DIR o cartella temporanea di sistema)
+REPORT_SPOOL_DIR = os.environ.get('RISK_REPORT_SPOOL_DIR') or PDF_SPOOL_DIR
+
+# Estensione dei file dei report per tipo
+REPORT_SUFFIXES = {'pdf': '.pdf', 'excel': '.xlsx'}
+
+# Generatori dei report per tipo: (df, posizioni heat map, progress, **opzioni) -> file
+REPORT_BUILDERS = {
+    'pdf': _build_pdf_report,
+    'excel': _build_excel_report,
+}
+
+# Chiave del report -> (percorso del file, dimensione in byte)
+_report_cache = OrderedDict()
+_report_cache_bytes = 0
+_report_lock = threading.Lock()
+_report_inflight = {}
+
+def _report_key(kind, file_path, version, options):
+    """Chiave del report: registro, versione dei dati, tipo, data e opzioni di rendering."""
+    return (os.path.abspath(file_path), version, kind, date.today().isoformat(),
+            tuple(sorted(options.items())))
+
+def _remove_report_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # Windows: file ancora aperto da un download, resta nella cartella temporanea
+
+def _spool_report(kind, report):
+    """Copia il report generato in un file della cartella REPORT_SPOOL_DIR e ne ritorna il percorso."""
+    fd, path = tempfile.mkstemp(suffix=REPORT_SUFFIXES[kind], prefix='risk_report_', dir=REPORT_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            shutil.copyfileobj(report, target)
+    except BaseException:
+        _remove_report_file(path)
+        raise
+    return path
+
+def _store_report(key, path):
+    """
+    Registra il file del report rispettando il limite REPORT_CACHE_BYTES (LRU).
+
+    I file eliminati dalla cache vengono rimossi dal disco; l'ultimo report
+    generato resta in cache anche se supera da solo il limite, finché non
+    viene scaricato.
+    """
+    global _report_cache_bytes
+    size = os.path.getsize(path)
+    with _report_lock:
+        _report_cache[key] = (path, size)
+        _report_cache_bytes += size
+        while _report_cache_bytes > REPORT_CACHE_BYTES and len(_report_cache) > 1:
+            _, (evicted, evicted_size) = _report_cache.popitem(last=False)
+            _report_cache_bytes -= evicted_size
+            _remove_report_file(evicted)
+
+@atexit.register
+def _clear_report_cache():
+    """Rimuove i file dei report in cache all'uscita del processo."""
+    global _report_cache_bytes
+    with _report_lock:
+        for path, _ in _report_cache.values():
+            _remove_report_file(path)
+        _report_cache.clear()
+        _report_cache_bytes = 0
+
+def _cached_report_path(key):
+    with _report_lock:
+        entry = _report_cache.get(key)
+        if entry is None:
+            return None
+        _report_cache.move_to_end(key)
+        return entry[0]
+
+def open_report(path):
+    """
+    Apre in lettura il file di un report in cache, da passare a st.download_button.
+
+    Args:
+        path (str): Percorso ritornato da get_report() o get_cached_report()
+
+    Returns:
+        BufferedReader | None: File aperto (da chiudere dopo l'uso), None se
+                               il report è stato nel frattempo rimosso dalla cache
+    """
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+@instrumented()
+def get_cached_report(kind, file_path, **options):
+    """
+    Ritorna il report già generato per la versione corrente del registro.
+
+    Args:
+        kind (str): Tipo di report ('pdf' o 'excel')
+        file_path (str): Percorso del file dei rischi
+        **options: Opzioni di rendering passate al generatore
+
+    Returns:
+        str: Percorso del file del report (vedi open_report), None se non ancora generato
+    """
+    return _cached_report_path(_report_key(kind, file_path, get_data_version(file_path), options))
+
+def _versioned_heatmap(file_path, version, df):
+    """Indice della heat map per la versione del registro da cui viene generato il report."""
+    index = get_heatmap_index(file_path)
+    if get_data_version(file_path) != version:
+        # Registro modificato nel frattempo: l'indice condiviso è di un'altra versione
+        index = HeatmapIndex.from_frame(df)
+    return index
+
+def get_report(kind, file_path, progress=None, **options):
+    """
+    Ritorna il report del registro, generandolo solo se non è già in cache.
+
+    La cache è condivisa tra le sessioni e indicizzata per versione dei dati,
+    tipo di report, data del report e opzioni di rendering: richieste
+    contemporanee dello stesso report attendono un'unica generazione.
+    Tabella, riepilogo e heat map provengono dallo stesso snapshot del registro.
+
+    Args:
+        kind (str): Tipo di report ('pdf' o 'excel')
+        file_path (str): Percorso del file dei rischi
+        progress (callable, optional): Notifica di avanzamento (fase, fatti, totale),
+                                      chiamata solo se il report viene generato
+        **options: Opzioni di rendering passate al generatore (es. large=True)
+
+    Returns:
+        str: Percorso del file del report in cache (vedi open_report)
+
+    Raises:
+        ImportError: Se la libreria di export non è disponibile
+        Exception: Errori di generazione del report
+    """
+    version, df = get_versioned_snapshot(file_path)
+    key = _report_key(kind, file_path, version, options)
+    path = _cached_report_path(key)
+    if path is not None:
+        return path
+    with _report_lock:
+        generation_lock = _report_inflight.setdefault(key, threading.Lock())
+
+    try:
+        with generation_lock:
+            path = _cached_report_path(key)
+            if path is not None:
+                return path  # Generato da un'altra sessione nel frattempo
+
+            report = REPORT_BUILDERS[kind](df, _versioned_heatmap(file_path, version, df).positions(),
+                                           progress=progress, **options)
+            try:
+                path = _spool_report(kind, report)
+            finally:
+                report.close()
+            _store_report(key, path)
+            return path
+    finally:
+        with _report_lock:
+            if _report_inflight.get(key) is generation_lock:
+                del _report_inflight[key]
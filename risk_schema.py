@@ -0,0 +1,226 @@
+"""
+Schema tipizzato del registro dei rischi.
+
+Ogni colonna del registro ha un tipo compatto in memoria, applicato già in
+fase di lettura del CSV (mappa dei dtype passata a read_csv) invece che con
+una seconda conversione:
+- ID intero a 32 bit, Probabilità e Impatto float32 (valori a passi di 0.5)
+- Priorità e Stato categoriali: ogni riga occupa un codice di un byte
+- Descrizione e Contromisura stringhe (con pyarrow, buffer Arrow compatti)
+- Data scadenza datetime64, scritta nei file come yyyy-mm-dd
+
+Priorità e Stato ammettono solo i valori dello schema: le righe lette dai
+file con uno stato sconosciuto vengono scartate dalla validazione
+(risk_validation) prima della tipizzazione, la priorità viene ricalcolata e
+i salvataggi con valori non previsti vengono rifiutati (check_categories).
+
+Con pyarrow installato il CSV viene letto dal parser multithread di Arrow
+(RISK_CSV_ENGINE=c per forzare il parser di pandas). Lo stesso schema viene
+usato dai backend in scrittura (serialize_frame) e dagli export, così file,
+journal, database e report mostrano le date sempre nello stesso formato.
+"""
+
+import importlib.util
+import os
+
+import pandas as pd
+
+from risk_scoring import PRIORITY_LABELS
+
+# ===========================
+# CONFIGURAZIONE
+# ===========================
+
+# Parser CSV: 'pyarrow' se disponibile, altrimenti 'c' (parser di pandas)
+CSV_ENGINE = os.environ.get('RISK_CSV_ENGINE') or (
+    'pyarrow' if importlib.util.find_spec('pyarrow') is not None else 'c')
+
+# Stati ammessi, nell'ordine del form di inserimento
+STATUS_VALUES = ('Da pianificare', 'In corso', 'Monitoraggio', 'Chiuso')
+
+# Formato delle date nei file, nel journal, nel database e negli export
+DATE_FORMAT = '%Y-%m-%d'
+
+# Stringhe: dtype str da pandas 3 (Arrow con pyarrow), object nelle versioni precedenti
+TEXT_DTYPE = 'str' if int(pd.__version__.split('.')[0]) >= 3 else object
+
+DATE_DTYPE = 'datetime64[s]'
+
+# Tipo in memoria di ogni colonna, nell'ordine del registro
+REGISTER_DTYPES = {
+    'ID': 'int32',
+    'Descrizione': TEXT_DTYPE,
+    'Probabilità': 'float32',     # Scala 1-5 a passi di 0.5, rappresentata esattamente
+    'Impatto': 'float32',
+    'Valore_Rischio': 'float64',  # Prodotto prob*impatto (matrici personalizzate incluse)
+    'Priorità': pd.CategoricalDtype(PRIORITY_LABELS),
+    'Contromisura': TEXT_DTYPE,
+    'Stato': pd.CategoricalDtype(STATUS_VALUES),
+    'Data scadenza': DATE_DTYPE,
+}
+
+# Colonne data, lette come datetime e scritte come testo DATE_FORMAT
+DATE_COLUMNS = ('Data scadenza',)
+
+# ===========================
+# TIPIZZAZIONE
+# ===========================
+
+def _categorical(series, dtype):
+    """
+    Converte in categoriale con le sole categorie dello schema.
+
+    Le righe vengono tipizzate dopo la validazione: valori non previsti non
+    arrivano fin qui e, se presenti, diventerebbero valori mancanti.
+    """
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype('category')
+    if list(series.cat.categories) != list(dtype.categories):
+        series = series.cat.set_categories(dtype.categories)
+    return series
+
+def check_categories(df):
+    """
+    Verifica che le colonne categoriali contengano solo valori dello schema.
+
+    Args:
+        df (pd.DataFrame): Righe da salvare (anche solo alcune colonne)
+
+    Raises:
+        ValueError: Se una colonna contiene valori non previsti dallo schema
+    """
+    for column, dtype in REGISTER_DTYPES.items():
+        if column in df.columns and isinstance(dtype, pd.CategoricalDtype):
+            values = pd.Series(df[column]).dropna().astype(object)
+            unknown = values[~values.isin(dtype.categories)].unique()
+            if len(unknown):
+                raise ValueError(f"Valore non ammesso per {column}: {', '.join(map(str, unknown))}")
+
+def to_dates(values):
+    """Converte date (testo ISO, date, Timestamp) in datetime64; valori non validi -> NaT."""
+    return pd.to_datetime(values, format='ISO8601', errors='coerce')
+
+def apply_schema(df):
+    """
+    Applica lo schema alle colonne presenti, convertendo solo quelle di tipo diverso.
+
+    Args:
+        df (pd.DataFrame): Registro o righe del registro
+
+    Returns:
+        pd.DataFrame: Registro con i tipi di REGISTER_DTYPES
+    """
+    converted = {}
+    for column, dtype in REGISTER_DTYPES.items():
+        if column not in df.columns:
+            continue
+        series = df[column]
+        if isinstance(dtype, pd.CategoricalDtype):
+            series = _categorical(series, dtype)
+        elif column in DATE_COLUMNS:
+            if not pd.api.types.is_datetime64_dtype(series.dtype):
+                series = to_dates(series)
+            if series.dtype != DATE_DTYPE:
+                series = series.astype(DATE_DTYPE)
+        elif series.dtype != dtype:
+            series = series.astype(dtype)
+        if series is not df[column]:
+            converted[column] = series
+    return df.assign(**converted) if converted else df
+
+def empty_frame():
+    """Registro vuoto con colonne e tipi dello schema."""
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in REGISTER_DTYPES.items()})
+
+def coerce_values(df, column, values):
+    """
+    Prepara valori da assegnare a una colonna del registro.
+
+    Le date vengono convertite in datetime64; le colonne categoriali
+    accettano solo i valori dello schema.
+
+    Args:
+        df (pd.DataFrame): Registro che riceverà i valori
+        column (str): Colonna di destinazione
+        values: Scalare o sequenza di valori
+
+    Returns:
+        Valori pronti per df.loc[..., column] = valori
+
+    Raises:
+        ValueError: Se i valori di una colonna categoriale non sono previsti dallo schema
+    """
+    if column in DATE_COLUMNS:
+        if pd.api.types.is_scalar(values):
+            return to_dates(pd.Series([values])).iloc[0]
+        return to_dates(pd.Series(values)).to_numpy()
+    if column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype):
+        check_categories(pd.DataFrame({column: [values] if pd.api.types.is_scalar(values) else list(values)}))
+    return values
+
+# ===========================
+# LETTURA E SCRITTURA
+# ===========================
+
+def read_csv(path, usecols=None):
+    """
+    Legge un registro CSV applicando la mappa dei tipi in fase di parsing.
+
+    Se una riga non è compatibile con i tipi dello schema (es. ID mancante o
+    probabilità non numerica) il file viene riletto come testo: la
+    tipizzazione avviene allora dopo la validazione (risk_validation), che
+    scarta solo le righe non valide.
+
+    Args:
+        path (str): Percorso del file CSV
+        usecols (list, optional): Sole colonne da leggere, di default tutte
+
+    Returns:
+        pd.DataFrame: Registro tipizzato, oppure come testo se il parsing tipizzato non è riuscito
+    """
+    columns = pd.read_csv(path, nrows=0).columns
+    if usecols is not None:
+        columns = [column for column in columns if column in usecols]
+    dtypes = {column: ('category' if isinstance(dtype, pd.CategoricalDtype) else dtype)
+              for column, dtype in REGISTER_DTYPES.items()
+              if column in columns and column not in DATE_COLUMNS}
+    selected = None if usecols is None else list(columns)
+    options = dict(dtype=dtypes, parse_dates=[c for c in DATE_COLUMNS if c in columns],
+                   date_format=DATE_FORMAT, usecols=selected)
+    for engine in dict.fromkeys((CSV_ENGINE, 'c')):
+        try:
+            # Date non valide lasciano la colonna come testo: le converte la validazione
+            return pd.read_csv(path, engine=engine, **options)
+        except (ValueError, TypeError, OverflowError):
+            continue  # Valori incompatibili con i tipi (o righe che il parser Arrow non accetta)
+    return pd.read_csv(path, dtype=TEXT_DTYPE, usecols=selected)
+
+def serialize_frame(df):
+    """
+    Rappresentazione testuale del registro per file, journal, database ed export.
+
+    Le date diventano stringhe DATE_FORMAT (NaT -> None) e le colonne
+    categoriali tornano valori semplici.
+
+    Args:
+        df (pd.DataFrame): Registro tipizzato
+
+    Returns:
+        pd.DataFrame: Registro con valori serializzabili
+    """
+    converted = {}
+    for column in df.columns:
+        series = df[column]
+        if column in DATE_COLUMNS and pd.api.types.is_datetime64_dtype(series.dtype):
+            converted[column] = series.dt.strftime(DATE_FORMAT).astype(object).where(series.notna(), None)
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            converted[column] = series.astype(object)
+    return df.assign(**converted) if converted else df
+
+def format_date(value):
+    """Data nel formato DATE_FORMAT ('' se mancante); altri valori invariati."""
+    if value is None or value is pd.NaT or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    if hasattr(value, 'strftime'):
+        return value.strftime(DATE_FORMAT)
+    return value
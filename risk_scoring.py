@@ -0,0 +1,196 @@
+"""
+Motore di calcolo del valore e della priorità dei rischi.
+
+Probabilità e Impatto assumono valori da 1 a 5 con incrementi di 0.5: le
+combinazioni possibili sono solo 9 × 9 = 81. Il motore precalcola una tabella
+di lookup con valore, priorità e colore di ogni combinazione e classifica
+intere colonne con un'unica indicizzazione NumPy, invece di una chiamata
+Python per riga. I valori fuori griglia (es. dati importati con decimali
+diversi da 0.5) vengono classificati con lo stesso criterio a soglie.
+
+Le soglie di default (Media >= 6, Alta >= 11, Estrema >= 16) sono
+configurabili con la variabile d'ambiente RISK_PRIORITY_THRESHOLDS
+(es. "6,11,16") oppure creando un ScoringEngine dedicato.
+"""
+
+import os
+from bisect import bisect_right
+
+import numpy as np
+
+# ===========================
+# CONFIGURAZIONE SCALE E SOGLIE
+# ===========================
+
+# Etichette e colori delle priorità, dalla più bassa alla più alta
+PRIORITY_LABELS = ('Bassa', 'Media', 'Alta', 'Estrema')
+PRIORITY_COLORS = ('#22c55e', '#eab308', '#f97316', '#ef4444')
+
+# Valore minimo di Media, Alta ed Estrema
+DEFAULT_THRESHOLDS = tuple(
+    float(t) for t in os.environ.get('RISK_PRIORITY_THRESHOLDS', '6,11,16').split(',')
+)
+
+# Scala di Probabilità e Impatto
+SCALE_MIN = 1.0
+SCALE_MAX = 5.0
+SCALE_STEP = 0.5
+
+# ===========================
+# MOTORE DI SCORING
+# ===========================
+
+class ScoringEngine:
+    """
+    Classificazione vettoriale dei rischi basata su tabella di lookup.
+
+    Args:
+        thresholds (tuple): Valori minimi delle priorità successive alla prima
+        labels (tuple): Etichette delle priorità (len(thresholds) + 1)
+        colors (tuple): Colori esadecimali associati alle priorità
+        matrix (array-like, optional): Matrice dei valori di rischio
+            (righe = Probabilità, colonne = Impatto) sulla griglia della scala;
+            di default Probabilità × Impatto
+    """
+
+    def __init__(self, thresholds=DEFAULT_THRESHOLDS, labels=PRIORITY_LABELS,
+                 colors=PRIORITY_COLORS, matrix=None):
+        if len(labels) != len(thresholds) + 1 or len(colors) != len(labels):
+            raise ValueError("Servono len(thresholds) + 1 etichette e colori")
+        self.thresholds = np.asarray(thresholds, dtype=float)
+        self.labels = np.asarray(labels, dtype=object)
+        self.colors = np.asarray(colors, dtype=object)
+
+        # Griglia della scala: 1.0, 1.5, ..., 5.0
+        self.levels = np.arange(SCALE_MIN, SCALE_MAX + SCALE_STEP / 2, SCALE_STEP)
+        if matrix is None:
+            self.value_table = np.outer(self.levels, self.levels)
+        else:
+            self.value_table = np.asarray(matrix, dtype=float)
+            if self.value_table.shape != (len(self.levels), len(self.levels)):
+                raise ValueError(f"La matrice deve essere {len(self.levels)}x{len(self.levels)}")
+        self.priority_table = self.classify_values(self.value_table)
+
+    def _grid_index(self, values):
+        """Ritorna indici di griglia e maschera dei valori che cadono sulla griglia."""
+        position = (np.asarray(values, dtype=float) - SCALE_MIN) / SCALE_STEP
+        index = np.rint(position)
+        on_grid = (np.abs(position - index) < 1e-9) & (index >= 0) & (index < len(self.levels))
+        return np.where(on_grid, index, 0).astype(np.intp), on_grid
+
+    def classify_values(self, values):
+        """
+        Classifica valori di rischio in codici di priorità.
+
+        Args:
+            values (array-like): Valori di rischio
+
+        Returns:
+            np.ndarray: Codici di priorità (indici in labels/colors)
+        """
+        return np.searchsorted(self.thresholds, np.asarray(values, dtype=float), side='right')
+
+    def score(self, prob, imp):
+        """
+        Calcola valore e codice di priorità per intere colonne.
+
+        Args:
+            prob (array-like): Probabilità (1-5)
+            imp (array-like): Impatto (1-5)
+
+        Returns:
+            tuple: (valori di rischio, codici di priorità) come array NumPy
+        """
+        prob = np.asarray(prob, dtype=float)
+        imp = np.asarray(imp, dtype=float)
+        prob_index, prob_ok = self._grid_index(prob)
+        imp_index, imp_ok = self._grid_index(imp)
+        on_grid = prob_ok & imp_ok
+
+        values = self.value_table[prob_index, imp_index]
+        codes = self.priority_table[prob_index, imp_index]
+        if not on_grid.all():
+            # Valori fuori griglia: calcolo diretto con le stesse soglie
+            off_values = prob * imp
+            values = np.where(on_grid, values, off_values)
+            codes = np.where(on_grid, codes, self.classify_values(off_values))
+        return values, codes
+
+    def score_frame(self, df):
+        """
+        Ricalcola Valore_Rischio e Priorità di un registro in un'unica operazione.
+
+        Args:
+            df (pd.DataFrame): Registro con colonne Probabilità e Impatto
+
+        Returns:
+            pd.DataFrame: Copia del registro con Valore_Rischio e Priorità aggiornati
+        """
+        values, codes = self.score(df['Probabilità'].to_numpy(), df['Impatto'].to_numpy())
+        return df.assign(Valore_Rischio=values, **{'Priorità': self.labels[codes]})
+
+    def priority(self, valore_rischio):
+        """Priorità di un singolo valore di rischio."""
+        return self.labels[bisect_right(self.thresholds.tolist(), valore_rischio)]
+
+    def cell(self, prob, imp):
+        """
+        Valore, etichetta e colore di una singola cella Probabilità/Impatto.
+
+        Returns:
+            tuple: (valore, etichetta priorità, colore esadecimale)
+        """
+        values, codes = self.score([prob], [imp])
+        return float(values[0]), self.labels[codes[0]], self.colors[codes[0]]
+
+# Motore condiviso con le soglie di default
+DEFAULT_ENGINE = ScoringEngine()
+
+# ===========================
+# FUNZIONI DI BUSINESS LOGIC
+# ===========================
+
+def calcola_priorita(valore_rischio):
+    """
+    Calcola la priorità del rischio basata sul valore numerico del rischio.
+
+    La scala utilizza il prodotto Probabilità × Impatto (range 1-25):
+    - Bassa: 1-5
+    - Media: 6-10
+    - Alta: 11-15
+    - Estrema: 16-25
+
+    Args:
+        valore_rischio (float): Valore numerico del rischio (Probabilità × Impatto)
+
+    Returns:
+        str: Livello di priorità del rischio
+    """
+    return DEFAULT_ENGINE.priority(valore_rischio)
+
+def score_frame(df, engine=None):
+    """
+    Ricalcola Valore_Rischio e Priorità di tutte le righe del registro.
+
+    Args:
+        df (pd.DataFrame): Registro con colonne Probabilità e Impatto
+        engine (ScoringEngine, optional): Motore con soglie personalizzate
+
+    Returns:
+        pd.DataFrame: Copia del registro con le colonne calcolate aggiornate
+    """
+    return (engine or DEFAULT_ENGINE).score_frame(df)
+
+def get_risk_color(prob, imp):
+    """
+    Determina colore ed etichetta di priorità di una cella della heat map.
+
+    Args:
+        prob (float): Valore probabilità (1-5)
+        imp (float): Valore impatto (1-5)
+
+    Returns:
+        tuple: (colore_hex, etichetta_priorità)
+    """
+    _, label, color = DEFAULT_ENGINE.cell(prob, imp)
+    return color, label
@@ -0,0 +1,1388 @@
+"""
+Persistenza del registro dei rischi.
+
+Il modulo raccoglie le funzioni di caricamento e salvataggio del registro e uno
+snapshot di processo condiviso da tutte le sessioni Streamlit: il registro viene
+letto una sola volta e riletto solo quando cambia la firma del backend
+(mtime/dimensione del file CSV, versione del database SQLite) o la versione
+interna incrementata ad ogni salvataggio.
+
+Il backend viene scelto in base all'estensione del file dati:
+- .csv (default): file CSV, ogni eliminazione/modifica riscrive il file
+- .csv con RISK_CSV_JOURNAL=1: file CSV con journal append-only delle modifiche,
+  compattato in background oltre RISK_JOURNAL_COMPACT_BYTES
+- .db / .sqlite / .sqlite3: database SQLite con scritture a livello di riga
+- .parquet / .arrow / .feather: file colonnare compresso (richiede pyarrow),
+  letto tramite memory mapping e con proiezione delle sole colonne necessarie
+
+Le modifiche sono sicure anche con più processi server sullo stesso file:
+ogni scrittura avviene sotto un lock esclusivo tra processi (<dati>.lock)
+partendo dallo stato più recente del registro e gli ID vengono assegnati da
+una sequenza persistente salvata con i dati.
+
+Le righe lette dal backend vengono validate (risk_validation): quelle non
+valide sono escluse dal registro e salvate con il motivo nel file di
+quarantena <dati>.quarantine.csv, invece di rendere illeggibile l'intero
+registro.
+
+Le funzioni vivono in un modulo separato perché Streamlit riesegue lo script
+principale ad ogni interazione: le variabili globali definite in
+risk_dashboard.py verrebbero ricreate ad ogni rerun, mentre quelle di un modulo
+importato restano in memoria per tutta la vita del processo.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import pandas as pd
+import streamlit as st
+
+from risk_deps import require
+from risk_profiling import instrumented
+from risk_schema import DATE_FORMAT, apply_schema, check_categories, coerce_values, empty_frame, format_date, read_csv, serialize_frame
+from risk_scoring import score_frame
+from risk_validation import REASON_COLUMN, VALIDATED_COLUMNS, validate_register
+
+_logger = logging.getLogger(__name__)
+
+# ===========================
+# COPY-ON-WRITE PANDAS
+# ===========================
+
+def _enable_copy_on_write():
+    """
+    Abilita il copy-on-write di pandas quando disponibile.
+
+    Con il copy-on-write una copia superficiale dello snapshot condivide i
+    buffer delle colonne finché la sessione non le modifica: ogni sessione
+    mantiene in memoria solo le colonne effettivamente cambiate.
+
+    Returns:
+        bool: True se il copy-on-write è attivo
+    """
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True  # Sempre attivo da pandas 3.0
+    try:
+        pd.set_option('mode.copy_on_write', True)
+        return True
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+_COPY_ON_WRITE = _enable_copy_on_write()
+
+# ===========================
+# STRUTTURA DATI
+# ===========================
+
+def create_empty_dataframe():
+    """
+    Crea un DataFrame vuoto con la struttura standard per i dati dei rischi.
+
+    Valore_Rischio è calcolato automaticamente (Probabilità * Impatto) e
+    Priorità è derivata dal Valore_Rischio; i tipi delle colonne sono quelli
+    dello schema (risk_schema.REGISTER_DTYPES).
+
+    Returns:
+        pd.DataFrame: DataFrame vuoto con colonne predefinite per i rischi
+    """
+    return empty_frame()
+
+def _normalize_types(df):
+    """Applica lo schema tipizzato del registro (risk_schema.apply_schema)."""
+    return apply_schema(df)
+
+# ===========================
+# CONFIGURAZIONE PERSISTENZA
+# ===========================
+
+# Journal append-only per il backend CSV: ogni modifica è un record accodato
+CSV_JOURNAL_ENABLED = os.environ.get('RISK_CSV_JOURNAL', '0') == '1'
+
+# Dimensione del journal oltre la quale viene compattato nel CSV base
+JOURNAL_COMPACT_BYTES = int(os.environ.get('RISK_JOURNAL_COMPACT_BYTES', 1024 * 1024))
+
+# Compressione dei file Parquet/Arrow ('zstd', 'lz4', 'none')
+COLUMNAR_COMPRESSION = os.environ.get('RISK_COLUMNAR_COMPRESSION', 'zstd')
+
+# Suffisso del file con le righe non valide escluse dal registro
+QUARANTINE_SUFFIX = '.quarantine.csv'
+
+# ===========================
+# BACKEND DI PERSISTENZA
+# ===========================
+
+class CsvStorage:
+    """
+    Backend CSV: il registro è un unico file leggibile da strumenti esterni.
+
+    Le aggiunte vengono accodate al file, mentre eliminazioni e modifiche
+    riscrivono l'intero file a partire dallo snapshot corrente. Versione e
+    sequenza degli ID sono salvate accanto ai dati nel file <nome>.csv.meta.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.meta_path = path + '.meta'
+
+    def signature(self):
+        """Ritorna la firma di versione del file, None se il file non esiste."""
+        base = _file_signature(self.path)
+        if base is None:
+            return None
+        return (base, self.read_meta().get('version', 0))
+
+    def read_meta(self):
+        """Ritorna versione e prossimo ID disponibile salvati accanto ai dati."""
+        try:
+            with open(self.meta_path, encoding='utf-8') as meta:
+                return json.load(meta)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def write_meta(self, **values):
+        """Aggiorna i metadati in modo atomico."""
+        meta = self.read_meta()
+        meta.update(values)
+        _atomic_write_text(self.meta_path, json.dumps(meta))
+
+    def _bump_version(self):
+        self.write_meta(version=self.read_meta().get('version', 0) + 1)
+
+    def read(self, columns=None):
+        """
+        Legge il registro dal file CSV applicando lo schema in fase di parsing.
+
+        Args:
+            columns (list, optional): Sole colonne da leggere, di default tutte
+        """
+        return _validated(self, read_csv(self.path, columns), columns)
+
+    def write(self, df):
+        """Riscrive l'intero registro in modo atomico (file temporaneo + rename)."""
+        tmp_path = self.path + '.tmp'
+        df.to_csv(tmp_path, index=False, date_format=DATE_FORMAT)
+        os.replace(tmp_path, self.path)
+        self._bump_version()
+
+    def insert_rows(self, rows, current):
+        """Accoda le nuove righe al file senza riscrivere quelle esistenti."""
+        if _file_signature(self.path) is None or current.empty:
+            self.write(rows)
+        else:
+            rows.reindex(columns=current.columns).to_csv(self.path, mode='a', header=False, index=False,
+                                                         date_format=DATE_FORMAT)
+            self._bump_version()
+
+    def delete_ids(self, risk_ids, current):
+        """Rimuove i rischi indicati riscrivendo il file."""
+        self.write(current[~current['ID'].isin(risk_ids)])
+
+    def update_row(self, risk_id, fields, current):
+        """Aggiorna i campi di un rischio riscrivendo il file."""
+        self.write(_apply_update(current, risk_id, fields))
+
+    def write_batch(self, new, current, deleted, updated, added):
+        """Scrive un lotto di modifiche: solo aggiunte in coda, altrimenti un'unica riscrittura."""
+        if not deleted and updated.empty:
+            self.insert_rows(added, current)
+        else:
+            self.write(new)
+
+class JournaledCsvStorage(CsvStorage):
+    """
+    Backend CSV con journal append-only delle modifiche.
+
+    Aggiunte, eliminazioni e modifiche vengono accodate come record JSON al file
+    <nome>.csv.journal; la lettura applica il journal al CSV base. Quando il
+    journal supera JOURNAL_COMPACT_BYTES viene compattato in un nuovo CSV base,
+    che resta quindi nel formato leggibile dagli altri strumenti.
+
+    Il replay è idempotente (le aggiunte sostituiscono righe con lo stesso ID),
+    così un'interruzione tra la sostituzione del CSV e la rimozione del journal
+    non duplica i rischi. Ogni record è una riga JSON terminata da a capo e
+    sincronizzata su disco: un record troncato da un'interruzione durante la
+    scrittura (ultima riga senza a capo) viene ignorato in lettura e rimosso
+    prima dell'accodamento successivo.
+    """
+
+    def __init__(self, path, compact_bytes=None):
+        super().__init__(path)
+        self.journal_path = path + '.journal'
+        self.compact_bytes = compact_bytes or JOURNAL_COMPACT_BYTES
+
+    def signature(self):
+        """Ritorna la firma combinata di CSV base e journal, None se nessuno dei due esiste."""
+        base = _file_signature(self.path)
+        journal = _file_signature(self.journal_path)
+        if base is None and journal is None:
+            return None
+        return (base, journal, self.read_meta().get('version', 0))
+
+    def read(self, columns=None):
+        """
+        Legge il CSV base e riapplica in ordine i record del journal.
+
+        Args:
+            columns (list, optional): Colonne ritornate (il replay richiede comunque tutto il registro)
+        """
+        if _file_signature(self.path) is not None:
+            df = super().read()
+        else:
+            df = create_empty_dataframe()
+            self.rejected = None
+        if _file_signature(self.journal_path) is None:
+            return df if columns is None else df[columns]
+
+        pending = []  # Aggiunte consecutive, concatenate in un solo passaggio
+        with open(self.journal_path, encoding='utf-8') as journal:
+            for line in journal:
+                if not line.strip():
+                    continue
+                if not line.endswith('\n'):
+                    # Ultimo record incompleto: scrittura interrotta, la modifica non era stata confermata
+                    _logger.warning("Record incompleto ignorato alla fine del journal %s", self.journal_path)
+                    break
+                record = json.loads(line)
+                if record['op'] == 'add':
+                    pending.extend(record['rows'])
+                    continue
+                df = _upsert_rows(df, pending)
+                pending = []
+                if record['op'] == 'delete':
+                    df = df[~df['ID'].isin(record['ids'])]
+                elif record['op'] == 'update':
+                    df = _apply_update(df, record['id'], record['fields'])
+                elif record['op'] == 'batch':
+                    df = _upsert_rows(df[~df['ID'].isin(record['delete'])],
+                                      record['update'] + record['add'])
+        df = _normalize_types(_upsert_rows(df, pending).reset_index(drop=True))
+        # Il journal può contenere righe non valide (es. modifiche di altre versioni):
+        # il registro ricostruito viene validato come il CSV base
+        base = self.rejected
+        df = _validated(self, df)
+        self.rejected = _merge_outcomes(base, self.rejected)
+        return df if columns is None else df[columns]
+
+    def write(self, df):
+        """Scrive un nuovo CSV base in modo atomico e azzera il journal."""
+        super().write(df)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def _append(self, record):
+        data = (json.dumps(record, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+        with open(self.journal_path, 'ab+') as journal:
+            _truncate_torn_record(journal)
+            journal.write(data)
+            journal.flush()
+            os.fsync(journal.fileno())
+        self._bump_version()
+
+    def insert_rows(self, rows, current=None):
+        """Accoda un record di aggiunta al journal."""
+        self._append({'op': 'add', 'rows': _to_records(rows)})
+
+    def delete_ids(self, risk_ids, current=None):
+        """Accoda un record di eliminazione al journal."""
+        self._append({'op': 'delete', 'ids': [int(risk_id) for risk_id in risk_ids]})
+
+    def update_row(self, risk_id, fields, current=None):
+        """Accoda un record di modifica al journal."""
+        fields = {column: _native(value) for column, value in fields.items()}
+        self._append({'op': 'update', 'id': int(risk_id), 'fields': fields})
+
+    def write_batch(self, new, current, deleted, updated, added):
+        """Accoda l'intero lotto come un unico record del journal."""
+        self._append({'op': 'batch', 'delete': [int(risk_id) for risk_id in deleted],
+                      'update': _to_records(updated), 'add': _to_records(added)})
+
+    def needs_compaction(self):
+        """True se il journal ha superato la soglia di compattazione."""
+        journal = _file_signature(self.journal_path)
+        return journal is not None and journal[1] >= self.compact_bytes
+
+class SqliteStorage:
+    """
+    Backend SQLite: ogni modifica è una singola istruzione INSERT/DELETE/UPDATE.
+
+    Il database usa il journaling WAL, così le letture delle altre sessioni non
+    vengono bloccate durante le scritture. La colonna ID è la chiave primaria
+    (indicizzata) della tabella. Alla prima apertura, se esiste un file CSV con
+    lo stesso nome, il suo contenuto viene migrato una sola volta nel database.
+    """
+
+    TABLE = 'rischi'
+
+    def __init__(self, path, migrate_from=None):
+        self.path = path
+        self.migrate_from = migrate_from or os.path.splitext(path)[0] + '.csv'
+        self._initialized = False
+
+    def _connect(self):
+        """Apre una connessione dedicata: le sessioni Streamlit usano thread diversi."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _ensure_schema(self):
+        """Crea tabelle, attiva WAL ed esegue la migrazione iniziale dal CSV."""
+        if self._initialized:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                    "ID" INTEGER PRIMARY KEY,
+                    "Descrizione" TEXT,
+                    "Probabilità" REAL,
+                    "Impatto" REAL,
+                    "Valore_Rischio" REAL,
+                    "Priorità" TEXT,
+                    "Contromisura" TEXT,
+                    "Stato" TEXT,
+                    "Data scadenza" TEXT
+                )""")
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '0')")
+
+            # Migrazione una tantum dal CSV esistente
+            migrated = conn.execute("SELECT value FROM meta WHERE key = 'migrated_from'").fetchone()
+            if migrated is None:
+                if os.path.exists(self.migrate_from):
+                    self._insert(conn, _read_migration_source(self, self.migrate_from))
+                    self._bump_version(conn)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_from', ?)",
+                             (self.migrate_from,))
+        self._initialized = True
+
+    @staticmethod
+    def _bump_version(conn):
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+
+    def _insert(self, conn, rows):
+        columns = list(create_empty_dataframe().columns)
+        placeholders = ', '.join('?' for _ in columns)
+        quoted = ', '.join(f'"{c}"' for c in columns)
+        records = serialize_frame(rows[columns]).astype(object).where(rows[columns].notna(), None)
+        conn.executemany(f'INSERT INTO {self.TABLE} ({quoted}) VALUES ({placeholders})',
+                         records.itertuples(index=False, name=None))
+
+    def signature(self):
+        """Ritorna la versione del database, None se il database non esiste."""
+        if not os.path.exists(self.path) and not os.path.exists(self.migrate_from):
+            return None
+        return self.read_meta()['version']
+
+    def read_meta(self):
+        """Ritorna versione, prossimo ID disponibile e origine della migrazione."""
+        self._ensure_schema()
+        with closing(self._connect()) as conn:
+            meta = dict(conn.execute('SELECT key, value FROM meta').fetchall())
+        for key in ('version', 'next_id'):
+            if key in meta:
+                meta[key] = int(meta[key])
+        return meta
+
+    def write_meta(self, **values):
+        """Aggiorna i metadati nella tabella meta."""
+        self._ensure_schema()
+        with closing(self._connect()) as conn, conn:
+            conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                             [(key, str(value)) for key, value in values.items()])
+
+    def read(self, columns=None):
+        """
+        Legge il registro ordinato per ID.
+
+        Args:
+            columns (list, optional): Sole colonne da leggere, di default tutte
+        """
+        self._ensure_schema()
+        selected = '*' if columns is None else ', '.join(f'"{column}"' for column in columns)
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(f'SELECT {selected} FROM {self.TABLE} ORDER BY "ID"', conn)
+        return _validated(self, df, columns)
+
+    def write(self, df):
+        """Sostituisce l'intero registro in un'unica transazione."""
+        self._ensure_schema()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f'DELETE FROM {self.TABLE}')
+            self._insert(conn, df)
+            self._bump_version(conn)
+
+    def insert_rows(self, rows, current=None):
+        """Inserisce le nuove righe con un'unica transazione."""
+        self._ensure_schema()
+        with closing(self._connect()) as conn, conn:
+            self._insert(conn, rows)
+            self._bump_version(conn)
+
+    def delete_ids(self, risk_ids, current=None):
+        """Elimina i rischi indicati tramite la chiave primaria."""
+        self._ensure_schema()
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(f'DELETE FROM {self.TABLE} WHERE "ID" = ?',
+                             [(int(risk_id),) for risk_id in risk_ids])
+            self._bump_version(conn)
+
+    def update_row(self, risk_id, fields, current=None):
+        """Aggiorna i campi indicati di un singolo rischio."""
+        self._ensure_schema()
+        assignments = ', '.join(f'"{column}" = ?' for column in fields)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f'UPDATE {self.TABLE} SET {assignments} WHERE "ID" = ?',
+                         [*map(_native, fields.values()), int(risk_id)])
+            self._bump_version(conn)
+
+    def write_batch(self, new, current, deleted, updated, added):
+        """Applica eliminazioni, modifiche e aggiunte del lotto in un'unica transazione."""
+        self._ensure_schema()
+        columns = [c for c in create_empty_dataframe().columns if c != 'ID']
+        assignments = ', '.join(f'"{column}" = ?' for column in columns)
+        records = serialize_frame(updated[columns + ['ID']])
+        records = records.astype(object).where(records.notna(), None)
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(f'DELETE FROM {self.TABLE} WHERE "ID" = ?',
+                             [(int(risk_id),) for risk_id in deleted])
+            conn.executemany(f'UPDATE {self.TABLE} SET {assignments} WHERE "ID" = ?',
+                             records.itertuples(index=False, name=None))
+            if not added.empty:
+                self._insert(conn, added)
+            self._bump_version(conn)
+
+class ColumnarStorage(CsvStorage):
+    """
+    Backend colonnare: file Parquet oppure Arrow IPC (.arrow/.feather) compresso.
+
+    La lettura usa il memory mapping del file e, per le viste che non
+    richiedono tutto il registro (es. indice della heat map), legge solo le
+    colonne necessarie senza decodificare le altre. Il formato non permette
+    accodamenti: ogni modifica riscrive il file in modo atomico. Versione e
+    sequenza degli ID sono salvate in <nome>.meta come per il CSV; alla prima
+    lettura, se esiste un CSV con lo stesso nome, il suo contenuto viene
+    convertito una sola volta sotto il lock del registro.
+
+    Args:
+        path (str): Percorso del file dati
+        fmt (str): 'parquet' oppure 'arrow'
+    """
+
+    def __init__(self, path, fmt, migrate_from=None):
+        super().__init__(path)
+        self.fmt = fmt
+        self.migrate_from = migrate_from or os.path.splitext(path)[0] + '.csv'
+
+    def _needs_migration(self):
+        return (_file_signature(self.path) is None and os.path.exists(self.migrate_from)
+                and 'migrated_from' not in self.read_meta())
+
+    def signature(self):
+        """Ritorna la firma di versione del file; prima della conversione iniziale quella del CSV."""
+        if self._needs_migration():
+            return ('migrate', _file_signature(self.migrate_from))
+        return super().signature()
+
+    def migrate(self):
+        """Converte il CSV con lo stesso nome, una sola volta e sotto il lock tra processi."""
+        with _locked(self.path):
+            if self._needs_migration():
+                self.write(_read_migration_source(self, self.migrate_from))
+                self.write_meta(migrated_from=self.migrate_from)
+
+    def _compression(self):
+        return None if COLUMNAR_COMPRESSION.lower() in ('', 'none') else COLUMNAR_COMPRESSION
+
+    def read(self, columns=None):
+        """
+        Legge il registro tramite memory mapping.
+
+        Args:
+            columns (list, optional): Sole colonne da leggere, di default tutte
+        """
+        if self._needs_migration():
+            self.migrate()
+        pa = require('pyarrow')
+        if self.fmt == 'parquet':
+            table = require('pyarrow.parquet').read_table(self.path, columns=columns, memory_map=True)
+        else:
+            with pa.memory_map(self.path) as source:
+                reader = pa.ipc.open_file(source)
+                if columns is not None:
+                    names = reader.schema.names
+                    included = [names.index(column) for column in columns if column in names]
+                    reader = pa.ipc.open_file(source, options=pa.ipc.IpcReadOptions(included_fields=included))
+                table = reader.read_all()
+        return _validated(self, table.to_pandas(), columns)
+
+    def write(self, df):
+        """Riscrive l'intero registro compresso in modo atomico (file temporaneo + rename)."""
+        pa = require('pyarrow')
+        table = pa.Table.from_pandas(_normalize_types(df.reindex(columns=create_empty_dataframe().columns)),
+                                     preserve_index=False)
+        tmp_path = self.path + '.tmp'
+        if self.fmt == 'parquet':
+            require('pyarrow.parquet').write_table(table, tmp_path, compression=self._compression())
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=self._compression())
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, self.path)
+        self._bump_version()
+
+    def insert_rows(self, rows, current):
+        """Riscrive il file con le nuove righe in coda."""
+        self.write(pd.concat([current, rows], ignore_index=True) if not current.empty else rows)
+
+    def write_batch(self, new, current, deleted, updated, added):
+        """Scrive un lotto di modifiche con un'unica riscrittura."""
+        self.write(new)
+
+# Estensioni del file dati associate al backend SQLite
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# Estensioni del file dati associate al backend colonnare -> formato
+COLUMNAR_EXTENSIONS = {'.parquet': 'parquet', '.pq': 'parquet',
+                       '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow'}
+
+# Percorso assoluto -> istanza del backend
+_storages = {}
+
+def get_storage(file_path):
+    """
+    Ritorna il backend di persistenza associato al file dati.
+
+    Args:
+        file_path (str): Percorso del file dei rischi (.csv, .db/.sqlite/.sqlite3
+                         oppure .parquet/.arrow/.feather)
+
+    Returns:
+        CsvStorage | JournaledCsvStorage | SqliteStorage | ColumnarStorage: Backend
+            condiviso dal processo per quel file
+    """
+    path = os.path.abspath(file_path)
+    with _SNAPSHOT_LOCK:
+        storage = _storages.get(path)
+        if storage is None:
+            extension = os.path.splitext(path)[1].lower()
+            if path.lower().endswith(SQLITE_EXTENSIONS):
+                storage = SqliteStorage(path)
+            elif extension in COLUMNAR_EXTENSIONS:
+                storage = ColumnarStorage(path, COLUMNAR_EXTENSIONS[extension])
+            elif CSV_JOURNAL_ENABLED:
+                storage = JournaledCsvStorage(path)
+            else:
+                storage = CsvStorage(path)
+            _storages[path] = storage
+        return storage
+
+def _apply_update(df, risk_id, fields):
+    """Ritorna una copia del registro con i campi del rischio indicato aggiornati."""
+    df = _session_copy(df)
+    mask = df['ID'] == risk_id
+    for column, value in fields.items():
+        df.loc[mask, column] = coerce_values(df, column, value)
+    return df
+
+def _native(value):
+    """Converte gli scalari NumPy nei tipi Python equivalenti e le date nel formato dei file."""
+    if hasattr(value, 'strftime') or value is pd.NaT:
+        return format_date(value) or None
+    return value.item() if hasattr(value, 'item') else value
+
+def _truncate_torn_record(journal, block=64 * 1024):
+    """Rimuove dalla fine del journal (aperto in lettura/scrittura binaria) un record senza a capo."""
+    end = journal.seek(0, os.SEEK_END)
+    if end == 0:
+        return
+    position = end
+    while position > 0:
+        start = max(position - block, 0)
+        journal.seek(start)
+        chunk = journal.read(position - start)
+        if position == end and chunk.endswith(b'\n'):
+            return
+        newline = chunk.rfind(b'\n')
+        if newline >= 0:
+            position = start + newline + 1
+            break
+        position = start
+    _logger.warning("Record incompleto rimosso dalla fine del journal %s", journal.name)
+    journal.truncate(position)
+
+def _atomic_write_text(path, text):
+    """Scrive un file di testo tramite file temporaneo + rename."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def _validated(storage, df, columns=None):
+    """
+    Valida le righe lette dal backend e ritorna solo quelle valide.
+
+    Dopo una lettura completa le righe scartate e il numero di righe con
+    valore/priorità ricalcolati restano in storage.rejected, per il file di
+    quarantena e il riepilogo mostrato nella dashboard. Una lettura proiettata
+    deve includere VALIDATED_COLUMNS (vedi _projection) per scartare le stesse
+    righe della lettura completa.
+    """
+    valid, rejected, recalculated = validate_register(df, columns)
+    if columns is None:
+        # Righe scartate da una migrazione precedente (vedi _read_migration_source)
+        storage.rejected = _merge_outcomes(getattr(storage, 'migration_rejected', None),
+                                           (rejected, recalculated))
+        storage.migration_rejected = None
+        return valid
+    return valid[list(columns)]
+
+def _merge_outcomes(*outcomes):
+    """Unisce gli esiti (righe scartate, righe ricalcolate) di più validazioni."""
+    outcomes = [outcome for outcome in outcomes if outcome is not None]
+    if not outcomes:
+        return None
+    frames = [rejected for rejected, _ in outcomes if len(rejected)]
+    rejected = pd.concat(frames, ignore_index=True) if frames else outcomes[-1][0]
+    return rejected, sum(recalculated for _, recalculated in outcomes)
+
+def _read_migration_source(storage, source_path):
+    """
+    Legge e valida il CSV da migrare in un altro backend.
+
+    Le righe scartate non arrivano nel nuovo backend: restano in
+    storage.migration_rejected fino alla successiva lettura completa, che le
+    riporta nel file di quarantena e nel riepilogo della validazione.
+    """
+    source = CsvStorage(source_path)
+    df = source.read()
+    storage.migration_rejected = source.rejected
+    return df
+
+def _projection(columns):
+    """Colonne da leggere per una vista: le sue più quelle che decidono la validità delle righe."""
+    return list(dict.fromkeys([*columns, *VALIDATED_COLUMNS]))
+
+def _to_records(rows):
+    """Converte le righe in dizionari serializzabili (NaN -> None, date come testo)."""
+    return serialize_frame(rows).astype(object).where(rows.notna(), None).to_dict('records')
+
+def _upsert_rows(df, records):
+    """Aggiunge i record al registro sostituendo le righe con lo stesso ID."""
+    if not records:
+        return df
+    rows = _normalize_types(pd.DataFrame(records, columns=df.columns))
+    if df.empty:
+        return rows
+    return _normalize_types(pd.concat([df[~df['ID'].isin(rows['ID'])], rows], ignore_index=True))
+
+# ===========================
+# LOCK TRA PROCESSI
+# ===========================
+
+# Lock di processo: le sessioni Streamlit girano su thread distinti
+_SNAPSHOT_LOCK = threading.RLock()
+
+class _FileLock:
+    """
+    Lock esclusivo tra processi sul file <dati>.lock (fcntl su POSIX, msvcrt su Windows).
+
+    Il lock è rientrante all'interno del processo e va acquisito tenendo
+    _SNAPSHOT_LOCK, che serializza già i thread delle sessioni.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._handle = None
+        self._depth = 0
+
+    def __enter__(self):
+        if self._depth == 0:
+            handle = open(self.path, 'a+')
+            try:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+                else:
+                    handle.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue  # LK_LOCK rinuncia dopo 10 secondi: si riprova
+            except BaseException:
+                handle.close()
+                raise
+            self._handle = handle
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            else:
+                self._handle.seek(0)
+                msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+            self._handle.close()
+            self._handle = None
+
+# Percorso assoluto -> lock tra processi
+_file_locks = {}
+
+@contextmanager
+def _locked(path, optional=False, create=True):
+    """
+    Acquisisce il lock di processo e il lock tra processi del registro.
+
+    Args:
+        path (str): Percorso assoluto del file dei rischi
+        optional (bool): Se True e il file .lock non è creabile (es. cartella in
+                         sola lettura) prosegue con il solo lock di processo
+        create (bool): Se False e il file .lock non esiste ancora (nessuna
+                       scrittura lo ha mai creato) prosegue con il solo lock di processo
+    """
+    with _SNAPSHOT_LOCK:
+        lock = _file_locks.setdefault(path, _FileLock(path + '.lock'))
+        if not create and not os.path.exists(lock.path):
+            yield
+            return
+        try:
+            lock.__enter__()
+        except OSError:
+            if not optional:
+                raise
+            yield
+            return
+        try:
+            yield
+        finally:
+            lock.__exit__(None, None, None)
+
+# ===========================
+# SNAPSHOT CONDIVISO TRA SESSIONI
+# ===========================
+
+# Percorso assoluto -> (chiave di versione, DataFrame in sola lettura)
+_snapshots = {}
+
+# Percorso assoluto -> versione interna incrementata ad ogni salvataggio
+_internal_versions = {}
+
+# Percorso assoluto -> (chiave di versione, {nome: vista derivata dallo snapshot})
+_derived = {}
+
+def _install_snapshot(path, key, df):
+    """Registra il nuovo snapshot condiviso."""
+    _snapshots[path] = (key, df)
+
+def _file_signature(file_path):
+    """Ritorna (mtime_ns, dimensione) del file, None se il file non esiste."""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def get_data_version(file_path):
+    """
+    Ritorna il token di versione corrente del registro.
+
+    Il token cambia quando cambia la firma del backend (mtime/dimensione del
+    CSV, versione del database) oppure quando un salvataggio di questo
+    processo incrementa la versione interna.
+
+    Args:
+        file_path (str): Percorso del file dei rischi
+
+    Returns:
+        tuple: Token confrontabile con quello di uno snapshot precedente
+    """
+    path = os.path.abspath(file_path)
+    with _SNAPSHOT_LOCK:
+        return (get_storage(path).signature(), _internal_versions.get(path, 0))
+
+def invalidate_snapshot(file_path):
+    """Forza la rilettura del registro al prossimo accesso."""
+    path = os.path.abspath(file_path)
+    with _SNAPSHOT_LOCK:
+        _internal_versions[path] = _internal_versions.get(path, 0) + 1
+        _snapshots.pop(path, None)
+
+def get_snapshot(file_path, read_only=False):
+    """
+    Ritorna lo snapshot condiviso del registro, rileggendolo solo se cambiato.
+
+    Il DataFrame ritornato è condiviso tra tutte le sessioni e non deve essere
+    modificato: per ottenere una copia di lavoro usare load_data().
+
+    Args:
+        file_path (str): Percorso del file dei rischi
+        read_only (bool): Non crea file accanto al registro (es. export da riga
+                          di comando): il file .lock viene usato solo se esiste
+                          già e le righe scartate non vengono salvate nel file
+                          di quarantena
+
+    Returns:
+        pd.DataFrame: Snapshot in sola lettura del registro
+
+    Raises:
+        Exception: Propaga gli errori di lettura del backend
+    """
+    path = os.path.abspath(file_path)
+    with _SNAPSHOT_LOCK:
+        cached = _snapshots.get(path)
+        if cached is not None and cached[0] == get_data_version(path):
+            return cached[1]
+
+        # Rilettura sotto lock per non leggere una scrittura in corso di un altro processo
+        with _locked(path, optional=True, create=not read_only):
+            key = get_data_version(path)
+            # Gli errori di lettura si propagano senza essere memorizzati: la
+            # prossima sessione riprova la lettura e mostra nuovamente l'errore
+            if key[0] is None:
+                df = create_empty_dataframe()
+            else:
+                storage = get_storage(path)
+                storage.rejected = None
+                df = storage.read()
+                _record_validation(path, len(df), storage.rejected, quarantine=not read_only)
+            _install_snapshot(path, key, df)
+            return df
+
+def get_versioned_snapshot(file_path):
+    """
+    Ritorna lo snapshot condiviso insieme al token di versione a cui corrisponde.
+
+    Permette di memorizzare risultati calcolati dallo snapshot (es. report
+    generati) sotto una chiave coerente con il loro contenuto.
+
+    Args:
+        file_path (str): Percorso del file dei rischi
+
+    Returns:
+        tuple: (token di versione, DataFrame in sola lettura)
+    """
+    path = os.path.abspath(file_path)
+    with _SNAPSHOT_LOCK:
+        snapshot = get_snapshot(path)
+        return _snapshots[path][0], snapshot
+
+def get_derived(file_path, name, build, columns=None):
+    """
+    Ritorna una vista derivata dallo snapshot corrente (es. indice della heat map).
+
+    La vista viene costruita con build(snapshot) una sola volta per versione
+    del registro e condivisa tra le sessioni. Se la vista indica le colonne
+    che usa e lo snapshot completo non è in memoria, viene costruita leggendo
+    dal backend solo quelle colonne e quelle validate (con Parquet/Arrow le
+    altre non vengono nemmeno decodificate), così le righe in quarantena sono
+    escluse come dallo snapshot completo. Dopo insert_risk(),
+    delete_risks() e update_risk() la vista viene aggiornata in modo
+    incrementale se espone i metodi on_insert(rows), on_delete(ids) o
+    on_update(risk_id, fields), che ritornano una nuova vista; altrimenti
+    viene ricostruita alla richiesta successiva. Dopo apply_batch() viene
+    chiamato on_batch(deleted_ids, updated_rows, added_rows).
+
+    Args:
+        file_path (str): Percorso del file dei rischi
+        name (str): Nome univoco della vista
+        build (callable): Funzione snapshot -> vista
+        columns (list, optional): Colonne del registro usate da build
+
+    Returns:
+        object: Vista derivata, da trattare in sola lettura
+    """
+    path = os.path.abspath(file_path)
+    with _SNAPSHOT_LOCK:
+        key = get_data_version(path)
+        views = _derived.get(path)
+        if views is not None and views[0] == key and name in views[1]:
+            return views[1][name]
+
+        cached = _snapshots.get(path)
+        if columns is not None and (cached is None or cached[0] != key):
+            # Snapshot completo non in memoria: lettura delle sole colonne della vista
+            with _locked(path, optional=True):
+                key = get_data_version(path)
+                if key[0] is None:
+                    source = create_empty_dataframe()[list(columns)]
+                else:
+                    # Validate anche sulle colonne che la vista non usa: la vista
+                    # contiene le stesse righe dello snapshot completo
+                    source = get_storage(path).read(_projection(columns))[list(columns)]
+        else:
+            source = get_snapshot(path)
+            key = _snapshots[path][0]
+
+        views = _derived.get(path)
+        if views is None or views[0] != key:
+            views = _derived[path] = (key, {})
+        if name not in views[1]:
+            views[1][name] = build(source)
+        return views[1][name]
+
+def _update_derived(path, old_key, new_key, delta):
+    """Propaga una modifica alle viste derivate, scartando quelle non aggiornabili."""
+    views = _derived.pop(path, None)
+    if views is None or views[0] != old_key or delta is None:
+        return
+    updated = {}
+    for name, view in views[1].items():
+        handler = getattr(view, 'on_' + delta[0], None)
+        if handler is not None:
+            updated[name] = handler(*delta[1:])
+    _derived[path] = (new_key, updated)
+
+def _session_copy(df):
+    """Copia di lavoro per la sessione: superficiale se è attivo il copy-on-write."""
+    return df.copy(deep=not _COPY_ON_WRITE)
+
+def _mutate(file_path, write, apply, delta=None):
+    """
+    Esegue una modifica sul backend e aggiorna lo snapshot senza rileggere il registro.
+
+    La modifica avviene sotto il lock tra processi e parte dallo snapshot più
+    recente: se un altro processo ha scritto nel frattempo, il registro viene
+    riletto prima di applicare la modifica.
+
+    Args:
+        file_path (str): Percorso del file dei rischi
+        write (callable): Funzione (storage, snapshot) che scrive sul backend; se ritorna
+                          False non c'era nulla da scrivere e la versione resta invariata
+        apply (callable): Funzione snapshot -> nuovo snapshot con la stessa modifica
+        delta (tuple | callable, optional): Modifica per le viste derivate, es. ('delete', ids),
+                                            oppure funzione chiamata dopo la scrittura che la ritorna
+
+    Returns:
+        bool: True se il registro è stato modificato
+    """
+    path = os.path.abspath(file_path)
+    with _locked(path):
+        current = get_snapshot(path)
+        old_key = _snapshots[path][0]
+        try:
+            if write(get_storage(path), current) is False:
+                return False
+        except Exception:
+            invalidate_snapshot(path)
+            raise
+        _internal_versions[path] = _internal_versions.get(path, 0) + 1
+        new_key = get_data_version(path)
+        _install_snapshot(path, new_key, _normalize_types(apply(current).reset_index(drop=True)))
+        _update_derived(path, old_key, new_key, delta() if callable(delta) else delta)
+        _schedule_compaction(path)
+        return True
+
+def _allocate_ids(storage, current, count):
+    """
+    Riserva un blocco di ID dalla sequenza persistente del registro.
+
+    La sequenza non torna mai indietro (gli ID eliminati non vengono riusati)
+    e resta comunque oltre l'ID massimo presente, anche dopo modifiche esterne.
+    Va chiamata tenendo il lock tra processi.
+
+    Returns:
+        list: ID consecutivi riservati
+    """
+    next_id = int(storage.read_meta().get('next_id', 1))
+    if not current.empty:
+        next_id = max(next_id, int(current['ID'].max()) + 1)
+    storage.write_meta(next_id=next_id + count)
+    return list(range(next_id, next_id + count))
+
+# Percorsi con una compattazione del journal in corso
+_compacting = set()
+
+def _schedule_compaction(path):
+    """Avvia in background la compattazione del journal se ha superato la soglia."""
+    storage = get_storage(path)
+    if not getattr(storage, 'needs_compaction', lambda: False)() or path in _compacting:
+        return
+    _compacting.add(path)
+    threading.Thread(target=compact_storage, args=(path,), daemon=True,
+                     name='risk-journal-compaction').start()
+
+def compact_storage(file_path):
+    """
+    Compatta il journal del backend CSV in un nuovo file CSV base.
+
+    Il contenuto scritto è lo snapshot corrente, quindi la compattazione non
+    rilegge né riapplica il journal.
+
+    Args:
+        file_path (str): Percorso del file dei rischi
+    """
+    path = os.path.abspath(file_path)
+    try:
+        with _locked(path):
+            storage = get_storage(path)
+            if not isinstance(storage, JournaledCsvStorage):
+                return
+            current = get_snapshot(path)
+            storage.write(current)
+            # Contenuto invariato: aggiorna solo la chiave di snapshot e viste derivate
+            old_key = _snapshots[path][0]
+            new_key = get_data_version(path)
+            _install_snapshot(path, new_key, current)
+            views = _derived.get(path)
+            if views is not None and views[0] == old_key:
+                _derived[path] = (new_key, views[1])
+    finally:
+        _compacting.discard(path)
+
+# ===========================
+# QUARANTENA DELLE RIGHE NON VALIDE
+# ===========================
+
+# Percorso assoluto -> riepilogo della validazione dell'ultima lettura completa
+_validation = {}
+
+def _record_validation(path, valid_count, outcome, quarantine=True):
+    """
+    Registra l'esito della validazione e salva le righe scartate nel file di quarantena.
+
+    Le righe vengono accodate a quelle già presenti senza duplicati: finché il
+    file dati non viene riscritto, ogni rilettura ritrova le stesse righe. Se il
+    file di quarantena non può essere scritto (es. cartella in sola lettura) il
+    registro resta comunque leggibile: l'errore viene registrato nel log e il
+    riepilogo riporta 'quarantine_file' None, come per le letture con
+    quarantine False.
+    """
+    rejected, recalculated = outcome if outcome is not None else (pd.DataFrame(), 0)
+    quarantine = path + QUARANTINE_SUFFIX if quarantine and len(rejected) else None
+    if quarantine is not None:
+        rows = serialize_frame(rejected).astype(object).where(rejected.notna(), None)
+        try:
+            if os.path.exists(quarantine):
+                rows = pd.concat([pd.read_csv(quarantine, dtype=object), rows.astype(str).where(rows.notna())],
+                                 ignore_index=True).drop_duplicates()
+            rows.to_csv(quarantine + '.tmp', index=False)
+            os.replace(quarantine + '.tmp', quarantine)
+        except OSError:
+            _logger.exception("Impossibile scrivere il file di quarantena %s", quarantine)
+            quarantine = None
+    _validation[path] = {
+        'valid': valid_count,
+        'rejected': len(rejected),
+        'recalculated': recalculated,
+        'reasons': rejected[REASON_COLUMN].str.split(', ').explode().value_counts().to_dict()
+                   if len(rejected) else {},
+        'quarantine_file': quarantine,
+    }
+
+def get_validation_report(file_path):
+    """
+    Ritorna l'esito della validazione dell'ultima lettura completa del registro.
+
+    Args:
+        file_path (str): Percorso del file dei rischi
+
+    Returns:
+        dict | None: Righe valide ('valid'), scartate ('rejected') e con
+                     valore/priorità ricalcolati ('recalculated'), conteggio per
+                     motivo ('reasons') e file di quarantena ('quarantine_file');
+                     None se il registro non è ancora stato letto
+    """
+    return _validation.get(os.path.abspath(file_path))
+
+# ===========================
+# FUNZIONI DI GESTIONE DATI
+# ===========================
+
+@instrumented()
+def load_data(file_path):
+    """
+    Carica i dati dei rischi dal backend associato al file specificato.
+
+    I dati provengono dallo snapshot condiviso tra le sessioni: il registro
+    viene letto solo se è cambiato dall'ultima lettura e la sessione riceve una
+    copia copy-on-write che non duplica le colonne finché non vengono modificate.
+
+    Args:
+        file_path (str): Percorso del file (CSV o SQLite) contenente i dati dei rischi
+
+    Returns:
+        pd.DataFrame: DataFrame contenente i dati dei rischi con tipizzazione corretta
+                     delle colonne numeriche. Ritorna DataFrame vuoto se file non esiste.
+
+    Raises:
+        Exception: Gestisce errori di lettura file mostrando messaggio di errore
+    """
+    try:
+        return _session_copy(get_snapshot(file_path))
+    except Exception as e:
+        st.error(f"Errore nel caricamento dei dati: {e}")
+        return create_empty_dataframe()
+
+@instrumented()
+def save_data(df, file_path):
+    """
+    Salva l'intero DataFrame dei rischi sul backend associato al file specificato.
+
+    Il registro viene sostituito interamente da df. Per le modifiche preferire
+    insert_risk(), delete_risks(), update_risk() e apply_batch(), che partono
+    dallo stato più recente del registro e con il backend SQLite scrivono solo
+    le righe coinvolte. La sequenza degli ID viene portata oltre l'ID massimo
+    di df, così gli ID salvati non vengono riassegnati.
+
+    Args:
+        df (pd.DataFrame): DataFrame contenente i dati dei rischi da salvare
+        file_path (str): Percorso di destinazione (CSV o SQLite)
+
+    Returns:
+        bool: True se il salvataggio è riuscito, False altrimenti
+    """
+    def write(storage, current):
+        storage.write(df)
+        if not df.empty:
+            next_id = int(storage.read_meta().get('next_id', 1))
+            storage.write_meta(next_id=max(next_id, int(df['ID'].max()) + 1))
+
+    try:
+        _mutate(file_path, write, lambda current: _session_copy(df))
+        return True
+    except Exception as e:
+        st.error(f"Errore nel salvataggio dei dati: {e}")
+        return False
+
+@instrumented()
+def insert_risk(row, file_path):
+    """
+    Aggiunge un nuovo rischio al registro scrivendo solo la nuova riga.
+
+    L'ID viene assegnato dalla sequenza persistente del registro sotto il lock
+    tra processi, quindi sessioni e processi diversi non generano mai lo
+    stesso ID. Un eventuale ID presente in row viene ignorato.
+
+    Args:
+        row (dict): Record del rischio con tutte le colonne del registro tranne l'ID
+        file_path (str): Percorso del file dei rischi
+
+    Returns:
+        int | None: ID assegnato al nuovo rischio, None se il salvataggio non è riuscito
+    """
+    def write(storage, current):
+        rows['ID'] = _allocate_ids(storage, current, len(rows))
+        storage.insert_rows(rows, current)
+
+    try:
+        rows = pd.DataFrame([{**row, 'ID': 0}], columns=create_empty_dataframe().columns)
+        check_categories(rows)
+        rows = _normalize_types(rows)
+        _mutate(file_path, write,
+                lambda current: pd.concat([current, rows], ignore_index=True) if not current.empty else rows,
+                delta=('insert', rows))
+        return int(rows['ID'].iloc[0])
+    except Exception as e:
+        st.error(f"Errore nel salvataggio dei dati: {e}")
+        return None
+
+@instrumented()
+def delete_risks(risk_ids, file_path):
+    """
+    Elimina uno o più rischi dal registro in un'unica operazione.
+
+    Args:
+        risk_ids (list): ID univoci dei rischi da eliminare
+        file_path (str): Percorso del file dei rischi
+
+    Returns:
+        bool: True se il salvataggio è riuscito, False altrimenti
+    """
+    risk_ids = [int(risk_id) for risk_id in risk_ids]
+    try:
+        _mutate(file_path,
+                lambda storage, current: storage.delete_ids(risk_ids, current),
+                lambda current: current[~current['ID'].isin(risk_ids)],
+                delta=('delete', risk_ids))
+        return True
+    except Exception as e:
+        st.error(f"Errore nel salvataggio dei dati: {e}")
+        return False
+
+def _scored_fields(current, risk_id, fields):
+    """Campi da salvare, con Valore_Rischio e Priorità ricalcolati se cambiano Probabilità o Impatto."""
+    if 'Probabilità' not in fields and 'Impatto' not in fields:
+        return fields
+    row = _apply_update(current[current['ID'] == risk_id], risk_id, fields)
+    if row.empty:
+        return fields
+    scored = score_frame(_normalize_types(row)).iloc[0]
+    return {**fields, **{column: _native(scored[column]) for column in SCORED_COLUMNS}}
+
+@instrumented()
+def update_risk(risk_id, fields, file_path):
+    """
+    Aggiorna i campi indicati di un singolo rischio.
+
+    Se cambiano Probabilità o Impatto vengono salvati anche Valore_Rischio e
+    Priorità ricalcolati.
+
+    Args:
+        risk_id (int): ID univoco del rischio da aggiornare
+        fields (dict): Nome colonna -> nuovo valore
+        file_path (str): Percorso del file dei rischi
+
+    Returns:
+        bool: True se il salvataggio è riuscito, False altrimenti
+    """
+    risk_id = int(risk_id)
+    saved = {}
+
+    def write(storage, current):
+        saved.update(_scored_fields(current, risk_id, fields))
+        storage.update_row(risk_id, saved, current)
+
+    try:
+        # Verifica prima della scrittura: il backend salva i campi prima dello snapshot
+        check_categories(pd.DataFrame([fields]))
+        _mutate(file_path, write,
+                lambda current: _apply_update(current, risk_id, saved),
+                delta=lambda: ('update', risk_id, saved))
+        return True
+    except Exception as e:
+        st.error(f"Errore nel salvataggio dei dati: {e}")
+        return False
+
+# ===========================
+# MODIFICHE IN LOTTO
+# ===========================
+
+# Colonne calcolate dal motore di scoring, ignorate se presenti nelle modifiche
+SCORED_COLUMNS = ('Valore_Rischio', 'Priorità')
+
+def _batch_updates(updates):
+    """
+    Normalizza le modifiche di un lotto in due frame indicizzati per ID.
+
+    Args:
+        updates (dict | pd.DataFrame | None): {ID: {colonna: valore}} oppure
+            righe con colonna ID e le sole colonne da modificare
+
+    Returns:
+        tuple: (valori, maschera booleana dei campi indicati per ogni ID)
+    """
+    if updates is None or len(updates) == 0:
+        empty = pd.DataFrame(index=pd.Index([], dtype=int))
+        return empty, empty
+    if isinstance(updates, pd.DataFrame):
+        values = updates.set_index(updates['ID'].astype(int).to_numpy()).drop(columns=['ID'])
+        provided = pd.DataFrame(True, index=values.index, columns=values.columns)
+    else:
+        values = pd.DataFrame.from_dict({int(risk_id): fields for risk_id, fields in updates.items()},
+                                        orient='index')
+        provided = pd.DataFrame({column: [column in fields for fields in updates.values()]
+                                 for column in values.columns}, index=values.index)
+    keep = [c for c in values.columns if c in create_empty_dataframe().columns
+            and c != 'ID' and c not in SCORED_COLUMNS]
+    last = ~values.index.duplicated(keep='last')
+    return values.loc[last, keep], provided.loc[last, keep]
+
+def _apply_batch(current, deletes, values, provided, added):
+    """
+    Applica un lotto al registro con operazioni vettoriali.
+
+    Le eliminazioni usano un'unica maschera isin, le modifiche un'assegnazione
+    allineata per ID per ogni colonna e Valore_Rischio/Priorità vengono
+    ricalcolati solo per le righe modificate.
+
+    Returns:
+        tuple: (nuovo registro, righe modificate complete, ID eliminati)
+    """
+    frame = current.set_index(current['ID'].astype(int).to_numpy())
+    deleted = frame.index[frame.index.isin(deletes)]
+    frame = frame.drop(index=deleted)
+
+    ids = values.index.intersection(frame.index, sort=False)
+    if len(ids):
+        for column in values.columns:
+            target = ids[provided.loc[ids, column].to_numpy(dtype=bool)]
+            if len(target):
+                frame.loc[target, column] = coerce_values(frame, column, values.loc[target, column].to_numpy())
+        scored = score_frame(_normalize_types(frame.loc[ids]))
+        for column in SCORED_COLUMNS:
+            frame.loc[ids, column] = scored[column].to_numpy()
+    updated = _normalize_types(frame.loc[ids].reset_index(drop=True))
+
+    new = frame.reset_index(drop=True)
+    if not added.empty:
+        new = pd.concat([new, added], ignore_index=True) if not new.empty else added
+    return _normalize_types(new), updated, deleted.tolist()
+
+@instrumented()
+def apply_batch(file_path, adds=None, updates=None, deletes=None, exclude=None):
+    """
+    Applica in un'unica operazione atomica aggiunte, modifiche ed eliminazioni.
+
+    Il lotto viene applicato con operazioni vettoriali sullo snapshot più
+    recente e persistito con una sola scrittura: riscrittura atomica del CSV
+    (o accodamento se ci sono solo aggiunte), un solo record del journal, una
+    sola transazione SQLite. Valore_Rischio e Priorità vengono calcolati solo
+    per le righe aggiunte o modificate. Gli ID delle aggiunte sono riservati in
+    un unico blocco dalla sequenza del registro; modifiche ed eliminazioni di
+    ID non presenti vengono ignorate e, se nessun ID è presente, il registro non
+    viene riscritto e la sua versione non cambia. Con exclude le aggiunte già
+    presenti (es. duplicati di un'importazione) vengono scartate sotto lo
+    stesso lock della scrittura, confrontandole con il registro più recente.
+
+    Args:
+        file_path (str): Percorso del file dei rischi
+        adds (list | pd.DataFrame, optional): Nuovi rischi (record senza ID)
+        updates (dict | pd.DataFrame, optional): {ID: {colonna: valore}} oppure
+            righe con colonna ID e le colonne da modificare
+        deletes (list, optional): ID dei rischi da eliminare
+        exclude (callable, optional): Funzione (registro corrente, aggiunte) -> maschera
+                                      booleana delle aggiunte da non salvare
+
+    Returns:
+        dict | None: ID 'added', 'updated' e 'deleted' effettivamente applicati,
+                     None se il salvataggio non è riuscito
+    """
+    columns = create_empty_dataframe().columns
+    added = pd.DataFrame(adds if adds is not None else [], columns=columns)
+    values, provided = _batch_updates(updates)
+    deletes = [int(risk_id) for risk_id in (deletes or [])]
+    if added.empty and values.empty and not deletes:
+        return {'added': [], 'updated': [], 'deleted': []}
+
+    result = {}
+
+    def write(storage, current):
+        nonlocal added
+        if exclude is not None and not added.empty:
+            added = added[~pd.Series(exclude(current, added), dtype=bool).to_numpy()].reset_index(drop=True)
+        matched = (current['ID'].isin(deletes).any() or values.index.isin(current['ID']).any())
+        if added.empty and not matched:
+            # Solo ID non più presenti (es. già eliminati da un'altra sessione): nessuna scrittura
+            result.update(updated=current.iloc[:0], deleted=[])
+            return False
+        if not added.empty:
+            added['ID'] = _allocate_ids(storage, current, len(added))
+        new, updated, deleted = _apply_batch(current, deletes, values, provided, added)
+        result.update(new=new, updated=updated, deleted=deleted)
+        storage.write_batch(new, current, deleted, updated, added)
+
+    try:
+        if not added.empty:
+            # Priorità e valore vengono ricalcolati: si verificano solo gli altri campi
+            check_categories(added.drop(columns=list(SCORED_COLUMNS)))
+            added['ID'] = 0
+            added = score_frame(_normalize_types(added))
+        _mutate(file_path, write, lambda current: result['new'],
+                delta=lambda: ('batch', result['deleted'], result['updated'], added))
+        return {'added': added['ID'].tolist(), 'updated': result['updated']['ID'].tolist(),
+                'deleted': result['deleted']}
+    except Exception as e:
+        st.error(f"Errore nel salvataggio dei dati: {e}")
+        return None
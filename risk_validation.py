@@ -0,0 +1,141 @@
+"""
+Validazione vettoriale delle righe del registro.
+
+Ogni controllo è una maschera booleana calcolata sull'intera colonna, quindi
+il costo resta lineare e basso anche su registri di centinaia di migliaia di
+righe. Una riga non valida (ID mancante o duplicato, Probabilità/Impatto
+fuori dalla scala 1-5 a passi di 0.5, stato sconosciuto, data non leggibile,
+descrizione vuota) viene esclusa dal registro caricato invece di far fallire
+l'intera lettura; risk_storage la sposta nel file di quarantena con il
+motivo dello scarto.
+
+Valore_Rischio e Priorità non coerenti con Probabilità e Impatto non
+rendono la riga non valida: vengono ricalcolati dal motore di scoring.
+"""
+
+import numpy as np
+import pandas as pd
+
+from risk_schema import DATE_COLUMNS, REGISTER_DTYPES, STATUS_VALUES, apply_schema, to_dates
+from risk_scoring import DEFAULT_ENGINE, score_frame
+
+# ===========================
+# CONFIGURAZIONE
+# ===========================
+
+# Valori ammessi per Probabilità e Impatto (scala 1-5 a passi di 0.5)
+SCALE_VALUES = [float(level) for level in DEFAULT_ENGINE.levels]
+
+# Colonna con il motivo dello scarto nelle righe rifiutate
+REASON_COLUMN = 'Motivo'
+
+# Colonne da cui dipende la validità di una riga (controlli di check_rows)
+VALIDATED_COLUMNS = ('ID', 'Descrizione', 'Probabilità', 'Impatto', 'Stato', 'Data scadenza')
+
+# ===========================
+# CONTROLLI
+# ===========================
+
+def _numeric(series):
+    """Valori numerici della colonna; testo non numerico -> NaN."""
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series
+    return pd.to_numeric(series, errors='coerce')
+
+def check_rows(df):
+    """
+    Calcola le maschere dei controlli sulle colonne presenti.
+
+    Args:
+        df (pd.DataFrame): Righe del registro, tipizzate o lette come testo
+
+    Returns:
+        pd.DataFrame: Una colonna booleana per motivo di scarto (True = riga non valida)
+    """
+    problems = {}
+    if 'ID' in df.columns:
+        ids = _numeric(df['ID'])
+        invalid = ids.isna() | (ids % 1 != 0) | (ids < 1)
+        problems['ID mancante o non valido'] = invalid
+        problems['ID duplicato'] = ids.duplicated(keep='first') & ~invalid
+    if 'Descrizione' in df.columns:
+        text = df['Descrizione']
+        problems['descrizione vuota'] = text.isna() | (text.astype(str).str.strip() == '')
+    for column, label in (('Probabilità', 'probabilità'), ('Impatto', 'impatto')):
+        if column in df.columns:
+            problems[f'{label} fuori scala'] = ~_numeric(df[column]).isin(SCALE_VALUES)
+    if 'Stato' in df.columns:
+        problems['stato non valido'] = ~df['Stato'].isin(STATUS_VALUES)
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            dates = df[column]
+            if not pd.api.types.is_datetime64_dtype(dates.dtype):
+                dates = to_dates(dates)
+            problems['data di scadenza non valida'] = dates.isna()
+    return pd.DataFrame(problems, index=df.index)
+
+def describe_problems(problems):
+    """
+    Motivi di scarto delle righe non valide.
+
+    Args:
+        problems (pd.DataFrame): Maschere di check_rows()
+
+    Returns:
+        pd.Series: Motivi separati da virgola, solo per le righe con almeno un problema
+    """
+    bad = problems[problems.any(axis=1)]
+    text = pd.Series('', index=bad.index, dtype=object)
+    for reason in bad.columns:
+        text = text + np.where(bad[reason].to_numpy(), reason + ', ', '')
+    return text.str[:-2]
+
+# ===========================
+# VALIDAZIONE DEL REGISTRO
+# ===========================
+
+def validate_register(df, columns=None):
+    """
+    Separa le righe valide del registro da quelle da mettere in quarantena.
+
+    Args:
+        df (pd.DataFrame): Registro letto dal backend (tipizzato o come testo)
+        columns (list, optional): Lettura proiettata: controlla solo queste colonne
+            (con VALIDATED_COLUMNS incluse scarta le stesse righe di una lettura
+            completa); valore e priorità vengono ricalcolati se presenti insieme
+            a Probabilità e Impatto, senza contarli tra i ricalcolati
+
+    Returns:
+        tuple: (righe valide tipizzate, righe scartate con colonna Motivo,
+                numero di righe con valore/priorità ricalcolati)
+    """
+    # Colonne mancanti nel file come valori vuoti: stesse righe scartate in ogni lettura
+    df = df.reindex(columns=list(REGISTER_DTYPES) if columns is None else list(columns))
+    problems = check_rows(df)
+    bad = problems.any(axis=1).to_numpy()
+    rejected = df[bad]
+    if len(rejected):
+        rejected = rejected.assign(**{REASON_COLUMN: describe_problems(problems)})
+
+    # Colonne lette come testo: numeri convertiti prima della tipizzazione
+    valid = df[~bad]
+    valid = valid.assign(**{column: _numeric(valid[column])
+                            for column in ('ID', 'Probabilità', 'Impatto', 'Valore_Rischio')
+                            if column in valid.columns})
+    valid = apply_schema(valid.reset_index(drop=True))
+
+    recalculated = 0
+    if columns is not None:
+        if (len(valid) and {'Probabilità', 'Impatto'}.issubset(valid.columns)
+                and {'Valore_Rischio', 'Priorità'} & set(valid.columns)):
+            valid = apply_schema(score_frame(valid))
+        return valid, rejected, recalculated
+    if len(valid):
+        scored = score_frame(valid)
+        stale = (~np.isclose(valid['Valore_Rischio'].to_numpy(dtype=float),
+                             scored['Valore_Rischio'].to_numpy(dtype=float))
+                 | (valid['Priorità'].astype(object).to_numpy() != scored['Priorità'].astype(object).to_numpy()))
+        recalculated = int(stale.sum())
+        if recalculated:
+            valid = apply_schema(scored)
+    return valid, rejected, recalculated
@@ -0,0 +1,38 @@
+"""
+Configurazione comune dei test: moduli del progetto importabili dalla radice
+del repository e registri di prova in cartelle temporanee.
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from risk_schema import apply_schema  # noqa: E402
+from risk_scoring import score_frame  # noqa: E402
+
+
+def make_register(count, start=1):
+    """Registro tipizzato di prova con count rischi validi e ID consecutivi."""
+    ids = range(start, start + count)
+    df = pd.DataFrame({
+        'ID': list(ids),
+        'Descrizione': [f'Rischio {i}' for i in ids],
+        'Probabilità': [1.0 + (i % 9) * 0.5 for i in ids],
+        'Impatto': [5.0 - (i % 9) * 0.5 for i in ids],
+        'Valore_Rischio': 0.0,
+        'Priorità': 'Bassa',
+        'Contromisura': [f'Azione {i}' for i in ids],
+        'Stato': 'In corso',
+        'Data scadenza': '2026-01-31',
+    })
+    return apply_schema(score_frame(df))
+
+
+@pytest.fixture
+def register_path(tmp_path):
+    """Percorso di un registro CSV inesistente in una cartella temporanea."""
+    return str(tmp_path / 'risk_data.csv')
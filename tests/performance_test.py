@@ -0,0 +1,314 @@
+"""
+Benchmark delle operazioni principali della dashboard su registri sintetici.
+
+Misura tempo reale e picco di memoria di caricamento e
+salvataggio del registro, calcolo della priorità su una colonna, heat map,
+report PDF ed export Excel per ogni dimensione richiesta:
+
+    python tests/performance_test.py --records=1000
+    python tests/performance_test.py --records=1000,10000,100000 --only pdf,excel
+
+Con --update-baseline i risultati vengono salvati come riferimento
+(tests/performance_baseline.json di default). Nelle esecuzioni successive il
+benchmark fallisce (codice di uscita 1) se un tempo o un picco di memoria
+supera quello di riferimento di oltre il fattore --threshold.
+"""
+
+import argparse
+import ctypes
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from risk_heatmap import create_heatmap_image
+from risk_reports import create_excel_report, create_pdf_report
+from risk_scoring import calcola_priorita, score_frame
+from risk_storage import invalidate_snapshot, load_data, save_data
+
+# ===========================
+# CONFIGURAZIONE
+# ===========================
+
+# Dimensioni dei registri misurate di default
+DEFAULT_RECORDS = (1000, 10000, 100000)
+
+# File dei risultati di riferimento
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'performance_baseline.json')
+
+# Fattore di peggioramento tollerato rispetto al riferimento
+DEFAULT_THRESHOLD = float(os.environ.get('RISK_BENCH_THRESHOLD', 1.5))
+
+# Sotto queste soglie le differenze sono rumore di misura e non vengono segnalate
+MIN_SECONDS = 0.05
+MIN_PEAK_MB = 1.0
+
+# Righe del registro usato per la passata di riscaldamento
+WARMUP_RECORDS = 50
+
+# Intervallo di campionamento della memoria residente
+SAMPLE_SECONDS = 0.005
+
+STATI = ("Da pianificare", "In corso", "Monitoraggio", "Chiuso")
+
+_WORDS = (
+    "ritardo", "fornitore", "consegna", "budget", "risorse", "requisiti", "integrazione",
+    "sicurezza", "dati", "accesso", "normativa", "contratto", "collaudo", "migrazione",
+    "server", "personale", "formazione", "cliente", "approvazione", "scadenza", "qualità",
+    "documentazione", "licenze", "prestazioni", "rete", "backup", "audit", "terze", "parti",
+    "mancata", "perdita", "aumento", "costi", "del", "della", "per", "con", "non", "in",
+)
+
+# ===========================
+# GENERAZIONE REGISTRO SINTETICO
+# ===========================
+
+def _sentences(rng, n, min_words, max_words):
+    """Frasi casuali di lunghezza variabile, come descrizioni scritte a mano."""
+    words = np.asarray(_WORDS)
+    lengths = rng.integers(min_words, max_words + 1, n)
+    picks = rng.integers(0, len(words), lengths.sum())
+    texts = np.split(words[picks], np.cumsum(lengths)[:-1])
+    return [' '.join(text).capitalize() for text in texts]
+
+def generate_register(n, seed=0):
+    """
+    Genera un registro sintetico realistico.
+
+    Le descrizioni vanno da 4 a 40 parole, le contromisure da 3 a 25;
+    Probabilità e Impatto coprono la scala 1-5 a passi di 0.5 e sono presenti
+    tutti i valori di Stato.
+
+    Args:
+        n (int): Numero di rischi
+        seed (int): Seme del generatore casuale
+
+    Returns:
+        pd.DataFrame: Registro con Valore_Rischio e Priorità calcolati
+    """
+    rng = np.random.default_rng(seed)
+    deadlines = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 730, n), unit='D')
+    df = pd.DataFrame({
+        "ID": np.arange(1, n + 1),
+        "Descrizione": _sentences(rng, n, 4, 40),
+        "Probabilità": rng.integers(2, 11, n) / 2,
+        "Impatto": rng.integers(2, 11, n) / 2,
+        "Valore_Rischio": 0.0,
+        "Priorità": "",
+        "Contromisura": _sentences(rng, n, 3, 25),
+        "Stato": rng.choice(STATI, n),
+        "Data scadenza": deadlines.strftime('%Y-%m-%d'),
+    })
+    return score_frame(df)
+
+# ===========================
+# MISURE
+# ===========================
+
+def _release_free_memory():
+    """Restituisce al sistema la memoria libera dell'allocatore (glibc), se possibile."""
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+def _resident_bytes():
+    """Memoria residente del processo (Linux), None se non disponibile."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def measure(func):
+    """
+    Esegue func misurando tempo reale e picco di memoria.
+
+    Su Linux il picco è la crescita massima della memoria residente,
+    campionata da un thread ogni SAMPLE_SECONDS; altrove si usa tracemalloc,
+    che rallenta sensibilmente matplotlib e ReportLab.
+
+    Returns:
+        tuple: (secondi, picco in MB)
+    """
+    gc.collect()
+    _release_free_memory()  # Altrimenti la memoria già liberata viene riusata senza crescita
+    baseline = _resident_bytes()
+    if baseline is None:
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            func()
+        finally:
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return elapsed, peak / 1024 / 1024
+
+    peak = [baseline]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(SAMPLE_SECONDS):
+            peak[0] = max(peak[0], _resident_bytes())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        func()
+    finally:
+        elapsed = time.perf_counter() - start
+        done.set()
+        sampler.join()
+    peak[0] = max(peak[0], _resident_bytes())
+    return elapsed, (peak[0] - baseline) / 1024 / 1024
+
+def _consume(report):
+    """Legge e chiude il file ritornato da un generatore di report."""
+    if report is None:
+        raise RuntimeError("generazione del report non riuscita")
+    with report:
+        report.read()
+
+def benchmarks(df, data_file):
+    """
+    Operazioni misurate su un registro, nell'ordine di esecuzione.
+
+    Args:
+        df (pd.DataFrame): Registro sintetico
+        data_file (str): File dati temporaneo
+
+    Returns:
+        list: Coppie (nome, funzione senza argomenti)
+    """
+    def load():
+        invalidate_snapshot(data_file)  # Lettura a freddo dal backend
+        load_data(data_file)
+
+    return [
+        ('save', lambda: save_data(df, data_file) or sys.exit("save_data non riuscito")),
+        ('load', load),
+        ('priority', lambda: df['Valore_Rischio'].map(calcola_priorita)),
+        ('heatmap', lambda: create_heatmap_image(df)),
+        ('pdf', lambda: _consume(create_pdf_report(df))),
+        ('excel', lambda: _consume(create_excel_report(df))),
+    ]
+
+def run(records, only=None, backend='csv'):
+    """
+    Esegue i benchmark per ogni dimensione del registro.
+
+    Args:
+        records (list): Dimensioni dei registri
+        only (set, optional): Nomi dei benchmark da eseguire, di default tutti
+        backend (str): Estensione del file dati ('csv', 'db', 'parquet' o 'arrow')
+
+    Returns:
+        dict: '<benchmark>@<righe>' -> {'seconds': ..., 'peak_mb': ...}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='risk_bench_') as tmp:
+        # Passata di riscaldamento non misurata: importazioni e sfondo della heat map
+        warmup_file = os.path.join(tmp, f'risk_data_warmup.{backend}')
+        for name, func in benchmarks(generate_register(WARMUP_RECORDS, seed=1), warmup_file):
+            if not only or name in only:
+                func()
+
+        for n in records:
+            df = generate_register(n)
+            data_file = os.path.join(tmp, f'risk_data_{n}.{backend}')
+            for name, func in benchmarks(df, data_file):
+                if only and name not in only:
+                    continue
+                seconds, peak_mb = measure(func)
+                results[f'{name}@{n}'] = {'seconds': round(seconds, 4), 'peak_mb': round(peak_mb, 2)}
+                print(f"{name:>10} {n:>8} righe  {seconds:9.3f} s  {peak_mb:9.1f} MB", flush=True)
+    return results
+
+# ===========================
+# CONFRONTO CON IL RIFERIMENTO
+# ===========================
+
+def compare(results, baseline, threshold):
+    """
+    Confronta i risultati con il riferimento.
+
+    Args:
+        results (dict): Risultati di run()
+        baseline (dict): Risultati di riferimento
+        threshold (float): Fattore di peggioramento tollerato
+
+    Returns:
+        list: Descrizioni delle regressioni trovate
+    """
+    regressions = []
+    for key, current in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        for metric, floor in (('seconds', MIN_SECONDS), ('peak_mb', MIN_PEAK_MB)):
+            limit = max(reference[metric] * threshold, floor)
+            if current[metric] > limit:
+                regressions.append(f"{key} {metric}: {current[metric]} > {limit:.2f} "
+                                   f"(riferimento {reference[metric]})")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark della Dashboard Risk Assessment")
+    parser.add_argument('--records', default=','.join(map(str, DEFAULT_RECORDS)),
+                        help="Dimensioni dei registri separate da virgola (default: 1000,10000,100000)")
+    parser.add_argument('--only', default=None,
+                        help="Benchmark da eseguire: save, load, priority, heatmap, pdf, excel")
+    parser.add_argument('--backend', choices=('csv', 'db', 'parquet', 'arrow'), default='csv',
+                        help="Backend del file dati (default: csv)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="File dei risultati di riferimento")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Fattore di peggioramento tollerato (default: 1.5, RISK_BENCH_THRESHOLD)")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="Salva i risultati come nuovo riferimento")
+    parser.add_argument('--output', default=None, help="Salva i risultati in formato JSON")
+    args = parser.parse_args(argv)
+
+    records = [int(value) for value in args.records.split(',')]
+    only = set(args.only.split(',')) if args.only else None
+    results = run(records, only, args.backend)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    try:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Riferimento aggiornato: {args.baseline}")
+        return 0
+
+    if not baseline:
+        print("Nessun riferimento: eseguire con --update-baseline per salvarne uno.")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSIONE {regression}")
+    print(f"{len(regressions)} regressioni (soglia x{args.threshold})")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
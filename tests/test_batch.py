@@ -0,0 +1,98 @@
+"""Modifiche in lotto (apply_batch): persistenza, ID in blocco e scritture concorrenti."""
+
+import multiprocessing
+import threading
+
+import pandas as pd
+import pytest
+
+from conftest import make_register
+from risk_storage import apply_batch, get_data_version, get_snapshot, invalidate_snapshot, save_data
+
+BACKENDS = ('risk_data.csv', 'risk_data.db', 'risk_data.parquet')
+
+
+def reread(path):
+    """Registro riletto dal backend, senza lo snapshot in memoria."""
+    invalidate_snapshot(path)
+    return get_snapshot(path)
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_batch_is_persisted(tmp_path, name):
+    path = str(tmp_path / name)
+    assert save_data(make_register(5), path)
+
+    result = apply_batch(path,
+                         adds=[{'Descrizione': 'Nuovo', 'Probabilità': 5.0, 'Impatto': 5.0,
+                                'Contromisura': '', 'Stato': 'Da pianificare', 'Data scadenza': '2026-06-30'}],
+                         updates={2: {'Descrizione': 'Aggiornato', 'Probabilità': 4.0}},
+                         deletes=[1, 99])
+
+    assert result == {'added': [6], 'updated': [2], 'deleted': [1]}
+    df = reread(path).set_index('ID')
+    assert sorted(df.index) == [2, 3, 4, 5, 6]
+    assert df.loc[2, 'Descrizione'] == 'Aggiornato'
+    assert df.loc[2, 'Valore_Rischio'] == 4.0 * df.loc[2, 'Impatto']
+    assert df.loc[6, 'Valore_Rischio'] == 25.0
+    assert df.loc[6, 'Data scadenza'] == pd.Timestamp('2026-06-30')
+
+
+def test_batch_without_matching_ids_does_not_write(register_path):
+    assert save_data(make_register(3), register_path)
+    version = get_data_version(register_path)
+
+    assert apply_batch(register_path, updates={42: {'Descrizione': 'x'}}, deletes=[7, 8]) == \
+        {'added': [], 'updated': [], 'deleted': []}
+    assert get_data_version(register_path) == version
+    assert len(get_snapshot(register_path)) == 3
+
+
+def test_added_ids_are_one_block_after_the_sequence(register_path):
+    assert apply_batch(register_path, adds=make_register(3).drop(columns=['ID']))['added'] == [1, 2, 3]
+    assert apply_batch(register_path, deletes=[3])['deleted'] == [3]
+
+    added = apply_batch(register_path, adds=make_register(4).drop(columns=['ID']))['added']
+    assert added == [4, 5, 6, 7]  # Gli ID eliminati non vengono riusati
+
+
+def test_concurrent_batches_from_threads(register_path):
+    assert save_data(make_register(1), register_path)
+    results = []
+
+    def worker():
+        results.append(apply_batch(register_path, adds=make_register(10).drop(columns=['ID']))['added'])
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ids = [risk_id for added in results for risk_id in added]
+    assert len(ids) == len(set(ids)) == 80
+    assert len(reread(register_path)) == 81
+
+
+def _process_batch(path, count, queue):
+    result = apply_batch(path, adds=make_register(count).drop(columns=['ID']))
+    queue.put(result['added'] if result else None)
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason="richiede fork")
+def test_concurrent_batches_from_processes(register_path):
+    assert save_data(make_register(1), register_path)
+    get_snapshot(register_path)  # Snapshot ereditato dai processi figli, poi superato
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    processes = [context.Process(target=_process_batch, args=(register_path, 25, queue)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    results = [queue.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join()
+
+    ids = [risk_id for added in results for risk_id in added]
+    assert len(ids) == len(set(ids)) == 100
+    df = reread(register_path)
+    assert len(df) == 101 and df['ID'].is_unique
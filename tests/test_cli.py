@@ -0,0 +1,135 @@
+"""Generazione dei report da riga di comando (risk_cli report)."""
+
+import json
+import os
+from io import BytesIO
+
+import pytest
+
+import risk_reports
+from conftest import make_register
+from risk_cli import (MANIFEST_NAME, RESULT_DONE, RESULT_FAILED, RESULT_SKIPPED, content_hash,
+                      find_registers, main, run_reports)
+from risk_schema import serialize_frame
+from risk_storage import get_snapshot
+
+FORMATS = ['pdf', 'xlsx']
+
+
+@pytest.fixture(autouse=True)
+def builders(monkeypatch):
+    """Generatori fittizi: il report contiene il processo che lo ha generato e gli ID del registro."""
+    def build(df, positions, progress=None):
+        return BytesIO(json.dumps({'pid': os.getpid(), 'ids': df['ID'].tolist()}).encode())
+
+    for kind in ('pdf', 'excel'):
+        monkeypatch.setitem(risk_reports.REPORT_BUILDERS, kind, build)
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    """Due registri CSV scritti direttamente, senza file accessori, in sottocartelle diverse."""
+    root = tmp_path / 'input'
+    for name, count in (('nord', 2), ('sud', 3)):
+        (root / name).mkdir(parents=True)
+        make_register(count).to_csv(root / name / 'risk_data.csv', index=False)
+    return root
+
+
+def run(inputs, out, **options):
+    """Esegue il comando report e ritorna gli esiti per nome del registro."""
+    results = run_reports(find_registers([str(inputs)], 'risk_data.*'), FORMATS, str(out), **options)
+    return {os.path.basename(os.path.dirname(result['path'])): result for result in results}
+
+
+def read_report(path):
+    with open(path, encoding='utf-8') as report:
+        return json.load(report)
+
+
+def test_reports_are_written_under_the_input_structure(inputs, tmp_path):
+    results = run(inputs, tmp_path / 'out')
+
+    assert {name: result['status'] for name, result in results.items()} == {'nord': RESULT_DONE,
+                                                                            'sud': RESULT_DONE}
+    assert read_report(tmp_path / 'out' / 'sud' / 'risk_data.pdf')['ids'] == [1, 2, 3]
+    assert read_report(tmp_path / 'out' / 'nord' / 'risk_data.xlsx')['ids'] == [1, 2]
+
+
+def test_registers_are_exported_in_worker_processes(inputs, tmp_path):
+    run(inputs, tmp_path / 'out', workers=2)
+
+    pids = {read_report(tmp_path / 'out' / name / 'risk_data.pdf')['pid'] for name in ('nord', 'sud')}
+    assert os.getpid() not in pids
+
+
+def test_manifest_records_the_content_hash_per_format(inputs, tmp_path):
+    run(inputs, tmp_path / 'out')
+
+    with open(tmp_path / 'out' / MANIFEST_NAME, encoding='utf-8') as f:
+        manifest = json.load(f)
+    path = str(inputs / 'sud' / 'risk_data.csv')
+    digest = content_hash(get_snapshot(path, read_only=True))
+    assert manifest[path] == {'pdf': digest, 'xlsx': digest}
+    assert len(manifest) == 2
+
+
+def test_unchanged_registers_are_skipped(inputs, tmp_path):
+    out = tmp_path / 'out'
+    run(inputs, out)
+    generated = os.stat(out / 'nord' / 'risk_data.pdf').st_mtime_ns
+
+    make_register(4).to_csv(inputs / 'sud' / 'risk_data.csv', index=False)
+    results = run(inputs, out)
+
+    assert results['nord']['status'] == RESULT_SKIPPED and results['nord']['files'] == []
+    assert os.stat(out / 'nord' / 'risk_data.pdf').st_mtime_ns == generated
+    assert results['sud']['status'] == RESULT_DONE
+    assert read_report(out / 'sud' / 'risk_data.xlsx')['ids'] == [1, 2, 3, 4]
+
+
+def test_deleted_report_is_regenerated(inputs, tmp_path):
+    out = tmp_path / 'out'
+    run(inputs, out)
+    os.remove(out / 'nord' / 'risk_data.xlsx')
+
+    results = run(inputs, out)
+
+    assert results['nord']['status'] == RESULT_DONE
+    assert results['nord']['files'] == [str(out / 'nord' / 'risk_data.xlsx')]
+    assert results['sud']['status'] == RESULT_SKIPPED
+
+
+def test_force_regenerates_unchanged_registers(inputs, tmp_path, capsys):
+    out = tmp_path / 'out'
+    args = ['report', '--input', str(inputs), '--out', str(out), '--format', 'pdf']
+    assert main(args) == 0
+    assert main(args) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == "Registri: 2 - generati 0, invariati 2, errori 0"
+
+    assert main(args + ['--force']) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == "Registri: 2 - generati 2, invariati 0, errori 0"
+
+
+def test_failed_register_is_not_recorded_in_the_manifest(inputs, tmp_path):
+    broken = inputs / 'nord' / 'risk_data.csv'
+    broken.write_bytes(b'\xff\xfe\x00 non e un CSV')
+
+    results = run(inputs, tmp_path / 'out')
+
+    assert results['nord']['status'] == RESULT_FAILED and results['nord']['error']
+    with open(tmp_path / 'out' / MANIFEST_NAME, encoding='utf-8') as f:
+        assert str(broken) not in json.load(f)
+
+
+def test_report_run_leaves_no_side_files_in_the_input_folders(inputs, tmp_path):
+    df = serialize_frame(make_register(3)).astype(object)
+    df.loc[1, 'Probabilità'] = 'alta'  # Riga scartata: nessun file di quarantena
+    df.to_csv(inputs / 'sud' / 'risk_data.csv', index=False)
+    before = sorted(str(path) for path in inputs.rglob('*'))
+
+    results = run(inputs, tmp_path / 'out')
+
+    assert results['sud']['status'] == RESULT_DONE
+    assert read_report(tmp_path / 'out' / 'sud' / 'risk_data.pdf')['ids'] == [1, 3]
+    assert sorted(str(path) for path in inputs.rglob('*')) == before
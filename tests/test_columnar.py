@@ -0,0 +1,61 @@
+"""Backend colonnare Parquet/Arrow: scrittura, proiezione e conversione dal CSV."""
+
+import os
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import risk_storage
+from conftest import make_register
+from risk_schema import serialize_frame
+from risk_storage import ColumnarStorage, get_snapshot, save_data
+
+FORMATS = (('risk_data.parquet', 'parquet'), ('risk_data.arrow', 'arrow'))
+
+
+@pytest.mark.parametrize('name, fmt', FORMATS)
+def test_round_trip_keeps_schema(tmp_path, name, fmt):
+    path = str(tmp_path / name)
+    df = make_register(5)
+    assert save_data(df, path)
+
+    read = ColumnarStorage(path, fmt).read()
+    assert read.dtypes.to_dict() == df.dtypes.to_dict()
+    assert read.equals(df)
+
+
+@pytest.mark.parametrize('name, fmt', FORMATS)
+def test_projected_read_returns_only_requested_columns(tmp_path, name, fmt):
+    path = str(tmp_path / name)
+    assert save_data(make_register(5), path)
+
+    read = ColumnarStorage(path, fmt).read(['ID', 'Probabilità', 'Impatto'])
+    assert list(read.columns) == ['ID', 'Probabilità', 'Impatto']
+    assert read['ID'].tolist() == [1, 2, 3, 4, 5]
+
+
+def test_csv_is_migrated_once_on_first_read(tmp_path):
+    serialize_frame(make_register(3)).to_csv(tmp_path / 'risk_data.csv', index=False)
+    storage = ColumnarStorage(str(tmp_path / 'risk_data.parquet'), 'parquet')
+
+    signature = storage.signature()
+    assert signature is not None and not os.path.exists(storage.path)  # Nessuna scrittura
+    assert storage.signature() == signature
+
+    assert storage.read()['ID'].tolist() == [1, 2, 3]
+    assert storage.read_meta()['migrated_from'] == storage.migrate_from
+    assert storage.signature() != signature
+
+    # Il CSV non viene più convertito, anche se il file colonnare viene rimosso
+    os.remove(storage.path)
+    assert storage.signature() is None
+
+
+def test_snapshot_sees_migrated_register(tmp_path):
+    serialize_frame(make_register(3)).to_csv(tmp_path / 'risk_data.csv', index=False)
+    path = str(tmp_path / 'risk_data.parquet')
+
+    assert get_snapshot(path)['ID'].tolist() == [1, 2, 3]
+    assert risk_storage.apply_batch(path, deletes=[2]) == {'added': [], 'updated': [], 'deleted': [2]}
+    assert ColumnarStorage(path, 'parquet').read()['ID'].tolist() == [1, 3]
@@ -0,0 +1,88 @@
+"""Risposta della griglia AgGrid: righe ritornate e confronto per ID con il registro."""
+
+import pandas as pd
+from st_aggrid.AgGridReturn import AgGridReturn
+
+from conftest import make_register
+from risk_grid import GRID_RETURN_MODE, GridDisplayFrame, diff_grid_edits
+
+
+def grid_response(display, edits=None, deleted=()):
+    """Payload del componente come lo invia il browser con getRowId = ID del rischio."""
+    records = display.astype(object).where(display.notna(), None).to_dict('records')
+    nodes = []
+    for index, record in enumerate(records):
+        record = {**record, **(edits or {}).get(record['ID'], {})}
+        record['Elimina'] = record['ID'] in deleted
+        nodes.append({'id': str(record['ID']), 'rowIndex': index, 'data': record})
+    ids = [node['id'] for node in nodes]
+    return {'nodes': nodes, 'rowIdsAfterFilter': ids, 'rowIdsAfterSortAndFilter': ids[::-1]}
+
+
+def returned_rows(display, payload):
+    response = AgGridReturn(display, data_return_mode=GRID_RETURN_MODE, frame_dtypes=display.dtypes)
+    response._set_component_value(payload)
+    return response.data
+
+
+def test_returned_rows_keep_their_values():
+    register = make_register(5)
+    display = GridDisplayFrame.from_frame(register).frame
+    rows = returned_rows(display, grid_response(display, deleted=(3,)))
+
+    assert len(rows) == 5
+    assert rows['ID'].notna().all()
+    assert sorted(pd.to_numeric(rows['ID']).astype(int)) == [1, 2, 3, 4, 5]
+    assert pd.to_numeric(rows.loc[rows['Elimina'] == True, 'ID']).astype(int).tolist() == [3]
+
+
+def test_returned_rows_diff_against_register():
+    register = make_register(5)
+    display = GridDisplayFrame.from_frame(register).frame
+    payload = grid_response(display, edits={2: {'Descrizione': 'Modificato', 'Impatto': 2.0},
+                                            4: {'Probabilità': 7.0}})
+    updates, invalid = diff_grid_edits(returned_rows(display, payload), register)
+
+    assert updates == {2: {'Descrizione': 'Modificato', 'Impatto': 2.0}}
+    assert list(invalid) == [4]
+
+
+def test_unchanged_grid_produces_no_updates():
+    register = make_register(5)
+    display = GridDisplayFrame.from_frame(register).frame
+    assert diff_grid_edits(returned_rows(display, grid_response(display)), register) == ({}, {})
+
+
+def test_rows_without_id_are_ignored():
+    register = make_register(3)
+    display = GridDisplayFrame.from_frame(register).frame
+    rows = returned_rows(display, grid_response(display, edits={1: {'Descrizione': 'Nuova'}}))
+    broken = pd.concat([rows, pd.DataFrame([{column: None for column in rows.columns},
+                                            {**rows.iloc[1].to_dict(), 'ID': 'x'}])], ignore_index=True)
+
+    assert diff_grid_edits(broken, register) == ({1: {'Descrizione': 'Nuova'}}, {})
+    assert diff_grid_edits(broken.assign(ID=float('nan')), register) == ({}, {})
+
+
+def test_stale_response_does_not_revert_changes_of_other_sessions():
+    register = make_register(5)
+    display = GridDisplayFrame.from_frame(register).frame
+    payload = grid_response(display, edits={4: {'Contromisura': 'Nuova azione'}})
+    rows = returned_rows(display, payload)
+
+    # Un'altra sessione ha modificato il rischio 2 dopo il rendering della tabella
+    newer = register.copy()
+    newer.loc[newer['ID'] == 2, 'Descrizione'] = 'Modificato altrove'
+
+    assert diff_grid_edits(rows, newer, display) == ({4: {'Contromisura': 'Nuova azione'}}, {})
+    assert diff_grid_edits(rows, newer)[0][2] == {'Descrizione': 'Rischio 2'}  # Senza la tabella mostrata
+
+
+def test_already_saved_edits_are_not_saved_again():
+    register = make_register(3)
+    display = GridDisplayFrame.from_frame(register).frame
+    rows = returned_rows(display, grid_response(display, edits={1: {'Descrizione': 'Nuova'}}))
+
+    saved = register.copy()
+    saved.loc[saved['ID'] == 1, 'Descrizione'] = 'Nuova'
+    assert diff_grid_edits(rows, saved, display) == ({}, {})
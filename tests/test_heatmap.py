@@ -0,0 +1,119 @@
+"""Indice della heat map, cache dei PNG e sfondo pre-renderizzato."""
+
+from collections import OrderedDict
+
+import pytest
+
+import risk_heatmap
+from conftest import make_register
+from risk_heatmap import HeatmapIndex, _cache_get, _cache_put, _legend_entries, create_heatmap_image
+from risk_scoring import ScoringEngine
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Cache vuota solo in memoria e renderer fittizio che registra le posizioni disegnate."""
+    calls = []
+
+    def render(positions):
+        calls.append(positions)
+        return f'png {len(calls)}'.encode()
+
+    monkeypatch.setattr(risk_heatmap, '_png_cache', OrderedDict())
+    monkeypatch.setattr(risk_heatmap, 'HEATMAP_CACHE_DIR', None)
+    monkeypatch.setattr(risk_heatmap, '_render_heatmap_png', render)
+    return calls
+
+
+def test_incremental_updates_match_a_rebuild():
+    df = make_register(6)
+    index = HeatmapIndex.from_frame(df)
+
+    index = index.on_delete([2]).on_update(3, {'Probabilità': 5.0}).on_insert(make_register(1, start=7))
+    expected = df[df['ID'] != 2].copy()
+    expected.loc[expected['ID'] == 3, 'Probabilità'] = 5.0
+    expected = HeatmapIndex.from_frame(expected).on_insert(make_register(1, start=7))
+
+    assert index.positions() == expected.positions()
+    assert index.where == expected.where
+
+
+def test_update_of_a_risk_missing_from_the_index_is_ignored():
+    index = HeatmapIndex.from_frame(make_register(3))
+
+    assert index.on_update(99, {'Probabilità': 2.0}) is index
+    assert index.on_update(99, {'Impatto': 2.0, 'Probabilità': 3.0}) is index
+
+
+def test_legend_follows_the_scoring_thresholds():
+    engine = ScoringEngine(thresholds=(4, 9, 20))
+
+    assert [label for _, label in _legend_entries(engine)] == [
+        'Bassa (< 4)', 'Media (≥ 4)', 'Alta (≥ 9)', 'Estrema (≥ 20)']
+    assert [color for color, _ in _legend_entries(engine)] == list(engine.colors)
+
+
+def test_unchanged_positions_are_served_from_the_cache(renders):
+    df = make_register(5)
+    first = create_heatmap_image(df).getvalue()
+
+    # Stesse posizioni con righe in altro ordine e altre colonne modificate
+    shuffled = df.iloc[::-1].assign(Descrizione='Altro')
+    assert create_heatmap_image(shuffled).getvalue() == first
+    assert len(renders) == 1
+
+    moved = df.copy()
+    moved.loc[moved['ID'] == 2, 'Impatto'] = 1.0
+    assert create_heatmap_image(moved).getvalue() != first
+    assert len(renders) == 2
+
+
+def test_memory_cache_evicts_the_least_recently_used_image(renders, monkeypatch):
+    monkeypatch.setattr(risk_heatmap, 'HEATMAP_CACHE_SIZE', 2)
+    _cache_put('a', b'A')
+    _cache_put('b', b'B')
+    assert _cache_get('a') == b'A'  # 'b' diventa il meno usato di recente
+
+    _cache_put('c', b'C')
+
+    assert list(risk_heatmap._png_cache) == ['a', 'c']
+    assert _cache_get('b') is None
+
+
+def test_disk_cache_is_shared_after_a_restart(renders, monkeypatch, tmp_path):
+    monkeypatch.setattr(risk_heatmap, 'HEATMAP_CACHE_DIR', str(tmp_path / 'png'))
+    df = make_register(4)
+    png = create_heatmap_image(df).getvalue()
+    key = risk_heatmap.heatmap_cache_key(HeatmapIndex.from_frame(df).positions())
+    assert [path.name for path in (tmp_path / 'png').iterdir()] == [f'{key}.png']
+
+    # Processo appena avviato: cache in memoria vuota, immagine letta dal disco
+    monkeypatch.setattr(risk_heatmap, '_png_cache', OrderedDict())
+    assert create_heatmap_image(df).getvalue() == png
+    assert len(renders) == 1
+    assert list(risk_heatmap._png_cache) == [key]
+
+
+def test_unwritable_disk_cache_keeps_the_image_in_memory(renders, monkeypatch, tmp_path):
+    blocked = tmp_path / 'file'
+    blocked.write_text('')
+    monkeypatch.setattr(risk_heatmap, 'HEATMAP_CACHE_DIR', str(blocked / 'png'))
+
+    _cache_put('a', b'A')
+
+    assert _cache_get('a') == b'A'
+
+
+def test_template_is_built_once_and_leaves_no_markers_behind(monkeypatch):
+    pytest.importorskip('matplotlib')
+    monkeypatch.setattr(risk_heatmap, '_template', None)
+    template = risk_heatmap._get_template()
+    assert risk_heatmap._get_template() is template
+
+    crowded = HeatmapIndex.from_frame(make_register(9)).positions()
+    single = HeatmapIndex.from_frame(make_register(1)).positions()
+    png = template.render(single)
+
+    assert png.startswith(b'\x89PNG')
+    assert template.render(crowded) != png
+    assert template.render(single) == png
@@ -0,0 +1,79 @@
+"""Importazione di file CSV/XLSX a blocchi: normalizzazione, validazione e salvataggio."""
+
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+from risk_import import (REASON_COLUMN, ROW_COLUMN, commit_import, iter_chunks, prepare_import,
+                         read_header, suggest_mapping)
+from risk_storage import get_snapshot
+
+CSV = (
+    "Rischio;Prob;Impact;Mitigazione;Status;Scadenza\n"
+    "Server;4,5;3;Backup;in corso;31/03/2026\n"
+    "Rete;2;2;;;2026-04-30\n"
+    ";3;3;Audit;Chiuso;2026-05-31\n"
+    "Fornitore;7;1;Contratto;Chiuso;2026-06-30\n"
+    "Personale;1,5;4;Formazione;MONITORAGGIO;2026-07-31\n"
+)
+
+
+def csv_upload():
+    return BytesIO(CSV.encode('utf-8'))
+
+
+def xlsx_upload():
+    frame = pd.read_csv(BytesIO(CSV.encode('utf-8')), sep=';', dtype=str, keep_default_na=False)
+    buffer = BytesIO()
+    frame.replace('', None).to_excel(buffer, index=False)
+    buffer.seek(0)
+    return buffer
+
+
+UPLOADS = (('rischi.csv', csv_upload), ('rischi.xlsx', xlsx_upload))
+
+
+@pytest.mark.parametrize('name, upload', UPLOADS)
+def test_header_is_mapped_from_aliases(name, upload):
+    mapping = suggest_mapping(read_header(upload(), name))
+
+    assert mapping == {'Descrizione': 'Rischio', 'Probabilità': 'Prob', 'Impatto': 'Impact',
+                       'Contromisura': 'Mitigazione', 'Stato': 'Status', 'Data scadenza': 'Scadenza'}
+
+
+@pytest.mark.parametrize('name, upload', UPLOADS)
+@pytest.mark.parametrize('chunk_rows', (1, 2, 1000))
+def test_result_does_not_depend_on_the_chunk_size(name, upload, chunk_rows):
+    mapping = suggest_mapping(read_header(upload(), name))
+
+    result = prepare_import(upload(), name, mapping, chunk_rows=chunk_rows)
+
+    assert result.total == 5
+    assert result.chunks == -(-5 // chunk_rows)
+    assert result.rows['Descrizione'].tolist() == ['Server', 'Rete', 'Personale']
+    assert result.rows['Probabilità'].tolist() == [4.5, 2.0, 1.5]
+    assert result.rows['Stato'].tolist() == ['In corso', 'Da pianificare', 'Monitoraggio']
+    assert result.rows['Data scadenza'].dt.strftime('%Y-%m-%d').tolist() == [
+        '2026-03-31', '2026-04-30', '2026-07-31']
+    assert result.rows['Valore_Rischio'].tolist() == [13.5, 4.0, 6.0]
+    assert result.rejected[ROW_COLUMN].tolist() == [4, 5]
+    assert result.rejected[REASON_COLUMN].tolist() == ['descrizione vuota', 'probabilità fuori scala']
+
+
+def test_chunks_are_numbered_by_file_row():
+    chunks = list(iter_chunks(csv_upload(), 'rischi.csv', chunk_rows=2))
+
+    assert [chunk.index.tolist() for chunk in chunks] == [[2, 3], [4, 5], [6]]
+
+
+def test_unsupported_format_is_rejected():
+    with pytest.raises(ValueError):
+        list(iter_chunks(BytesIO(b''), 'rischi.txt'))
+
+
+def test_commit_saves_the_valid_rows(register_path):
+    result = prepare_import(csv_upload(), 'rischi.csv', suggest_mapping(read_header(csv_upload(), 'rischi.csv')))
+
+    assert commit_import(result, register_path) == [1, 2, 3]
+    assert get_snapshot(register_path)['Descrizione'].tolist() == ['Server', 'Rete', 'Personale']
@@ -0,0 +1,79 @@
+"""Ingestione di una cartella di CSV/XLSX nel registro (risk_cli ingest)."""
+
+import pandas as pd
+import pytest
+
+import risk_storage
+from conftest import make_register
+from risk_cli import RESULT_FAILED, RESULT_IMPORTED, RESULT_VALIDATED, run_ingest
+from risk_import import find_import_files
+from risk_storage import get_snapshot, save_data
+
+KEY = ('Descrizione',)
+
+
+def write_file(path, descriptions):
+    pd.DataFrame({'Descrizione': descriptions, 'Probabilità': 3, 'Impatto': 2,
+                  'Contromisura': 'Azione', 'Stato': 'In corso',
+                  'Data scadenza': '2026-03-31'}).to_csv(path, index=False)
+
+
+@pytest.fixture
+def folder(tmp_path):
+    drop = tmp_path / 'drop'
+    drop.mkdir()
+    write_file(drop / 'a.csv', ['Rischio 1', 'Nuovo A', 'nuovo b '])
+    write_file(drop / 'b.csv', ['Nuovo B', 'Nuovo C'])
+    return drop
+
+
+def ingest(folder, register_path, **options):
+    return run_ingest(find_import_files(str(folder)), register_path, KEY, threads=True, **options)
+
+
+def test_ingest_skips_rows_already_in_the_register_or_in_earlier_files(folder, register_path):
+    assert save_data(make_register(2), register_path)
+
+    reports, added = ingest(folder, register_path)
+
+    assert added == [3, 4, 5]
+    assert get_snapshot(register_path)['Descrizione'].tolist() == [
+        'Rischio 1', 'Rischio 2', 'Nuovo A', 'nuovo b', 'Nuovo C']
+    assert [(r['status'], r['duplicates']) for r in reports] == [(RESULT_IMPORTED, 1), (RESULT_IMPORTED, 1)]
+
+
+def test_dry_run_reports_without_saving(folder, register_path):
+    assert save_data(make_register(2), register_path)
+    version = risk_storage.get_storage(register_path).signature()
+
+    reports, added = ingest(folder, register_path, dry_run=True)
+
+    assert added == []
+    assert [(r['status'], r['duplicates']) for r in reports] == [(RESULT_VALIDATED, 1), (RESULT_VALIDATED, 1)]
+    assert risk_storage.get_storage(register_path).signature() == version
+
+
+def test_rows_saved_by_another_process_meanwhile_are_not_imported_twice(folder, register_path, monkeypatch):
+    assert save_data(make_register(1), register_path)
+    apply_batch = risk_storage.apply_batch
+
+    def concurrent(file_path, **options):
+        # Un'altra sessione salva lo stesso rischio dopo la lettura dei file
+        risk_storage.insert_risk({**make_register(1).iloc[0].to_dict(), 'Descrizione': 'Nuovo C'}, file_path)
+        return apply_batch(file_path, **options)
+
+    monkeypatch.setattr(risk_storage, 'apply_batch', concurrent)
+    reports, added = ingest(folder, register_path)
+
+    descriptions = get_snapshot(register_path)['Descrizione'].tolist()
+    assert descriptions.count('Nuovo C') == 1
+    assert added == [3, 4] and reports[1]['duplicates'] == 2
+
+
+def test_failed_save_marks_the_files_as_failed(folder, register_path, monkeypatch):
+    monkeypatch.setattr(risk_storage, 'apply_batch', lambda file_path, **options: None)
+
+    reports, added = ingest(folder, register_path)
+
+    assert added is None
+    assert [r['status'] for r in reports] == [RESULT_FAILED, RESULT_FAILED]
@@ -0,0 +1,156 @@
+"""Coda di esportazione in background: deduplicazione, limite di concorrenza e avanzamento."""
+
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+import risk_jobs
+from conftest import make_register
+from risk_jobs import (EXPORT_WORKERS, JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, ExportJob,
+                       get_job, submit_export)
+from risk_reports import REPORT_IMPORT_ERRORS
+from risk_storage import save_data
+
+
+def wait_for(condition, timeout=5):
+    """Attende che condition() sia vera, fallendo dopo timeout secondi."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condizione non raggiunta"
+        time.sleep(0.01)
+
+
+class FakeReports:
+    """Generatore fittizio che si ferma a metà delle righe finché non viene rilasciato."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.calls = []
+        self.error = None
+
+    def __call__(self, kind, file_path, progress=None):
+        with self.lock:
+            self.calls.append((kind, file_path))
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            progress('rows', 5, 10)
+            assert self.release.wait(5)
+            if self.error is not None:
+                raise self.error
+            progress('rows', 10, 10)
+            progress('heatmap', 1, 1)
+            return f'{file_path}.{kind}'
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+@pytest.fixture
+def reports(monkeypatch):
+    fake = FakeReports()
+    monkeypatch.setattr(risk_jobs, 'get_report', fake)
+    monkeypatch.setattr(risk_jobs, '_jobs', OrderedDict())
+    yield fake
+    fake.release.set()  # Nessun thread del pool resta bloccato dopo il test
+
+
+def test_concurrent_requests_share_one_job(reports, register_path):
+    job = submit_export('pdf', register_path)
+
+    assert submit_export('pdf', register_path) is job
+    assert submit_export('excel', register_path) is not job
+    reports.release.set()
+    wait_for(lambda: not job.active)
+    assert reports.calls.count(('pdf', job.file_path)) == 1
+
+    # Job concluso: una nuova richiesta accoda un nuovo job
+    assert submit_export('pdf', register_path) is not job
+
+
+def test_new_data_version_gets_its_own_job(reports, register_path):
+    job = submit_export('pdf', register_path)
+    assert save_data(make_register(2), register_path)
+
+    newer = submit_export('pdf', register_path)
+
+    assert newer is not job and newer.version != job.version
+    assert submit_export('pdf', register_path) is newer
+
+
+def test_at_most_export_workers_jobs_run_at_once(reports, tmp_path):
+    jobs = [submit_export('pdf', str(tmp_path / f'risk_{i}.csv')) for i in range(EXPORT_WORKERS + 2)]
+
+    wait_for(lambda: reports.running == EXPORT_WORKERS)
+    time.sleep(0.05)
+    assert [job.status for job in jobs].count(JOB_RUNNING) == EXPORT_WORKERS
+    assert [job.status for job in jobs].count(JOB_QUEUED) == 2
+
+    reports.release.set()
+    wait_for(lambda: all(not job.active for job in jobs))
+    assert reports.peak == EXPORT_WORKERS
+    assert [job.result for job in jobs] == [f'{job.file_path}.pdf' for job in jobs]
+
+
+def test_progress_is_reported_while_the_job_runs(reports, register_path):
+    job = submit_export('pdf', register_path)
+    assert get_job(job.id) is job
+
+    wait_for(lambda: job.rows_done == 5)
+    assert job.status == JOB_RUNNING
+    assert job.fraction() == pytest.approx(0.45)
+    assert job.describe() == "Righe scritte: 5/10"
+
+    reports.release.set()
+    wait_for(lambda: not job.active)
+    assert job.status == JOB_DONE and job.finished_at is not None
+    assert job.fraction() == 1.0
+    assert job.describe() == "Completato"
+
+
+def test_progress_stages_of_a_job():
+    job = ExportJob('pdf-1', 'pdf', '/tmp/risk_data.csv', (None, 0))
+    assert (job.fraction(), job.describe()) == (0.0, "In coda...")
+
+    job.status = JOB_RUNNING
+    job._progress('rows', 10, 10)
+    assert job.fraction() == pytest.approx(0.9)
+    job._progress('heatmap', 1, 1)
+    assert job.fraction() == 0.99  # 100% solo a job concluso
+    assert job.describe() == "Righe scritte: 10/10 - heat map renderizzata"
+
+
+@pytest.mark.parametrize('error, message', [
+    (ImportError('reportlab'), REPORT_IMPORT_ERRORS['pdf']),
+    (ValueError('disco pieno'), "Errore nella generazione del report: disco pieno"),
+])
+def test_failed_job_reports_the_error(reports, register_path, error, message):
+    reports.error = error
+    job = submit_export('pdf', register_path)
+
+    reports.release.set()
+    wait_for(lambda: not job.active)
+
+    assert job.status == JOB_FAILED
+    assert job.describe() == message
+
+
+def test_only_the_latest_finished_jobs_are_kept(reports, tmp_path, monkeypatch):
+    monkeypatch.setattr(risk_jobs, 'EXPORT_JOB_HISTORY', 1)
+    reports.release.set()
+    finished = []
+    for i in range(3):
+        finished.append(submit_export('pdf', str(tmp_path / f'risk_{i}.csv')))
+        wait_for(lambda: not finished[-1].active)
+
+    # Il job appena accodato è attivo: restano lui e l'ultimo concluso
+    current = submit_export('pdf', str(tmp_path / 'risk_3.csv'))
+
+    assert get_job(finished[0].id) is None and get_job(finished[1].id) is None
+    assert get_job(finished[2].id) is finished[2]
+    assert get_job(current.id) is current
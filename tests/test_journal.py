@@ -0,0 +1,97 @@
+"""Backend CSV con journal append-only: replay, idempotenza e compattazione."""
+
+import os
+
+import pytest
+
+import risk_storage
+from conftest import make_register
+from risk_storage import (JournaledCsvStorage, apply_batch, compact_storage, delete_risks, get_snapshot,
+                          insert_risk, invalidate_snapshot, save_data, update_risk)
+
+
+@pytest.fixture
+def journaled(register_path, monkeypatch):
+    monkeypatch.setattr(risk_storage, 'CSV_JOURNAL_ENABLED', True)
+    assert save_data(make_register(3), register_path)
+    return register_path
+
+
+def reread(path):
+    invalidate_snapshot(path)
+    return get_snapshot(path)
+
+
+def test_changes_are_appended_and_replayed(journaled):
+    base = os.path.getsize(journaled)
+    insert_risk(make_register(1).drop(columns=['ID']).iloc[0].to_dict(), journaled)
+    update_risk(2, {'Impatto': 1.0}, journaled)
+    delete_risks([1], journaled)
+    apply_batch(journaled, updates={3: {'Descrizione': 'Lotto'}}, deletes=[4])
+    expected = get_snapshot(journaled)
+
+    assert os.path.getsize(journaled) == base  # Il CSV base non viene riscritto
+    assert sum(1 for _ in open(journaled + '.journal', encoding='utf-8')) == 4
+    assert reread(journaled).equals(expected)
+    assert expected['ID'].tolist() == [2, 3]
+    assert expected['Descrizione'].tolist() == ['Rischio 2', 'Lotto']
+    assert expected.loc[0, 'Valore_Rischio'] == expected.loc[0, 'Probabilità'] * 1.0
+
+
+def test_replay_is_idempotent_after_an_interrupted_compaction(journaled):
+    insert_risk(make_register(1).drop(columns=['ID']).iloc[0].to_dict(), journaled)
+    expected = get_snapshot(journaled)
+
+    # CSV base già sostituito ma journal non ancora rimosso
+    journal = open(journaled + '.journal', encoding='utf-8').read()
+    JournaledCsvStorage(journaled).write(expected)
+    with open(journaled + '.journal', 'w', encoding='utf-8') as f:
+        f.write(journal)
+
+    assert reread(journaled)['ID'].tolist() == [1, 2, 3, 4]
+
+
+def test_compaction_folds_the_journal_into_the_csv(journaled):
+    update_risk(2, {'Descrizione': 'Compattato'}, journaled)
+    expected = get_snapshot(journaled)
+
+    compact_storage(journaled)
+
+    assert not os.path.exists(journaled + '.journal')
+    assert reread(journaled).equals(expected)
+
+
+def test_compaction_starts_past_the_threshold(journaled, monkeypatch):
+    monkeypatch.setattr(risk_storage, 'JOURNAL_COMPACT_BYTES', 1)
+    risk_storage._storages.pop(os.path.abspath(journaled), None)
+    started = []
+    monkeypatch.setattr(risk_storage, 'compact_storage', started.append)
+    monkeypatch.setattr(risk_storage.threading, 'Thread',
+                        lambda target, args, **kwargs: type('T', (), {'start': lambda self: target(*args)})())
+
+    update_risk(2, {'Descrizione': 'Soglia'}, journaled)
+
+    assert started == [os.path.abspath(journaled)]
+
+
+def test_torn_journal_tail_is_ignored_and_removed(journaled):
+    update_risk(2, {'Descrizione': 'Confermato'}, journaled)
+    expected = get_snapshot(journaled)
+    with open(journaled + '.journal', 'a', encoding='utf-8') as journal:
+        journal.write('{"op": "delete", "ids": [2')  # Scrittura interrotta
+
+    assert reread(journaled).equals(expected)
+
+    assert insert_risk(make_register(1).drop(columns=['ID']).iloc[0].to_dict(), journaled) == 4
+    assert reread(journaled)['ID'].tolist() == [1, 2, 3, 4]
+    assert reread(journaled).set_index('ID').loc[2, 'Descrizione'] == 'Confermato'
+    lines = open(journaled + '.journal', encoding='utf-8').read().splitlines()
+    assert len(lines) == 2 and all(line.endswith('}') for line in lines)
+
+
+def test_torn_tail_longer_than_a_block_is_removed(tmp_path):
+    path = tmp_path / 'journal'
+    path.write_bytes(b'{"op": "add"}\n' + b'x' * 10)
+    with open(path, 'ab+') as journal:
+        risk_storage._truncate_torn_record(journal, block=4)
+    assert path.read_bytes() == b'{"op": "add"}\n'
@@ -0,0 +1,95 @@
+"""Scritture sicure tra sessioni e processi: lock tra processi, sequenza degli ID, snapshot superati."""
+
+import multiprocessing
+import os
+import time
+
+import pytest
+
+import risk_storage
+from conftest import make_register
+from risk_storage import (apply_batch, delete_risks, get_snapshot, insert_risk, invalidate_snapshot,
+                          save_data, update_risk)
+
+pytestmark = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(),
+                                reason="richiede fork")
+
+NEW_RISK = {'Descrizione': 'Nuovo', 'Probabilità': 2.0, 'Impatto': 3.0, 'Contromisura': '',
+            'Stato': 'In corso', 'Data scadenza': '2026-03-31'}
+
+
+def reread(path):
+    invalidate_snapshot(path)
+    return get_snapshot(path)
+
+
+def _insert_many(path, count, queue):
+    queue.put([insert_risk({**NEW_RISK, 'Descrizione': f'Processo {os.getpid()}'}, path)
+               for _ in range(count)])
+
+
+def _hold_lock(path, seconds, ready):
+    with risk_storage._locked(os.path.abspath(path)):
+        ready.set()
+        time.sleep(seconds)
+
+
+@pytest.mark.parametrize('name', ('risk_data.csv', 'risk_data.db'))
+def test_overlapping_writers_keep_every_row(tmp_path, name):
+    path = str(tmp_path / name)
+    assert save_data(make_register(2), path)
+    get_snapshot(path)
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    processes = [context.Process(target=_insert_many, args=(path, 10, queue)) for _ in range(3)]
+    for process in processes:
+        process.start()
+    ids = [risk_id for _ in processes for risk_id in queue.get(timeout=60)]
+    for process in processes:
+        process.join()
+
+    assert None not in ids
+    assert len(set(ids)) == 30
+    df = reread(path)
+    assert len(df) == 32 and df['ID'].is_unique
+
+
+def test_writes_wait_for_the_lock_of_another_process(register_path):
+    assert save_data(make_register(2), register_path)
+    context = multiprocessing.get_context('fork')
+    ready = context.Event()
+    holder = context.Process(target=_hold_lock, args=(register_path, 0.5, ready))
+    holder.start()
+    assert ready.wait(10)
+    start = time.perf_counter()
+    assert insert_risk(NEW_RISK, register_path) == 3
+    assert time.perf_counter() - start >= 0.3
+    holder.join()
+
+
+def _write_and_exit(path, queue):
+    queue.put(apply_batch(path, updates={1: {'Descrizione': 'Da un altro processo'}}, deletes=[2]))
+
+
+def test_stale_snapshot_does_not_lose_other_writes(register_path):
+    assert save_data(make_register(3), register_path)
+    get_snapshot(register_path)  # Snapshot che diventerà superato
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    other = context.Process(target=_write_and_exit, args=(register_path, queue))
+    other.start()
+    assert queue.get(timeout=60)['deleted'] == [2]
+    other.join()
+
+    # Le scritture di questo processo partono dal registro aggiornato dall'altro
+    assert update_risk(3, {'Stato': 'Chiuso'}, register_path)
+    df = reread(register_path).set_index('ID')
+    assert sorted(df.index) == [1, 3]
+    assert df.loc[1, 'Descrizione'] == 'Da un altro processo'
+    assert df.loc[3, 'Stato'] == 'Chiuso'
+
+
+def test_saved_ids_are_never_reassigned(register_path):
+    assert save_data(make_register(5), register_path)
+    assert delete_risks([5], register_path)
+    assert insert_risk(NEW_RISK, register_path) == 6
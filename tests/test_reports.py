@@ -0,0 +1,71 @@
+"""Cache dei report generati: file su disco, limite di dimensione e snapshot coerente."""
+
+import os
+from io import BytesIO
+
+import pytest
+
+import risk_reports
+from conftest import make_register
+from risk_heatmap import HeatmapIndex
+from risk_reports import get_cached_report, get_report, open_report
+from risk_storage import save_data
+
+
+@pytest.fixture
+def builds(monkeypatch, tmp_path):
+    """Generatore di report fittizio che registra le chiamate e scrive le posizioni della heat map."""
+    calls = []
+
+    def build(df, positions, progress=None, size=10):
+        calls.append((df['ID'].tolist(), positions))
+        return BytesIO(repr(sorted(positions.items())).encode().ljust(size, b' '))
+
+    monkeypatch.setitem(risk_reports.REPORT_BUILDERS, 'pdf', build)
+    monkeypatch.setattr(risk_reports, 'REPORT_SPOOL_DIR', str(tmp_path))
+    monkeypatch.setattr(risk_reports, '_report_cache', risk_reports.OrderedDict())
+    monkeypatch.setattr(risk_reports, '_report_cache_bytes', 0)
+    return calls
+
+
+def test_report_is_generated_once_and_served_from_file(register_path, builds):
+    df = make_register(4)
+    assert save_data(df, register_path)
+
+    path = get_report('pdf', register_path)
+    assert get_report('pdf', register_path) == get_cached_report('pdf', register_path) == path
+    assert len(builds) == 1
+    with open_report(path) as report:
+        assert report.read().strip() == repr(sorted(HeatmapIndex.from_frame(df).positions().items())).encode()
+
+
+def test_cache_limit_removes_least_recently_used_files(register_path, builds, monkeypatch):
+    monkeypatch.setattr(risk_reports, 'REPORT_CACHE_BYTES', 2500)
+    assert save_data(make_register(3), register_path)
+
+    first = get_report('pdf', register_path, size=1000)
+    second = get_report('pdf', register_path, size=1001)
+    third = get_report('pdf', register_path, size=1002)
+
+    assert not os.path.exists(first) and open_report(first) is None
+    assert os.path.exists(second) and os.path.exists(third)
+    assert risk_reports._report_cache_bytes == 2003
+
+    # L'ultimo report resta in cache anche oltre il limite
+    huge = get_report('pdf', register_path, size=5000)
+    assert os.path.exists(huge) and not os.path.exists(third)
+
+
+def test_heatmap_positions_come_from_the_report_snapshot(register_path, builds, monkeypatch):
+    df = make_register(3)
+    assert save_data(df, register_path)
+    stale = HeatmapIndex.from_frame(make_register(5))
+    # Il registro cambia tra la lettura dello snapshot e quella dell'indice condiviso
+    monkeypatch.setattr(risk_reports, 'get_heatmap_index', lambda file_path: stale)
+    monkeypatch.setattr(risk_reports, 'get_data_version', lambda file_path: ('altra versione',))
+
+    get_report('pdf', register_path)
+
+    ids, positions = builds[0]
+    assert ids == [1, 2, 3]
+    assert positions == HeatmapIndex.from_frame(df).positions()
@@ -0,0 +1,73 @@
+"""Backend di persistenza: salvataggi, rilettura e migrazione dal CSV."""
+
+import os
+
+import pytest
+
+import risk_storage
+from conftest import make_register
+from risk_profiling import finish_rerun, start_rerun
+from risk_schema import serialize_frame
+from risk_storage import (SqliteStorage, delete_risks, get_snapshot, get_storage, insert_risk,
+                          invalidate_snapshot, save_data, update_risk)
+
+BACKENDS = ('risk_data.csv', 'risk_data.db', 'risk_data.parquet', 'risk_data.arrow')
+
+
+def reread(path):
+    """Snapshot riletto dal backend, senza lo snapshot in memoria del processo."""
+    invalidate_snapshot(path)
+    risk_storage._storages.pop(os.path.abspath(path), None)
+    return get_snapshot(path)
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_changes_survive_a_reread(tmp_path, name):
+    path = str(tmp_path / name)
+    assert save_data(make_register(3), path)
+
+    new_id = insert_risk(make_register(1).drop(columns=['ID']).iloc[0].to_dict(), path)
+    assert update_risk(2, {'Descrizione': 'Modificato', 'Stato': 'Chiuso'}, path)
+    assert delete_risks([1], path)
+    expected = get_snapshot(path)
+
+    assert new_id == 4
+    assert reread(path).equals(expected)
+    assert expected.set_index('ID').loc[2, ['Descrizione', 'Stato']].tolist() == ['Modificato', 'Chiuso']
+    assert expected['ID'].tolist() == [2, 3, 4]
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_saved_register_keeps_types(tmp_path, name):
+    path = str(tmp_path / name)
+    df = make_register(5)
+    assert save_data(df, path)
+
+    assert reread(path).dtypes.to_dict() == df.dtypes.to_dict()
+
+
+def test_sqlite_migrates_the_csv_once(tmp_path):
+    serialize_frame(make_register(3)).to_csv(tmp_path / 'risk_data.csv', index=False)
+    path = str(tmp_path / 'risk_data.db')
+
+    assert get_snapshot(path)['ID'].tolist() == [1, 2, 3]
+    assert delete_risks([1, 2, 3], path)
+    assert get_storage(path).read_meta()['migrated_from'] == str(tmp_path / 'risk_data.csv')
+
+    # Il CSV resta al suo posto ma non viene importato di nuovo
+    assert SqliteStorage(path).read().empty
+    assert reread(path).empty
+
+
+def test_save_functions_are_timed_in_the_rerun(register_path):
+    assert save_data(make_register(2), register_path)
+    start_rerun()
+    try:
+        insert_risk(make_register(1).drop(columns=['ID']).iloc[0].to_dict(), register_path)
+        update_risk(1, {'Impatto': 2.0}, register_path)
+        delete_risks([2], register_path)
+    finally:
+        timer = finish_rerun()
+
+    assert {'insert_risk', 'update_risk', 'delete_risks'} <= set(timer.calls)
+    assert '_scored_fields' not in timer.calls
@@ -0,0 +1,141 @@
+"""Validazione del registro al caricamento, quarantena e viste proiettate."""
+
+import os
+
+import pandas as pd
+import pytest
+
+import risk_storage
+from conftest import make_register
+from risk_grid import get_grid_frame
+from risk_heatmap import get_heatmap_index
+from risk_schema import STATUS_VALUES, serialize_frame
+from risk_storage import get_snapshot, get_validation_report, invalidate_snapshot, save_data
+from risk_validation import REASON_COLUMN, validate_register
+
+
+def forget(path):
+    """Dimentica snapshot e viste del processo, come un server appena avviato."""
+    path = os.path.abspath(path)
+    invalidate_snapshot(path)
+    risk_storage._derived.pop(path, None)
+
+
+def write_raw(path, rows):
+    """Scrive righe arbitrarie (anche non valide) direttamente sul backend."""
+    risk_storage.get_storage(path).write(rows)
+    forget(path)
+
+
+def test_invalid_rows_are_rejected_with_reasons():
+    df = serialize_frame(make_register(6)).astype(object)
+    df.loc[0, 'Descrizione'] = ' '
+    df.loc[1, 'Probabilità'] = 7
+    df.loc[2, 'ID'] = 1
+    df.loc[3, 'Data scadenza'] = '2026-02-30'
+    df.loc[4, 'Valore_Rischio'] = 99  # Incoerente: ricalcolato, non scartato
+
+    valid, rejected, recalculated = validate_register(df)
+
+    assert valid['ID'].tolist() == [5, 6]
+    assert rejected[REASON_COLUMN].tolist() == ['descrizione vuota', 'probabilità fuori scala',
+                                                'ID duplicato', 'data di scadenza non valida']
+    assert recalculated == 1
+    assert valid.loc[valid['ID'] == 5, 'Valore_Rischio'].item() != 99
+
+
+def test_load_quarantines_invalid_rows(register_path):
+    df = serialize_frame(make_register(4)).astype(object)
+    df.loc[1, 'Probabilità'] = 'alta'
+    write_raw(register_path, df)
+
+    assert get_snapshot(register_path)['ID'].tolist() == [1, 3, 4]
+    report = get_validation_report(register_path)
+    assert report['rejected'] == 1 and report['valid'] == 3
+    assert report['reasons'] == {'probabilità fuori scala': 1}
+    quarantine = pd.read_csv(report['quarantine_file'])
+    assert quarantine['ID'].tolist() == [2]
+
+    # Una rilettura non duplica le righe già in quarantena
+    forget(register_path)
+    get_snapshot(register_path)
+    assert len(pd.read_csv(report['quarantine_file'])) == 1
+
+
+@pytest.mark.parametrize('name', ('risk_data.csv', 'risk_data.db', 'risk_data.parquet'))
+def test_projected_views_match_the_full_snapshot(tmp_path, name):
+    path = str(tmp_path / name)
+    assert save_data(make_register(4), path)
+    df = serialize_frame(make_register(4))
+    df.loc[1, 'Data scadenza'] = None  # Colonna non letta da heat map e tabella
+    df.loc[2, 'Priorità'] = 'Bassa'    # Priorità non aggiornata: ricalcolata
+    write_raw(path, risk_storage.apply_schema(df))
+
+    grid = get_grid_frame(path)        # Letture proiettate: snapshot non ancora in memoria
+    heatmap = get_heatmap_index(path)
+    snapshot = get_snapshot(path)
+
+    assert sorted(grid.index) == snapshot['ID'].tolist() == [1, 3, 4]
+    assert sorted(heatmap.where) == [1, 3, 4]
+    assert grid.loc[3, 'Priorità'] == snapshot.set_index('ID').loc[3, 'Priorità'] != 'Bassa'
+
+
+@pytest.mark.parametrize('name', ('risk_data.db', 'risk_data.parquet'))
+def test_migration_quarantines_invalid_csv_rows(tmp_path, name):
+    df = serialize_frame(make_register(3))
+    df.loc[0, 'Descrizione'] = ''
+    df.to_csv(tmp_path / 'risk_data.csv', index=False)
+    path = str(tmp_path / name)
+
+    assert get_snapshot(path)['ID'].tolist() == [2, 3]
+    report = get_validation_report(path)
+    assert report['rejected'] == 1 and report['reasons'] == {'descrizione vuota': 1}
+    assert pd.read_csv(report['quarantine_file'])['ID'].tolist() == [1]
+
+
+def test_journal_replay_is_validated(register_path, monkeypatch):
+    monkeypatch.setattr(risk_storage, 'CSV_JOURNAL_ENABLED', True)
+    assert save_data(make_register(3), register_path)
+    storage = risk_storage.get_storage(register_path)
+    assert isinstance(storage, risk_storage.JournaledCsvStorage)
+    storage.update_row(2, {'Probabilità': 7.0})  # Record non valido scritto da un altro strumento
+    forget(register_path)
+
+    assert get_snapshot(register_path)['ID'].tolist() == [1, 3]
+    report = get_validation_report(register_path)
+    assert report['reasons'] == {'probabilità fuori scala': 1}
+
+
+def test_unwritable_quarantine_keeps_the_register_readable(register_path, monkeypatch):
+    df = serialize_frame(make_register(3))
+    df.loc[2, 'Descrizione'] = ''
+    write_raw(register_path, df)
+    replace = os.replace
+
+    def read_only(source, target):
+        if target.endswith(risk_storage.QUARANTINE_SUFFIX):
+            raise PermissionError(13, 'Permission denied', target)
+        replace(source, target)
+
+    monkeypatch.setattr(risk_storage.os, 'replace', read_only)
+
+    assert get_snapshot(register_path)['ID'].tolist() == [1, 2]
+    report = get_validation_report(register_path)
+    assert report['rejected'] == 1 and report['quarantine_file'] is None
+
+
+def test_unknown_states_are_rejected_on_load_and_save(register_path):
+    df = serialize_frame(make_register(3)).astype(object)
+    df.loc[0, 'Stato'] = 'Sospeso'
+    write_raw(register_path, df)
+
+    snapshot = get_snapshot(register_path)
+    assert snapshot['ID'].tolist() == [2, 3]
+    assert list(snapshot['Stato'].cat.categories) == list(STATUS_VALUES)
+    assert get_validation_report(register_path)['reasons'] == {'stato non valido': 1}
+
+    signature = risk_storage.get_storage(register_path).signature()
+    assert not risk_storage.update_risk(2, {'Stato': 'Sospeso'}, register_path)
+    assert risk_storage.apply_batch(register_path, updates={3: {'Stato': 'Sospeso'}}) is None
+    assert risk_storage.get_storage(register_path).signature() == signature  # Nessuna scrittura
+    assert get_snapshot(register_path)['Stato'].tolist() == ['In corso', 'In corso']